@@ -1,35 +1,142 @@
-from flask import Flask, render_template_string, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, g, abort, has_request_context
 from flask_cors import CORS
 import json
 import os
 from datetime import datetime, timedelta
 import requests
+from urllib.parse import quote
 import threading
 import time
-import schedule
 import logging
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 import shutil
+import hmac
+import hashlib
+import uuid
+from functools import wraps
+from itertools import islice
+import metrics
+import charts
+from assets import TemplateCache, StaticAssets
+from profiling import Profiler
+from single_flight import SingleFlight, ProcessLock
+from scheduler import Scheduler, ScheduledJob, Every, Daily, Weekly
+from jobs import JobStore, JobCancelled, ACTIVE_STATES
+from charts import load_charts, bind
+from org_diff import diff_snapshots, change_types, iter_hierarchy
+from org_export import locate, iter_records, iter_row_records, iter_csv, iter_jsonl, gzip_chunks
+from history_store import HistoryStore
+from sqlite_store import SqliteStore, iter_rows_json
+from snapshot_io import atomic_write, write_snapshot, read_snapshot, iter_json, Snapshot, SnapshotCache, count_descendants, truncate_tree
+from import_csv_to_json import import_csv, check_columns, ImportReport, ImportValidationError
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# Static files are served by serve_static() below rather than Flask's built-in route
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 if not os.path.exists('static'):
     os.makedirs('static')
 
-GRAPH_API_ENDPOINT = 'https://graph.microsoft.com/v1.0'
+templates = TemplateCache(
+    app,
+    ['templates', '.', os.path.join(os.path.dirname(__file__), 'templates'), os.path.dirname(__file__)],
+    auto_reload=os.environ.get('TEMPLATES_AUTO_RELOAD', '').lower() == 'true'
+)
+static_assets = StaticAssets(os.path.abspath('static'), overrides={'icon.png': 'icon_custom.png'})
+app.jinja_env.globals['asset_url'] = static_assets.url
+
+# Both can be pointed at a stand-in such as loadtest/mock_graph.py for testing
+GRAPH_API_ENDPOINT = os.environ.get('GRAPH_API_ENDPOINT', 'https://graph.microsoft.com/v1.0')
+AZURE_AUTHORITY_HOST = os.environ.get('AZURE_AUTHORITY_HOST', 'https://login.microsoftonline.com')
 DATA_FILE = 'employee_data.json'
+# Used instead of DATA_FILE by charts stored in SQLite
+DB_FILE = 'employee_data.db'
 SETTINGS_FILE = 'app_settings.json'
+CHANGES_FILE = 'employee_changes.json'
+HISTORY_DIR = 'history'
+IMPORT_DIR = 'imports'
+PROFILE_DIR = 'profiles'
+JOBS_DIR = 'jobs'
+# Held while a sync runs, so only one process syncs at a time
+SYNC_LOCK_FILE = 'sync.lock'
+# Held while a sync or CSV import publishes a snapshot, so its change feed and history entry match it
+PUBLISH_LOCK_FILE = 'publish.lock'
+# Held while a CSV import runs, so only one import runs at a time across all workers
+IMPORT_LOCK_FILE = os.path.join(IMPORT_DIR, 'import.lock')
+# Per-user fingerprints from the last Graph sync, compared against a cheap probe by refreshes
+FINGERPRINTS_FILE = 'sync_fingerprints.json'
+# A refresh fetches changed users one by one up to this many, and does a full fetch past it
+REFRESH_MAX_FETCHES = 200
+SYNC_MODES = ('full', 'refresh')
+# Seconds a client is told to wait before retrying while the first sync is running
+WARMING_UP_RETRY_AFTER = 5
+# Minimum gap between the syncs that requests start when there is no data yet, so a failing sync isn't retried on every request
+WARMING_UP_SYNC_COOLDOWN = 30
+
+# Number of sync diffs kept in the change feed
+MAX_CHANGE_ENTRIES = 50
+
+# Daily snapshot history: a full checkpoint every N days, deltas in between
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', '365'))
+HISTORY_CHECKPOINT_INTERVAL = int(os.environ.get('HISTORY_CHECKPOINT_INTERVAL', '7'))
+
+# Metrics exposed on /metrics
+HTTP_REQUESTS = metrics.counter('orgchart_http_requests_total', 'HTTP requests handled', ['route', 'method', 'status'])
+HTTP_LATENCY = metrics.histogram('orgchart_http_request_duration_seconds', 'Time spent handling HTTP requests',
+                                 ['route', 'method'])
+HTTP_RESPONSE_SIZE = metrics.histogram('orgchart_http_response_size_bytes', 'HTTP response body sizes', ['route'],
+                                       buckets=metrics.SIZE_BUCKETS)
+SYNC_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SYNC_DURATION = metrics.histogram('orgchart_sync_duration_seconds', 'Duration of Graph API syncs', buckets=SYNC_BUCKETS)
+SYNC_PHASE_DURATION = metrics.histogram('orgchart_sync_phase_duration_seconds', 'Duration of each phase of a sync',
+                                        ['phase'], buckets=SYNC_BUCKETS)
+SYNCS = metrics.counter('orgchart_syncs_total', 'Graph API syncs by outcome', ['result'])
+LAST_SUCCESSFUL_SYNC = metrics.gauge('orgchart_last_successful_sync_timestamp_seconds',
+                                     'Unix time the last successful sync finished', shared=True)
+GRAPH_REQUESTS = metrics.counter('orgchart_graph_requests_total', 'Graph API requests by response status', ['status'])
+GRAPH_RETRIES = metrics.counter('orgchart_graph_retries_total', 'Graph API requests retried, by response status',
+                                ['status'])
+GRAPH_THROTTLED = metrics.counter('orgchart_graph_throttled_total', 'Graph API requests throttled with a 429')
+CACHE_LOOKUPS = metrics.counter('orgchart_cache_lookups_total', 'Cache lookups by cache and result',
+                                ['cache', 'result'])
+SNAPSHOT_GENERATION = metrics.gauge('orgchart_snapshot_generation', 'Generation number of the current snapshot')
+SNAPSHOT_AGE = metrics.gauge('orgchart_snapshot_age_seconds', 'Seconds since the snapshot file was written')
+SNAPSHOT_NODES = metrics.gauge('orgchart_snapshot_nodes', 'Employees in the current snapshot')
+
+def cache_lookup_recorder(cache):
+    def record(hit):
+        CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+    return record
+
+import_lock = ProcessLock(IMPORT_LOCK_FILE)
+
+# Status, progress and cancellation of syncs and imports, shared by all workers
+jobs = JobStore(JOBS_DIR)
+
+# Admin-controlled profiling of slow requests and syncs, off until configured
+profiler = Profiler(PROFILE_DIR)
+
+# Graph API request handling: throttled or busy responses are retried with backoff
+GRAPH_MAX_RETRIES = 5
+GRAPH_TIMEOUT = 60
+GRAPH_RETRY_STATUSES = {429, 503, 504}
 
 # Configuration for file uploads
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
 MAX_FILE_SIZE = 5 * 1024 * 1024
+MAX_CSV_SIZE = int(os.environ.get('MAX_CSV_SIZE_MB', '200')) * 1024 * 1024
+
+# Token required by admin-only endpoints such as CSV upload. Admin endpoints are disabled when unset.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# No Graph API calls: no scheduled syncs, and charts are only updated by CSV import
+OFFLINE_MODE = os.environ.get('OFFLINE_MODE') == 'true'
 
 TENANT_ID = os.environ.get('AZURE_TENANT_ID')
 CLIENT_ID = os.environ.get('AZURE_CLIENT_ID')
@@ -45,8 +152,53 @@ if not all([TENANT_ID, CLIENT_ID, CLIENT_SECRET]):
 TOP_LEVEL_USER_EMAIL = os.environ.get('TOP_LEVEL_USER_EMAIL')
 TOP_LEVEL_USER_ID = os.environ.get('TOP_LEVEL_USER_ID')
 
-scheduler_running = False
-scheduler_lock = threading.Lock()
+# Extra charts served under /c/<chart>/ (see charts.py); the default chart uses the files above
+CHARTS_FILE = os.environ.get('CHARTS_FILE', 'charts.json')
+# Memory for the charts' in-memory snapshots; past it the least recently used are unloaded (0 = no limit)
+CHART_MEMORY_BUDGET = int(os.environ.get('CHART_MEMORY_BUDGET_MB', '0')) * 1024 * 1024
+# 'json' keeps each chart in DATA_FILE and in memory, 'sqlite' in DB_FILE (charts.json can set it per chart)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+
+chart_registry = load_charts(CHARTS_FILE, {
+    'tenantId': TENANT_ID,
+    'clientId': CLIENT_ID,
+    'clientSecret': CLIENT_SECRET,
+    'topLevelUserEmail': TOP_LEVEL_USER_EMAIL,
+    'topLevelUserId': TOP_LEVEL_USER_ID,
+    'storage': STORAGE_BACKEND,
+    'source': 'csv' if OFFLINE_MODE else 'graph'
+}, CHART_MEMORY_BUDGET)
+
+def chart_lookup_recorder(chart):
+    record = cache_lookup_recorder('snapshot')
+    def looked_up(hit):
+        record(hit)
+        chart_registry.touch(chart)
+    return looked_up
+
+for chart in chart_registry:
+    if chart.directory:
+        os.makedirs(chart.directory, exist_ok=True)
+    chart.publish_lock = ProcessLock(chart.path(PUBLISH_LOCK_FILE))
+    chart.history = HistoryStore(chart.path(HISTORY_DIR), HISTORY_CHECKPOINT_INTERVAL, HISTORY_RETENTION_DAYS,
+                                 on_lookup=cache_lookup_recorder('history'))
+    if chart.storage == 'sqlite':
+        chart.store = SqliteStore(chart.path(DB_FILE))
+    else:
+        # In-memory copy of the chart's data file, shared by all requests in this worker and reloaded when the file is replaced
+        chart.snapshots = SnapshotCache(chart.path(DATA_FILE), on_lookup=chart_lookup_recorder(chart))
+
+def current_chart():
+    """The chart the current request or background job is for"""
+    chart = charts.current()
+    if chart is None and has_request_context():
+        chart = g.get('chart')
+    return chart or chart_registry.default
+
+# Scheduled jobs are pushed back by up to this many seconds so servers sharing a tenant don't sync in lockstep
+SCHEDULE_JITTER_SECONDS = int(os.environ.get('SCHEDULE_JITTER_SECONDS', '60'))
+# How often the process running the schedule checks for settings saved by another process
+SETTINGS_CHECK_INTERVAL = 30
 
 # Default settings
 DEFAULT_SETTINGS = {
@@ -63,6 +215,9 @@ DEFAULT_SETTINGS = {
     },
     'autoUpdateEnabled': True,
     'updateTime': '20:00',
+    'refreshIntervalMinutes': 0,
+    'historyCompactionDay': 'sunday',
+    'historyCompactionTime': '03:00',
     'collapseLevel': '2',
     'searchAutoExpand': True,
     'searchHighlight': True,
@@ -73,27 +228,39 @@ DEFAULT_SETTINGS = {
     'printSize': 'a4',
     'topUserEmail': TOP_LEVEL_USER_EMAIL or '',
     'highlightNewEmployees': True,
-    'newEmployeeMonths': 3
+    'newEmployeeMonths': 3,
+    'highlightRecentChanges': True
 }
 
+def default_settings():
+    """DEFAULT_SETTINGS, with the current chart's own title and top-level user"""
+    chart = current_chart()
+    settings = DEFAULT_SETTINGS.copy()
+    settings['topUserEmail'] = chart.top_level_email or ''
+    if chart.title:
+        settings['chartTitle'] = chart.title
+    return settings
+
 def load_settings():
     """Load settings from file or return defaults"""
-    if os.path.exists(SETTINGS_FILE):
+    defaults = default_settings()
+    settings_file = current_chart().path(SETTINGS_FILE)
+    if os.path.exists(settings_file):
         try:
-            with open(SETTINGS_FILE, 'r') as f:
+            with open(settings_file, 'r') as f:
                 settings = json.load(f)
-                for key in DEFAULT_SETTINGS:
+                for key in defaults:
                     if key not in settings:
-                        settings[key] = DEFAULT_SETTINGS[key]
+                        settings[key] = defaults[key]
                 return settings
         except Exception as e:
             logger.error(f"Error loading settings: {e}")
-    return DEFAULT_SETTINGS.copy()
+    return defaults
 
 def save_settings(settings):
     """Save settings to file"""
     try:
-        with open(SETTINGS_FILE, 'w') as f:
+        with open(current_chart().path(SETTINGS_FILE), 'w') as f:
             json.dump(settings, f, indent=2)
         return True
     except Exception as e:
@@ -103,108 +270,296 @@ def save_settings(settings):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def require_admin(view):
+    """Only allow requests carrying ADMIN_TOKEN as a bearer token or X-Admin-Token header"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin API is disabled. Set ADMIN_TOKEN to enable it.'}), 403
+        supplied = request.headers.get('X-Admin-Token', '')
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            supplied = auth_header[len('Bearer '):]
+        if not hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 def get_access_token():
-    token_url = f'https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token'
+    chart = current_chart()
+    token_url = f'{AZURE_AUTHORITY_HOST}/{chart.tenant_id}/oauth2/v2.0/token'
     
     token_data = {
         'grant_type': 'client_credentials',
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET,
+        'client_id': chart.client_id,
+        'client_secret': chart.client_secret,
         'scope': 'https://graph.microsoft.com/.default'
     }
     
     try:
-        token_r = requests.post(token_url, data=token_data)
+        token_r = requests.post(token_url, data=token_data, timeout=GRAPH_TIMEOUT)
         token = token_r.json().get('access_token')
         return token
     except Exception as e:
         logger.error(f"Error getting access token: {e}")
         return None
 
-def fetch_all_employees():
-    token = get_access_token()
+def graph_get(url, headers):
+    """GET a Graph API URL, honouring Retry-After when throttled (429) or the service is busy"""
+    for attempt in range(GRAPH_MAX_RETRIES + 1):
+        response = requests.get(url, headers=headers, timeout=GRAPH_TIMEOUT)
+        GRAPH_REQUESTS.inc(status=response.status_code)
+        if response.status_code == 429:
+            GRAPH_THROTTLED.inc()
+        if response.status_code not in GRAPH_RETRY_STATUSES or attempt == GRAPH_MAX_RETRIES:
+            return response
+        GRAPH_RETRIES.inc(status=response.status_code)
+        try:
+            delay = float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            delay = 2 ** attempt
+        logger.warning(f"Graph API returned {response.status_code}, retrying in {delay:g}s "
+                       f"(attempt {attempt + 1} of {GRAPH_MAX_RETRIES})")
+        time.sleep(min(delay, 60))
+
+USERS_SELECT = 'id,displayName,jobTitle,department,mail,mobilePhone,officeLocation,employeeHireDate'
+USERS_EXPAND = 'manager($select=id,displayName)'
+# The probe asks only for what the fingerprints cover, in pages as large as Graph allows
+PROBE_URL_QUERY = '$select=id,displayName&$expand=manager($select=id)&$top=999'
+
+def graph_headers(job=None):
+    """Authorization headers for the current chart's tenant, or None if no token could be had"""
+    with SYNC_PHASE_DURATION.time(phase='token'):
+        token = get_access_token()
     if not token:
         logger.error("Failed to get access token")
-        return []
-    
-    headers = {
+        if job:
+            job.update(error='Failed to get an access token. Check the Azure AD credentials.')
+        return None
+    return {
         'Authorization': f'Bearer {token}',
         'Content-Type': 'application/json'
     }
+
+def graph_pages(url, headers, job=None):
+    """Yield each page of a Graph API collection, following @odata.nextLink; job can cancel between pages"""
+    while url:
+        if job:
+            job.check_cancelled()
+        response = graph_get(url, headers)
+        response.raise_for_status()
+        data = response.json()
+        yield data
+        url = data.get('@odata.nextLink')
+
+def employee_from_graph(user, months_threshold):
+    """An employee record for the snapshot from a Graph user"""
+    hire_date_str = user.get('employeeHireDate')
+    is_new = False
+    hire_date = None
     
-    employees = []
-    users_url = f'{GRAPH_API_ENDPOINT}/users?$select=id,displayName,jobTitle,department,mail,mobilePhone,officeLocation,employeeHireDate&$expand=manager($select=id,displayName)'
-    
-    while users_url:
+    if hire_date_str:
         try:
-            response = requests.get(users_url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            if 'T' in hire_date_str:
+                hire_date = datetime.fromisoformat(hire_date_str.replace('Z', '+00:00'))
+            else:
+                hire_date = datetime.strptime(hire_date_str, '%Y-%m-%d')
+                hire_date = hire_date.replace(tzinfo=None)
             
-            if 'value' in data:
-                for user in data['value']:
-                    if user.get('displayName'):
-                        hire_date_str = user.get('employeeHireDate')
-                        is_new = False
-                        hire_date = None
-                        
-                        if hire_date_str:
-                            try:
-                                if 'T' in hire_date_str:
-                                    hire_date = datetime.fromisoformat(hire_date_str.replace('Z', '+00:00'))
-                                else:
-                                    hire_date = datetime.strptime(hire_date_str, '%Y-%m-%d')
-                                    hire_date = hire_date.replace(tzinfo=None)
-                                
-                                settings = load_settings()
-                                months_threshold = settings.get('newEmployeeMonths', 3)
-                                
-                                if hire_date.tzinfo:
-                                    cutoff_date = datetime.now(hire_date.tzinfo) - timedelta(days=months_threshold * 30)
-                                else:
-                                    cutoff_date = datetime.now() - timedelta(days=months_threshold * 30)
-                                
-                                is_new = hire_date > cutoff_date
-                            except Exception as e:
-                                logger.warning(f"Error parsing hire date for user {user.get('displayName')}: {e}")
-                        
-                        employee = {
-                            'id': user.get('id'),
-                            'name': user.get('displayName') or 'Unknown',
-                            'title': user.get('jobTitle') or 'No Title',
-                            'department': user.get('department') or 'No Department',
-                            'email': user.get('mail') or '',
-                            'phone': user.get('mobilePhone') or '',
-                            'location': user.get('officeLocation') or '',
-                            'managerId': user.get('manager', {}).get('id') if user.get('manager') else None,
-                            'employeeHireDate': hire_date_str,
-                            'hireDate': hire_date.isoformat() if hire_date else None,
-                            'isNewEmployee': is_new,
-                            'children': []
-                        }
-                        employees.append(employee)
+            if hire_date.tzinfo:
+                cutoff_date = datetime.now(hire_date.tzinfo) - timedelta(days=months_threshold * 30)
+            else:
+                cutoff_date = datetime.now() - timedelta(days=months_threshold * 30)
             
-            users_url = data.get('@odata.nextLink')
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching employees: {e}")
-            if response.status_code == 401:
-                logger.error("Authentication failed. Please check your credentials.")
-            elif response.status_code == 403:
-                logger.error("Permission denied. Ensure User.Read.All permission is granted.")
-            break
+            is_new = hire_date > cutoff_date
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            break
+            logger.warning(f"Error parsing hire date for user {user.get('displayName')}: {e}")
+    
+    return {
+        'id': user.get('id'),
+        'name': user.get('displayName') or 'Unknown',
+        'title': user.get('jobTitle') or 'No Title',
+        'department': user.get('department') or 'No Department',
+        'email': user.get('mail') or '',
+        'phone': user.get('mobilePhone') or '',
+        'location': user.get('officeLocation') or '',
+        'managerId': user.get('manager', {}).get('id') if user.get('manager') else None,
+        'employeeHireDate': hire_date_str,
+        'hireDate': hire_date.isoformat() if hire_date else None,
+        'isNewEmployee': is_new,
+        'children': []
+    }
+
+def log_fetch_error(e):
+    response = getattr(e, 'response', None)
+    logger.error(f"Error fetching employees: {e}")
+    if response is not None and response.status_code == 401:
+        logger.error("Authentication failed. Please check your credentials.")
+    elif response is not None and response.status_code == 403:
+        logger.error("Permission denied. Ensure User.Read.All permission is granted.")
+
+def fetch_all_employees(job=None):
+    """Page through the Graph /users API; job, if given, gets page-level progress and can cancel the fetch.
+
+    Raises if any page fails, so a sync never publishes part of the org.
+    """
+    headers = graph_headers(job)
+    if not headers:
+        return []
+    
+    employees = []
+    users_url = f'{GRAPH_API_ENDPOINT}/users?$select={USERS_SELECT}&$expand={USERS_EXPAND}'
+    months_threshold = load_settings().get('newEmployeeMonths', 3)
+    fetch_started = time.perf_counter()
+    pages = 0
+    if job:
+        job.update(phase='fetch', pagesFetched=0, employeesFetched=0)
+    
+    try:
+        for data in graph_pages(users_url, headers, job):
+            for user in data.get('value', []):
+                if user.get('displayName'):
+                    employees.append(employee_from_graph(user, months_threshold))
+            pages += 1
+            if job:
+                job.update(pagesFetched=pages, employeesFetched=len(employees))
+    except requests.exceptions.RequestException as e:
+        # Raised rather than returning what was fetched: a partial fetch would look like a wave of leavers
+        log_fetch_error(e)
+        raise RuntimeError(f'Error fetching employees after {pages} pages: {e}') from e
+    finally:
+        SYNC_PHASE_DURATION.observe(time.perf_counter() - fetch_started, phase='fetch')
     
     logger.info(f"Fetched {len(employees)} employees from Graph API")
     return employees
 
+def structure_fingerprint(manager_id, name):
+    """Short hash of what the probe can see of an employee: who they report to and their name"""
+    return hashlib.blake2b(f'{manager_id or ""}\x1f{name}'.encode('utf-8'), digest_size=8).hexdigest()
+
+def employee_fingerprints(employees):
+    return {emp['id']: structure_fingerprint(emp['managerId'], emp['name']) for emp in employees}
+
+def load_fingerprints():
+    """Fingerprints recorded by the last Graph sync of the current chart, or None"""
+    try:
+        with open(current_chart().path(FINGERPRINTS_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def save_fingerprints(fingerprints):
+    with atomic_write(current_chart().path(FINGERPRINTS_FILE)) as f:
+        json.dump(fingerprints, f, separators=(',', ':'))
+
+def discard_fingerprints():
+    """Forget the fingerprints, so the next refresh does a full fetch (e.g. after a CSV import)"""
+    try:
+        os.remove(current_chart().path(FINGERPRINTS_FILE))
+    except FileNotFoundError:
+        pass
+
+def probe_structure(headers, job=None):
+    """Fingerprint and manager ID of every user, from a fetch of just their IDs, names and managers.
+
+    Raises on errors: a partial probe would look like a wave of leavers.
+    """
+    probed = {}
+    pages = 0
+    if job:
+        job.update(phase='probe', pagesProbed=0, usersProbed=0)
+    with SYNC_PHASE_DURATION.time(phase='probe'):
+        for data in graph_pages(f'{GRAPH_API_ENDPOINT}/users?{PROBE_URL_QUERY}', headers, job):
+            for user in data.get('value', []):
+                if user.get('displayName'):
+                    manager_id = user['manager'].get('id') if user.get('manager') else None
+                    probed[user['id']] = (structure_fingerprint(manager_id, user['displayName']), manager_id)
+            pages += 1
+            if job:
+                job.update(pagesProbed=pages, usersProbed=len(probed))
+    return probed
+
+def fetch_employees_by_id(ids, headers, job=None):
+    """Fetch single users; those deleted since the probe are left out"""
+    months_threshold = load_settings().get('newEmployeeMonths', 3)
+    employees = []
+    with SYNC_PHASE_DURATION.time(phase='fetch'):
+        for emp_id in ids:
+            if job:
+                job.check_cancelled()
+            response = graph_get(f'{GRAPH_API_ENDPOINT}/users/{quote(emp_id)}?$select={USERS_SELECT}&$expand={USERS_EXPAND}',
+                                 headers)
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            user = response.json()
+            if user.get('displayName'):
+                employees.append(employee_from_graph(user, months_threshold))
+    return employees
+
+def refresh_employees(job):
+    """Employee records for a refresh: the current snapshot, patched with the users the probe found changed.
+
+    Returns (employees, fingerprints), ([], {}) when nothing changed, or None when a full fetch
+    is needed instead (no previous sync to compare with, or too many changes to fetch one by one).
+    """
+    previous = load_fingerprints()
+    snapshot = stored_snapshot()
+    if previous is None or snapshot is None:
+        logger.info("No fingerprints from a previous sync, doing a full fetch")
+        return None
+    headers = graph_headers(job)
+    if not headers:
+        raise RuntimeError('Failed to get an access token. Check the Azure AD credentials.')
+    probed = probe_structure(headers, job)
+    if not probed:
+        return None
+
+    changed = [emp_id for emp_id, (fingerprint, _) in probed.items() if previous.get(emp_id) != fingerprint]
+    removed = set(previous) - set(probed)
+    job.update(usersChanged=len(changed), usersRemoved=len(removed))
+    if not changed and not removed:
+        return [], {}
+    if len(changed) > REFRESH_MAX_FETCHES:
+        logger.info(f"Probe found {len(changed)} changed users, doing a full fetch")
+        return None
+
+    # Managers that weren't in the chart are fetched too, so the changed users can be placed under them
+    targets = dict.fromkeys(changed)
+    for emp_id in changed:
+        manager_id = probed[emp_id][1]
+        while manager_id in probed and manager_id not in snapshot.by_id and manager_id not in targets:
+            targets[manager_id] = None
+            manager_id = probed[manager_id][1]
+    if len(targets) > REFRESH_MAX_FETCHES:
+        return None
+
+    job.update(phase='fetch', employeesFetched=0)
+    fetched = {emp['id']: emp for emp in fetch_employees_by_id(list(targets), headers, job)}
+    job.update(employeesFetched=len(fetched))
+
+    employees = []
+    with snapshot.lock:
+        for node in snapshot.employees:
+            emp_id = node.get('id')
+            if emp_id in removed or emp_id in targets or emp_id not in probed:
+                continue
+            employee = {key: value for key, value in node.items() if key not in ('children', 'changeType')}
+            employee['children'] = []
+            employees.append(employee)
+    employees.extend(fetched.values())
+    fingerprints = {emp_id: fingerprint for emp_id, fingerprint in previous.items() if emp_id in probed}
+    fingerprints.update(employee_fingerprints(fetched.values()))
+    logger.info(f"Probe found {len(changed)} changed and {len(removed)} removed users; fetched {len(fetched)}")
+    return employees, fingerprints
+
 def build_org_hierarchy(employees):
     if not employees:
         return None
     
+    chart = current_chart()
     settings = load_settings()
-    top_user_email = settings.get('topUserEmail') or TOP_LEVEL_USER_EMAIL
+    top_user_email = settings.get('topUserEmail') or chart.top_level_email
     
     emp_dict = {emp['id']: emp.copy() for emp in employees}
     
@@ -213,8 +568,8 @@ def build_org_hierarchy(employees):
             emp_dict[emp_id]['children'] = []
     
     root = None
-    if TOP_LEVEL_USER_ID and TOP_LEVEL_USER_ID in emp_dict:
-        root = emp_dict[TOP_LEVEL_USER_ID]
+    if chart.top_level_id and chart.top_level_id in emp_dict:
+        root = emp_dict[chart.top_level_id]
         logger.info(f"Using configured top-level user by ID: {root['name']}")
     elif top_user_email:
         for emp in employees:
@@ -264,185 +619,629 @@ def build_org_hierarchy(employees):
     
     return root
 
-def update_employee_data():
+def new_employee_checker(months_threshold, as_of=None):
+    """is_new(hire_date_str): whether someone hired then counts as new, relative to as_of (default now)"""
+    # Hire dates repeat across the org, so each distinct one is parsed and compared once
+    cache = {}
+    def is_new(hire_date_str):
+        if not hire_date_str:
+            return False
+        new = cache.get(hire_date_str)
+        if new is None:
+            try:
+                hire_date = datetime.fromisoformat(hire_date_str)
+                if as_of:
+                    now = datetime.combine(as_of, datetime.max.time(), tzinfo=hire_date.tzinfo)
+                elif hire_date.tzinfo:
+                    now = datetime.now(hire_date.tzinfo)
+                else:
+                    now = datetime.now()
+                cutoff_date = now - timedelta(days=months_threshold * 30)
+                new = hire_date > cutoff_date
+            except:
+                new = False
+            cache[hire_date_str] = new
+        return new
+    return is_new
+
+def update_new_status(root, months_threshold, as_of=None):
+    """Set isNewEmployee on every node based on hire date, relative to as_of (default now)"""
+    is_new = new_employee_checker(months_threshold, as_of)
+    for node, _, _ in iter_hierarchy(root):
+        node['isNewEmployee'] = is_new(node.get('hireDate'))
+
+def parse_as_of(value):
+    """Parse an asOf=YYYY-MM-DD query parameter"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def load_snapshot_as_of(as_of):
+    """Reconstruct the org as it was on the given date, with new-employee flags for that date"""
+    data = current_chart().history.snapshot_at(as_of)
+    if data:
+        settings = load_settings()
+        update_new_status(data, settings.get('newEmployeeMonths', 3), as_of=as_of)
+    return data
+
+def load_change_feed():
+    """Load the change feed, or an empty one at generation 0"""
+    changes_file = current_chart().path(CHANGES_FILE)
+    if os.path.exists(changes_file):
+        try:
+            with open(changes_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading change feed: {e}")
+    return {'generation': 0, 'entries': []}
+
+def record_changes(previous, hierarchy):
+    """Diff the new snapshot against the previous one and append it to the change feed"""
+    feed = load_change_feed()
+    generation = feed.get('generation', 0) + 1
+
+    if previous:
+        diff = diff_snapshots(previous, hierarchy)
+    else:
+        # First snapshot is the baseline, so nobody is reported as a joiner
+        diff = {'joiners': [], 'leavers': [], 'moves': [], 'changes': []}
+
+    entry = {
+        'generation': generation,
+        'timestamp': datetime.now().isoformat(),
+        'baseline': not previous,
+        'summary': {key: len(value) for key, value in diff.items()},
+    }
+    entry.update(diff)
+
+    feed['generation'] = generation
+    feed['entries'] = (feed.get('entries', []) + [entry])[-MAX_CHANGE_ENTRIES:]
+
+    with atomic_write(current_chart().path(CHANGES_FILE)) as f:
+        json.dump(feed, f)
+    logger.info(f"Recorded generation {generation}: {entry['summary']}")
+    return entry
+
+def stored_snapshot():
+    """The chart's current Snapshot, or None; charts stored in SQLite are read in full, so only syncs use this"""
+    chart = current_chart()
+    if chart.store:
+        root = chart.store.tree() if chart.store.exists() else None
+        return Snapshot(root) if root else None
+    return chart.snapshots.get()
+
+def save_snapshot(hierarchy):
+    """Write a new hierarchy to the chart's DATA_FILE (or DB_FILE) and record what changed since the last one"""
+    chart = current_chart()
+    # Another sync or import publishing to this chart, in any process, finishes first, so the
+    # previous snapshot, the change feed generation and the history entry all belong to one publish
+    with chart.publish_lock:
+        previous = None
+        try:
+            snapshot = stored_snapshot()
+            if snapshot:
+                previous = snapshot.root
+        except Exception as e:
+            logger.warning(f"Could not read previous snapshot for diffing: {e}")
+
+        if chart.store:
+            chart.store.write(hierarchy)
+        else:
+            write_snapshot(chart.path(DATA_FILE), hierarchy)
+
+        try:
+            record_changes(previous, hierarchy)
+        except Exception as e:
+            logger.error(f"Error recording changes: {e}")
+
+        try:
+            chart.history.record(hierarchy)
+        except Exception as e:
+            logger.error(f"Error recording history: {e}")
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def get_current_snapshot():
+    """Return the in-memory snapshot with its request-time flags up to date, or None"""
+    chart = current_chart()
+    snapshot = chart.snapshots.get()
+    if snapshot is None:
+        return None
+    settings = load_settings()
+    months_threshold = settings.get('newEmployeeMonths', 3)
+    key = (months_threshold, datetime.now().date(), file_signature(chart.path(CHANGES_FILE)))
+    hit = snapshot.annotation_key == key
+    CACHE_LOOKUPS.inc(cache='annotations', result='hit' if hit else 'miss')
+    if not hit:
+        with snapshot.lock:
+            if snapshot.annotation_key != key:
+                update_new_status(snapshot.root, months_threshold)
+                annotate_recent_changes(snapshot.root)
+                snapshot.views.clear()
+                snapshot.annotation_key = key
+    return snapshot
+
+def annotate_recent_changes(data):
+    """Flag nodes that joined, moved or changed in the most recent sync"""
+    types = recent_change_types()
+    for node, _, _ in iter_hierarchy(data):
+        node['changeType'] = types.get(node.get('id'))
+
+# Chart name -> (change feed signature, {id: changeType} for the most recent sync)
+recent_change_types_cache = {}
+
+def recent_change_types():
+    """{id: changeType} for the most recent sync, read again only when the change feed is replaced"""
+    chart = current_chart()
+    signature = file_signature(chart.path(CHANGES_FILE))
+    cached = recent_change_types_cache.get(chart.name)
+    if cached and cached[0] == signature:
+        return cached[1]
+    entries = load_change_feed().get('entries', [])
+    types = change_types(entries[-1]) if entries else {}
+    recent_change_types_cache[chart.name] = (signature, types)
+    return types
+
+def store_annotator():
+    """(annotate, key) for nodes read from the chart's SQLite store.
+
+    annotate(emp_id, hire_date) returns the request-time fields (isNewEmployee and changeType)
+    that get_current_snapshot() sets on in-memory snapshots; key changes whenever they may.
+    """
+    months_threshold = load_settings().get('newEmployeeMonths', 3)
+    is_new = new_employee_checker(months_threshold)
+    types = recent_change_types()
+    def annotate(emp_id, hire_date):
+        return {'isNewEmployee': is_new(hire_date), 'changeType': types.get(emp_id)}
+    key = (months_threshold, datetime.now().date(), file_signature(current_chart().path(CHANGES_FILE)))
+    return annotate, key
+
+def update_employee_data(mode='full'):
+    """Run a sync, or wait for the one already running; returns its outcome ('success', 'unchanged', 'empty', 'error' or 'cancelled').
+
+    A 'full' sync fetches every user. A 'refresh' first probes just the IDs, names and managers,
+    and only fetches the users that changed; it misses changes to other fields (titles,
+    departments, ...), which the next full sync picks up.
+    """
+    return current_chart().sync.run(mode)
+
+def sync_employee_data(job):
+    result = 'error'
+    error = None
+    started = time.perf_counter()
+    job.start('token')
+    try:
+        with profiler.profile_sync():
+            result = run_employee_sync(job)
+    except JobCancelled:
+        result = 'cancelled'
+        logger.info(f"[{datetime.now()}] Employee data update cancelled")
+    except Exception as e:
+        error = str(e)
+        logger.error(f"[{datetime.now()}] Error updating employee data: {e}")
+    finally:
+        SYNC_DURATION.observe(time.perf_counter() - started)
+        SYNCS.inc(result=result)
+        # Syncs may run in a process that serves no requests (the gunicorn master)
+        metrics.REGISTRY.flush(force=True)
+        if result in ('success', 'unchanged', 'cancelled'):
+            job.finish('cancelled' if result == 'cancelled' else 'succeeded', changed=result == 'success')
+        else:
+            # Fetch and build errors are recorded on the job as they happen
+            recorded = (jobs.get(job.id) or {}).get('error')
+            job.finish('failed', error=error or recorded or 'No employees fetched from Graph API')
+    return result
+
+def chart_sync(chart):
+    # Coalesces concurrent sync requests (startup bursts, repeated update clicks) into one sync
+    # per chart, registered as a job so its progress can be followed through /api/jobs
+    return SingleFlight(bind(chart, sync_employee_data), chart.path(SYNC_LOCK_FILE), name=f'{chart.name}-sync',
+                        prepare=lambda mode='full': jobs.create('sync', chart=chart.name, mode=mode))
+
+for chart in chart_registry:
+    chart.sync = chart_sync(chart)
+
+def run_employee_sync(job):
+    """Fetch, build and save a new snapshot; returns the sync outcome for metrics"""
+    result = 'error'
     try:
         logger.info(f"[{datetime.now()}] Starting employee data update...")
-        employees = fetch_all_employees()
+        refreshed = refresh_employees(job) if job.fields.get('mode') == 'refresh' else None
+        if refreshed is not None:
+            employees, fingerprints = refreshed
+            if not employees and not fingerprints:
+                LAST_SUCCESSFUL_SYNC.set(time.time())
+                logger.info(f"[{datetime.now()}] Probe found no changes, keeping the current snapshot")
+                return 'unchanged'
+        else:
+            employees = fetch_all_employees(job)
+            fingerprints = employee_fingerprints(employees)
         
         if employees:
-            hierarchy = build_org_hierarchy(employees)
+            job.check_cancelled()
+            job.update(phase='build')
+            with SYNC_PHASE_DURATION.time(phase='build'):
+                hierarchy = build_org_hierarchy(employees)
             
             if hierarchy:
                 settings = load_settings()
-                months_threshold = settings.get('newEmployeeMonths', 3)
-                
-                def update_new_status(node):
-                    if node.get('hireDate'):
-                        try:
-                            hire_date = datetime.fromisoformat(node['hireDate'])
-                            if hire_date.tzinfo:
-                                cutoff_date = datetime.now(hire_date.tzinfo) - timedelta(days=months_threshold * 30)
-                            else:
-                                cutoff_date = datetime.now() - timedelta(days=months_threshold * 30)
-                            node['isNewEmployee'] = hire_date > cutoff_date
-                        except:
-                            node['isNewEmployee'] = False
-                    else:
-                        node['isNewEmployee'] = False
-                    
-                    if node.get('children'):
-                        for child in node['children']:
-                            update_new_status(child)
+                update_new_status(hierarchy, settings.get('newEmployeeMonths', 3))
                 
-                update_new_status(hierarchy)
-                
-                with open(DATA_FILE, 'w') as f:
-                    json.dump(hierarchy, f, indent=2)
+                # Last chance to cancel: once written, the snapshot is live
+                job.check_cancelled()
+                job.update(phase='write')
+                with SYNC_PHASE_DURATION.time(phase='write'):
+                    save_snapshot(hierarchy)
+                    save_fingerprints(fingerprints)
+                result = 'success'
+                LAST_SUCCESSFUL_SYNC.set(time.time())
                 logger.info(f"[{datetime.now()}] Successfully updated employee data. Total employees: {len(employees)}")
             else:
+                job.update(error='Could not build hierarchy from employee data')
                 logger.error(f"[{datetime.now()}] Could not build hierarchy from employee data")
         else:
+            result = 'empty'
             logger.error(f"[{datetime.now()}] No employees fetched from Graph API")
+    except JobCancelled:
+        raise
     except Exception as e:
+        job.update(error=str(e))
         logger.error(f"[{datetime.now()}] Error updating employee data: {e}")
+    return result
 
-def schedule_updates():
-    global scheduler_running
-    
-    settings = load_settings()
-    
-    if os.environ.get('RUN_INITIAL_UPDATE', 'true').lower() == 'true':
-        logger.info(f"[{datetime.now()}] Running initial employee data update on startup...")
-        update_employee_data()
-    
-    if settings.get('autoUpdateEnabled', True):
-        update_time = settings.get('updateTime', '20:00')
-        schedule.every().day.at(update_time).do(update_employee_data)
-        logger.info(f"Scheduled daily updates at {update_time}")
-    
-    while scheduler_running:
-        schedule.run_pending()
-        time.sleep(60)
+scheduler = Scheduler()
+schedule_settings_signature = None
+
+def settings_signature():
+    signature = []
+    for chart in chart_registry:
+        try:
+            st = os.stat(chart.path(SETTINGS_FILE))
+            signature.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def scheduled_jobs():
+    """The recurring jobs of every chart, plus the check for settings saved by another process"""
+    scheduled = [ScheduledJob('settings-check', Every(SETTINGS_CHECK_INTERVAL), reload_schedule_if_changed)]
+    for chart in chart_registry:
+        with charts.using(chart):
+            scheduled.extend(chart_scheduled_jobs(chart, load_settings()))
+    return scheduled
+
+def chart_scheduled_jobs(chart, settings):
+    """The recurring jobs asked for by a chart's settings; invalid entries are logged and left out"""
+    wanted = []
+    if settings.get('autoUpdateEnabled', True) and chart.source == 'graph':
+        wanted.append(('full-rebuild', lambda: Daily(settings.get('updateTime', '20:00')),
+                       lambda: update_employee_data('full'), SCHEDULE_JITTER_SECONDS))
+        try:
+            interval = int(settings.get('refreshIntervalMinutes') or 0)
+        except (TypeError, ValueError):
+            logger.error(f"Not scheduling refresh: invalid refreshIntervalMinutes {settings.get('refreshIntervalMinutes')!r}")
+            interval = 0
+        if interval > 0:
+            # Short intervals get proportionally less jitter
+            wanted.append(('refresh', lambda: Every(interval * 60),
+                           lambda: update_employee_data('refresh'), min(SCHEDULE_JITTER_SECONDS, interval * 6)))
+    if settings.get('historyCompactionDay'):
+        wanted.append(('history-compaction',
+                       lambda: Weekly(settings['historyCompactionDay'], settings.get('historyCompactionTime', '03:00')),
+                       chart.history.compact, SCHEDULE_JITTER_SECONDS))
+    scheduled = []
+    # Jobs of the default chart keep their unprefixed names
+    prefix = '' if not chart.prefix else f'{chart.name}:'
+    for name, cadence, func, jitter in wanted:
+        try:
+            scheduled.append(ScheduledJob(prefix + name, cadence(), bind(chart, func), jitter))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Not scheduling {prefix + name}: {e}")
+    return scheduled
+
+def configure_schedule():
+    """Apply the current settings to the schedule, if this process runs it"""
+    global schedule_settings_signature
+    if not scheduler.running():
+        return
+    schedule_settings_signature = settings_signature()
+    scheduler.configure(scheduled_jobs())
+
+def reload_schedule_if_changed():
+    if settings_signature() != schedule_settings_signature:
+        logger.info("Settings changed, updating the schedule")
+        configure_schedule()
 
 def start_scheduler():
-    global scheduler_running
-    with scheduler_lock:
-        if not scheduler_running:
-            scheduler_running = True
-            scheduler_thread = threading.Thread(target=schedule_updates, daemon=True)
-            scheduler_thread.start()
-            logger.info("Scheduler started")
+    if not scheduler.start():
+        return
+    configure_schedule()
+    if os.environ.get('RUN_INITIAL_UPDATE', 'true').lower() == 'true':
+        logger.info(f"[{datetime.now()}] Running initial employee data update on startup...")
+        for chart in chart_registry:
+            if chart.source == 'graph':
+                chart.sync.start('full')
 
 def stop_scheduler():
-    global scheduler_running
-    with scheduler_lock:
-        scheduler_running = False
-        logger.info("Scheduler stopped")
-
-def restart_scheduler():
-    """Restart scheduler with new settings"""
-    stop_scheduler()
-    time.sleep(2)
-    schedule.clear()
-    start_scheduler()
-
-def get_template(template_name):
-    """Load HTML template from file"""
-    possible_paths = [
-        f'templates/{template_name}',
-        template_name,
-        os.path.join(os.path.dirname(__file__), 'templates', template_name),
-        os.path.join(os.path.dirname(__file__), template_name)
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    logger.info(f"Loading template from: {path}")
-                    return f.read()
-            except Exception as e:
-                logger.error(f"Error reading {path}: {e}")
-    
-    logger.error(f"{template_name} not found in any expected location")
-    return f"<h1>Error: {template_name} not found</h1>"
+    scheduler.stop()
+
+def render_page(template_name):
+    """Render one of the HTML pages from the compiled template cache"""
+    html = templates.render(template_name, chart_base=current_chart().prefix)
+    if html is None:
+        logger.error(f"{template_name} not found in any expected location")
+        return f"<h1>Error: {template_name} not found</h1>"
+    return html
+
+def warming_up_response():
+    """Answer for requests that need data while the very first sync is still running"""
+    chart = current_chart()
+    if chart.source == 'csv':
+        return jsonify({'error': 'No employee data has been imported into this chart yet'}), 404
+    # Read from the job files rather than chart.sync, as the sync may have run in another process (the gunicorn master)
+    job = jobs.latest('sync', chart=chart.name)
+    if job is None or job.get('state') in ACTIVE_STATES:
+        message = 'Employee data is being loaded for the first time, please retry shortly'
+    else:
+        message = 'Employee data could not be loaded yet. Check the Azure AD configuration; the update will be retried.'
+    response = jsonify({'error': message, 'warmingUp': True})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(WARMING_UP_RETRY_AFTER)
+    return response
+
+def ensure_snapshot():
+    """Start a sync in the background if there is no data file yet; True if there is data to serve.
+
+    Existing data is always served as-is, even while a newer snapshot is being fetched.
+    """
+    chart = current_chart()
+    data_file = chart.path(DB_FILE if chart.store else DATA_FILE)
+    if chart.store.exists() if chart.store else os.path.exists(data_file):
+        return True
+    if chart.source == 'graph' and chart.sync.start(cooldown=WARMING_UP_SYNC_COOLDOWN)[1]:
+        logger.warning(f"Data file {data_file} not found, started a sync")
+    return False
+
+def request_route():
+    # The route pattern rather than the path, to keep the number of metric series bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+    g.profile = profiler.begin_request(request_route())
+
+@app.after_request
+def record_request_metrics(response):
+    finish = request_recorder(response.status_code)
+    if response.is_streamed:
+        # A streamed body is produced after this returns, so the request is timed (and
+        # profiled) until its last chunk has been sent
+        response.response = RecordedBody(response.iter_encoded(), finish)
+    else:
+        finish(response.content_length)
+    return response
+
+@app.teardown_request
+def end_failed_request_profile(exc):
+    # after_request is skipped when a view raises
+    end_request_profile(g.pop('profile', None), request.method, request.full_path.rstrip('?'), 500 if exc else None)
+
+def end_request_profile(handle, method, path, status):
+    if handle is not None:
+        try:
+            profiler.end_request(handle, method, path, status)
+        except Exception as e:
+            logger.error(f"Error saving request profile: {e}")
+
+def request_recorder(status):
+    """finish(size) recording the current request's metrics and profile, which works after the request has ended"""
+    handle = g.pop('profile', None)
+    started = g.get('metrics_started')
+    route = request_route()
+    method = request.method
+    path = request.full_path.rstrip('?')
+    def finish(size):
+        end_request_profile(handle, method, path, status)
+        if started is not None:
+            HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=method)
+            HTTP_REQUESTS.inc(route=route, method=method, status=status)
+            if size is not None:
+                HTTP_RESPONSE_SIZE.observe(size, route=route)
+            metrics.REGISTRY.flush()
+    return finish
+
+class RecordedBody:
+    """A streamed response body that calls finish(bytes sent) once it is done with, even if the client went away"""
+
+    def __init__(self, chunks, finish):
+        self.chunks = chunks
+        self.finish = finish
+        self.size = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        close = getattr(self.chunks, 'close', None)
+        if close:
+            close()
+        self.finish(self.size)
+
+change_feed_generation = {'signature': None, 'generation': 0}
+
+@metrics.REGISTRY.on_collect
+def collect_snapshot_metrics():
+    # Snapshot gauges describe the default chart
+    chart = chart_registry.default
+    if chart.store:
+        if not chart.store.exists():
+            return
+        written = chart.store.written_at()
+    else:
+        if file_signature(chart.path(DATA_FILE)) is None:
+            return
+        written = os.path.getmtime(chart.path(DATA_FILE))
+    SNAPSHOT_AGE.set(time.time() - written)
+    feed_signature = file_signature(chart.path(CHANGES_FILE))
+    if feed_signature != change_feed_generation['signature']:
+        with charts.using(chart):
+            generation = load_change_feed().get('generation', 0)
+        change_feed_generation.update(signature=feed_signature, generation=generation)
+    SNAPSHOT_GENERATION.set(change_feed_generation['generation'])
+    if chart.store:
+        SNAPSHOT_NODES.set(chart.store.count())
+        return
+    snapshot = chart.snapshots.get()
+    if snapshot:
+        SNAPSHOT_NODES.set(snapshot.count)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of request, sync, Graph API and cache metrics"""
+    try:
+        return metrics.REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/')
 def index():
-    return render_template_string(get_template('index.html'))
+    return render_page('index.html')
 
 @app.route('/configure')
 def configure():
-    return render_template_string(get_template('configureme.html'))
+    return render_page('configureme.html')
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    if filename == 'icon.png':
-        custom_logo = os.path.join('static', 'icon_custom.png')
-        if os.path.exists(custom_logo):
-            return send_from_directory('static', 'icon_custom.png')
-    return send_from_directory('static', filename)
+    """Static files, with the uploaded logo (if any) standing in for icon.png"""
+    response = static_assets.serve(filename)
+    if response is None:
+        abort(404)
+    return response
+
+def tree_response(tree):
+    """Stream a hierarchy as JSON so the full tree is never held in memory as one string"""
+    return Response(iter_json(tree), mimetype='application/json')
+
+# Collapsed views up to this many levels are kept per snapshot; deeper ones are built per request
+MAX_CACHED_COLLAPSE_LEVEL = 6
+
+def parse_collapse_level(value):
+    """Number of levels to send, or None for the whole tree ('all' or not given)"""
+    if value in (None, '', 'all'):
+        return None
+    levels = int(value)
+    if levels < 1:
+        raise ValueError(value)
+    return levels
+
+def collapsed_tree_response(root, levels, root_id=None, snapshot=None):
+    """The hierarchy (or the subtree under root_id) cut off after the given number of levels"""
+    if root_id:
+        root = snapshot.by_id.get(root_id) if snapshot else next(
+            (node for node, _, _ in iter_hierarchy(root) if node.get('id') == root_id), None)
+        if root is None:
+            return jsonify({'error': 'Employee not found'}), 404
+    if levels is None:
+        return tree_response(root)
+    if snapshot is None:
+        descendants = count_descendants([node for node, _, _ in iter_hierarchy(root)])
+        return tree_response(truncate_tree(root, levels, descendants))
+    if root_id or levels > MAX_CACHED_COLLAPSE_LEVEL:
+        return tree_response(truncate_tree(root, levels, snapshot.descendants))
+
+    key = ('collapsed', levels)
+    body = snapshot.views.get(key)
+    CACHE_LOOKUPS.inc(cache='collapsed_view', result='miss' if body is None else 'hit')
+    if body is None:
+        body = ''.join(iter_json(truncate_tree(root, levels, snapshot.descendants)))
+        snapshot.views[key] = body
+    return Response(body, mimetype='application/json')
+
+def store_tree_response(store, levels, root_id=None):
+    """Like collapsed_tree_response(), streaming the hierarchy from a chart's SQLite store"""
+    if root_id and not store.contains(root_id):
+        return jsonify({'error': 'Employee not found'}), 404
+    annotate, annotation_key = store_annotator()
+    counts = levels is not None
+    if root_id or levels is None or levels > MAX_CACHED_COLLAPSE_LEVEL:
+        return Response(iter_rows_json(store.rows(root_id, levels), annotate, counts), mimetype='application/json')
+
+    version = (store.version(), annotation_key)
+    key = ('collapsed', levels, version)
+    with store.lock:
+        body = store.views.get(key)
+    CACHE_LOOKUPS.inc(cache='collapsed_view', result='miss' if body is None else 'hit')
+    if body is None:
+        body = ''.join(iter_rows_json(store.rows(None, levels), annotate, counts))
+        with store.lock:
+            # Views of an older org or older annotations won't be asked for again
+            for stale in [cached for cached in store.views if cached[2] != version]:
+                del store.views[stale]
+            store.views[key] = body
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/employees')
 def get_employees():
     try:
-        if not os.path.exists(DATA_FILE):
-            update_employee_data()
+        levels = parse_collapse_level(request.args.get('collapseLevel'))
+    except ValueError:
+        return jsonify({'error': "collapseLevel must be a positive number or 'all'"}), 400
+    root_id = request.args.get('root')
+
+    as_of = request.args.get('asOf')
+    if as_of:
+        try:
+            data = load_snapshot_as_of(parse_as_of(as_of))
+        except ValueError:
+            return jsonify({'error': 'asOf must be a date in YYYY-MM-DD format'}), 400
+        except Exception as e:
+            logger.error(f"Error loading history for {as_of}: {e}")
+            return jsonify({'error': str(e)}), 500
+        if not data:
+            return jsonify({'error': f'No history available for {as_of}'}), 404
+        return collapsed_tree_response(data, levels, root_id)
+
+    try:
+        if not ensure_snapshot():
+            return warming_up_response()
         
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
+        store = current_chart().store
+        if store:
+            return store_tree_response(store, levels, root_id)
         
-        if data:
-            settings = load_settings()
-            months_threshold = settings.get('newEmployeeMonths', 3)
-            
-            def update_new_status(node):
-                if node.get('hireDate'):
-                    try:
-                        hire_date = datetime.fromisoformat(node['hireDate'])
-                        if hire_date.tzinfo:
-                            cutoff_date = datetime.now(hire_date.tzinfo) - timedelta(days=months_threshold * 30)
-                        else:
-                            cutoff_date = datetime.now() - timedelta(days=months_threshold * 30)
-                        node['isNewEmployee'] = hire_date > cutoff_date
-                    except:
-                        node['isNewEmployee'] = False
-                else:
-                    node['isNewEmployee'] = False
-                
-                if node.get('children'):
-                    for child in node['children']:
-                        update_new_status(child)
-            
-            update_new_status(data)
+        snapshot = get_current_snapshot()
+        data = snapshot.root if snapshot else None
+        if data and (levels or root_id):
+            return collapsed_tree_response(data, levels, root_id, snapshot)
         
         if not data:
+            # The data file is there but holds no org; a sync replaces it in the background
             logger.warning("No hierarchical data available")
-            employees = fetch_all_employees()
-            if employees:
-                data = {
-                    'id': 'root',
-                    'name': 'Organization',
-                    'title': 'All Employees',
-                    'department': '',
-                    'email': '',
-                    'phone': '',
-                    'location': '',
-                    'children': employees
-                }
-            else:
-                data = {
-                    'id': 'root',
-                    'name': 'No Data',
-                    'title': 'Please check configuration',
-                    'children': []
-                }
+            if current_chart().source == 'graph':
+                current_chart().sync.start(cooldown=WARMING_UP_SYNC_COOLDOWN)
+            return warming_up_response()
         
-        return jsonify(data)
+        return tree_response(data)
     except Exception as e:
         logger.error(f"Error in get_employees: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Settings that change what the scheduler runs, and when
+SCHEDULE_SETTINGS = {'autoUpdateEnabled', 'updateTime', 'refreshIntervalMinutes',
+                     'historyCompactionDay', 'historyCompactionTime'}
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 def handle_settings():
     if request.method == 'GET':
@@ -457,8 +1256,8 @@ def handle_settings():
             current_settings.update(new_settings)
             
             if save_settings(current_settings):
-                if ('updateTime' in new_settings or 'autoUpdateEnabled' in new_settings):
-                    threading.Thread(target=restart_scheduler).start()
+                if SCHEDULE_SETTINGS & set(new_settings):
+                    configure_schedule()
                 
                 return jsonify({'success': True})
             else:
@@ -467,6 +1266,16 @@ def handle_settings():
             logger.error(f"Error updating settings: {e}")
             return jsonify({'error': str(e)}), 500
 
+def custom_logo_name():
+    """File in static/ holding the current chart's uploaded logo"""
+    chart = current_chart()
+    return 'icon_custom.png' if not chart.prefix else f'icon_custom_{chart.name}.png'
+
+def logo_path():
+    """URL of the current chart's uploaded logo; the default chart's replaces icon.png"""
+    chart = current_chart()
+    return '/static/icon.png' if not chart.prefix else f'/static/{custom_logo_name()}'
+
 @app.route('/api/upload-logo', methods=['POST'])
 def upload_logo():
     try:
@@ -478,13 +1287,13 @@ def upload_logo():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
-            custom_logo_path = os.path.join('static', 'icon_custom.png')
-            file.save(custom_logo_path)
+            logo_name = custom_logo_name()
+            file.save(os.path.join('static', logo_name))
             settings = load_settings()
-            settings['logoPath'] = '/static/icon.png'
+            settings['logoPath'] = logo_path()
             save_settings(settings)
             
-            return jsonify({'success': True, 'path': '/static/icon.png'})
+            return jsonify({'success': True, 'path': logo_path()})
         else:
             return jsonify({'error': 'Invalid file type'}), 400
     except Exception as e:
@@ -494,7 +1303,7 @@ def upload_logo():
 @app.route('/api/reset-logo', methods=['POST'])
 def reset_logo():
     try:
-        custom_logo_path = os.path.join('static', 'icon_custom.png')
+        custom_logo_path = os.path.join('static', custom_logo_name())
         if os.path.exists(custom_logo_path):
             os.remove(custom_logo_path)
         
@@ -510,13 +1319,13 @@ def reset_logo():
 @app.route('/api/reset-all-settings', methods=['POST'])
 def reset_all_settings():
     try:
-        custom_logo_path = os.path.join('static', 'icon_custom.png')
+        custom_logo_path = os.path.join('static', custom_logo_name())
         if os.path.exists(custom_logo_path):
             os.remove(custom_logo_path)
         
-        save_settings(DEFAULT_SETTINGS)
+        save_settings(default_settings())
         
-        threading.Thread(target=restart_scheduler).start()
+        configure_schedule()
         
         return jsonify({'success': True})
     except Exception as e:
@@ -531,29 +1340,20 @@ def search_employees():
         return jsonify([])
     
     try:
-        if not os.path.exists(DATA_FILE):
-            logger.warning(f"Data file {DATA_FILE} not found, attempting to fetch data")
-            update_employee_data()
+        if not ensure_snapshot():
+            return warming_up_response()
         
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-        else:
+        store = current_chart().store
+        if store:
+            annotate, _ = store_annotator()
+            return Response(store.iter_subtrees_json(store.search(query, 10), annotate), mimetype='application/json')
+        
+        snapshot = get_current_snapshot()
+        if not snapshot:
             logger.error("Could not create or find employee data file")
             return jsonify([])
         
-        def flatten(node, results=None):
-            if results is None:
-                results = []
-            if node and isinstance(node, dict):
-                results.append(node)
-                children = node.get('children', [])
-                if children and isinstance(children, list):
-                    for child in children:
-                        flatten(child, results)
-            return results
-        
-        all_employees = flatten(data)
+        all_employees = snapshot.employees
         
         results = []
         for emp in all_employees:
@@ -596,82 +1396,408 @@ def search_employees():
 @app.route('/api/employee/<employee_id>')
 def get_employee(employee_id):
     try:
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-        
-        def find_employee(node, target_id):
-            if node.get('id') == target_id:
-                return node
-            for child in node.get('children', []):
-                result = find_employee(child, target_id)
-                if result:
-                    return result
-            return None
-        
-        employee = find_employee(data, employee_id)
+        as_of = request.args.get('asOf')
+        if as_of:
+            try:
+                data = load_snapshot_as_of(parse_as_of(as_of))
+            except ValueError:
+                return jsonify({'error': 'asOf must be a date in YYYY-MM-DD format'}), 400
+            if not data:
+                return jsonify({'error': f'No history available for {as_of}'}), 404
+            employee = next((node for node, _, _ in iter_hierarchy(data) if node.get('id') == employee_id), None)
+        elif current_chart().store:
+            return store_tree_response(current_chart().store, None, employee_id)
+        else:
+            snapshot = get_current_snapshot()
+            employee = snapshot.by_id.get(employee_id) if snapshot else None
         
         if employee:
-            return jsonify(employee)
+            return tree_response(employee)
         else:
             return jsonify({'error': 'Employee not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Export format -> (content type, file extension, encoder)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', iter_csv),
+    'jsonl': ('application/x-ndjson', 'jsonl', iter_jsonl)
+}
+
+def store_records(store, root_id=None):
+    """Export records streamed from a chart's SQLite store, or None if root_id is unknown"""
+    if root_id and not store.contains(root_id):
+        return None
+    chain = store.chain(root_id) if root_id else []
+    rows = ((json.loads(data), depth, reports, descendants)
+            for _, _, data, depth, reports, descendants in store.rows(root_id))
+    return iter_row_records(rows, chain)
+
+@app.route('/api/export')
+def export_employees():
+    """Stream a flat, one-row-per-employee export of the org (or of the subtree under ?root=)"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    root_id = request.args.get('root')
+    as_of = request.args.get('asOf')
+
+    try:
+        records = None
+        if as_of:
+            try:
+                day = parse_as_of(as_of)
+            except ValueError:
+                return jsonify({'error': 'asOf must be a date in YYYY-MM-DD format'}), 400
+            data = load_snapshot_as_of(day)
+            if not data:
+                return jsonify({'error': f'No history available for {as_of}'}), 404
+            descendants = None
+        elif current_chart().store:
+            if not ensure_snapshot():
+                return warming_up_response()
+            records = store_records(current_chart().store, root_id)
+            if records is None:
+                return jsonify({'error': 'Employee not found'}), 404
+        else:
+            if not ensure_snapshot():
+                return warming_up_response()
+            snapshot = get_current_snapshot()
+            if not snapshot or not snapshot.root:
+                return jsonify({'error': 'No employee data available'}), 404
+            data = snapshot.root
+            descendants = snapshot.descendants
+
+        if records is None:
+            chain = []
+            if root_id:
+                data, chain = locate(data, root_id)
+                if data is None:
+                    return jsonify({'error': 'Employee not found'}), 404
+            if descendants is None:
+                descendants = count_descendants([node for node, _, _ in iter_hierarchy(data)])
+            records = iter_records(data, descendants, chain)
+    except Exception as e:
+        logger.error(f"Error preparing export: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    content_type, extension, encode = EXPORT_FORMATS[export_format]
+    body = encode(records)
+    compress = bool(request.accept_encodings['gzip'])
+    response = Response(gzip_chunks(body) if compress else body, content_type=content_type)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    name = f"employees-{as_of or datetime.now().date().isoformat()}{'-' + secure_filename(root_id) if root_id else ''}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+    return response
+
+@app.route('/api/changes')
+def get_changes():
+    """Return change feed entries newer than the given generation"""
+    try:
+        feed = load_change_feed()
+        generation = feed.get('generation', 0)
+        entries = feed.get('entries', [])
+
+        since = request.args.get('since', type=int)
+        if since is None:
+            since = generation - 1
+
+        changes = [entry for entry in entries if entry['generation'] > since]
+        oldest = entries[0]['generation'] if entries else generation + 1
+
+        return jsonify({
+            'generation': generation,
+            'since': since,
+            'truncated': since < oldest - 1,
+            'changes': changes
+        })
+    except Exception as e:
+        logger.error(f"Error in get_changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history')
+def get_history():
+    """List the dates that can be used with asOf"""
+    try:
+        return jsonify({'dates': current_chart().history.dates()})
+    except Exception as e:
+        logger.error(f"Error listing history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def csv_only_response():
+    """Error response for sync requests to a chart that is only updated by CSV import, else None"""
+    chart = current_chart()
+    if chart.source == 'graph':
+        return None
+    return jsonify({'error': f'Chart {chart.name} is updated by CSV import only'}), 409
+
 @app.route('/api/update-now', methods=['POST'])
 def trigger_update():
+    denied = csv_only_response()
+    if denied:
+        return denied
+    mode = request.args.get('mode', 'full')
+    if mode not in SYNC_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(SYNC_MODES)}"}), 400
     try:
-        threading.Thread(target=update_employee_data).start()
-        return jsonify({'message': 'Update started'}), 200
+        return jsonify(start_sync_job(mode)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def start_sync_job(mode='full'):
+    """Start a sync (or join the running one) and describe its job for the caller to poll"""
+    chart = current_chart()
+    job, started = chart.sync.start(mode)
+    # The job of a run in this process comes with it, even if the run has already finished;
+    # only a run in another process has to be looked up
+    job_id = job.id if job else (jobs.active('sync', chart=chart.name) or {}).get('id')
+    body = {
+        'message': 'Update started' if started else 'Update already in progress',
+        'jobId': job_id,
+        'statusUrl': f"/api/jobs/{job_id}" if job_id else None
+    }
+    if not started:
+        body['alreadyRunning'] = True
+    return body
+
+def run_csv_import(job, upload_path, columns, root_id):
+    """Import an uploaded CSV in the background and publish it as the new snapshot"""
+    staged_path = os.path.join(IMPORT_DIR, f'{job.id}.snapshot.json')
+    report = ImportReport()
+
+    def progress(rows):
+        job.check_cancelled()
+        job.update(rowsRead=rows)
+
+    try:
+        job.start('reading')
+        import_csv(
+            upload_path,
+            staged_path,
+            columns=columns,
+            root_id=root_id,
+            progress=progress,
+            report=report
+        )
+
+        job.check_cancelled()
+        job.update(phase='publishing', rowsRead=report.rows_read)
+        save_snapshot(read_snapshot(staged_path))
+        discard_fingerprints()
+
+        job.finish('succeeded', report=report.to_dict())
+        logger.info(f"CSV import {job.id} published {report.employees} employees")
+    except JobCancelled:
+        logger.info(f"CSV import {job.id} cancelled")
+        job.finish('cancelled', report=report.to_dict())
+    except ImportValidationError as e:
+        logger.warning(f"CSV import {job.id} rejected: {e}")
+        job.finish('rejected', error=str(e), report=e.report.to_dict())
+    except Exception as e:
+        logger.error(f"CSV import {job.id} failed: {e}")
+        job.finish('failed', error=str(e), report=report.to_dict())
+    finally:
+        for path in (upload_path, staged_path):
+            if os.path.exists(path):
+                os.remove(path)
+        import_lock.release()
+
+def discard_upload(upload_path):
+    """Clean up after an upload that was rejected before its import started"""
+    import_lock.release()
+    if upload_path and os.path.exists(upload_path):
+        os.remove(upload_path)
+
+@app.route('/api/import-csv', methods=['POST'])
+@require_admin
+def upload_csv():
+    """Accept a CSV (or gzipped CSV) upload and import it without restarting the server"""
+    if request.content_length and request.content_length > MAX_CSV_SIZE:
+        return jsonify({'error': f'Upload larger than {MAX_CSV_SIZE // (1024 * 1024)} MB'}), 413
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'error': 'No file provided'}), 400
+
+    try:
+        columns = json.loads(request.form.get('columns') or '{}')
+        if not isinstance(columns, dict):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'columns must be a JSON object mapping fields to CSV columns'}), 400
+    root_id = request.form.get('root') or None
+
+    chart = current_chart()
+    if chart.source != 'csv':
+        return jsonify({'error': f'Chart {chart.name} is synced from Azure AD; CSV imports need a chart with "source": "csv"'}), 409
+    if chart.sync.running():
+        return jsonify({'error': 'A sync is running for this chart'}), 409
+    if not import_lock.acquire():
+        return jsonify({'error': 'Another import is already running'}), 409
+
+    import_id = uuid.uuid4().hex[:12]
+    upload_path = None
+    try:
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        is_gzip = file.stream.read(2) == b'\x1f\x8b'
+        file.stream.seek(0)
+        upload_path = os.path.join(IMPORT_DIR, f'{import_id}.csv' + ('.gz' if is_gzip else ''))
+        file.save(upload_path)
+
+        check_columns(upload_path, columns)
+
+        job = jobs.create('import', chart=chart.name, filename=secure_filename(file.filename), rowsRead=0)
+        status = job.update(importId=job.id)
+        threading.Thread(
+            target=bind(chart, run_csv_import),
+            args=(job, upload_path, columns, root_id),
+            daemon=True
+        ).start()
+        return jsonify(status), 202
+    except ImportValidationError as e:
+        discard_upload(upload_path)
+        return jsonify({'error': str(e), 'report': e.report.to_dict()}), 400
+    except (UnicodeDecodeError, OSError) as e:
+        discard_upload(upload_path)
+        return jsonify({'error': f'Could not read uploaded file: {e}'}), 400
+    except Exception as e:
+        discard_upload(upload_path)
+        logger.error(f"Error starting CSV import: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/import-csv/<import_id>')
+@require_admin
+def csv_import_status(import_id):
+    status = jobs.get(import_id)
+    if not status or status.get('kind') != 'import':
+        return jsonify({'error': 'Import not found'}), 404
+    return jsonify(status)
+
+def job_access_denied(status):
+    """Error response if the caller may not see or cancel this job; imports are admin-only like their upload"""
+    if status.get('kind') != 'import':
+        return None
+    return require_admin(lambda: None)()
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Recent sync jobs (and imports, for admins), newest first"""
+    kind = request.args.get('kind')
+    limit = request.args.get('limit', 20, type=int)
+    try:
+        listed = [status for status in jobs.list(kind, limit=max(1, min(limit, 100)))
+                  if job_access_denied(status) is None]
+        return jsonify({'jobs': listed})
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    status = jobs.get(job_id)
+    if not status:
+        return jsonify({'error': 'Job not found'}), 404
+    return job_access_denied(status) or jsonify(status)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    status = jobs.get(job_id)
+    if not status:
+        return jsonify({'error': 'Job not found'}), 404
+    denied = job_access_denied(status)
+    if denied:
+        return denied
+    if status.get('state') not in ('queued', 'running'):
+        return jsonify(dict(status, error='Job has already finished')), 409
+    return jsonify(jobs.cancel(job_id)), 202
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@require_admin
+def profiling_settings():
+    """Show or change what is profiled, and list the captured profiles"""
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        slow_ms = options.get('slowRequestMs')
+        next_requests = options.get('profileNextRequests', 0)
+        routes = options.get('routes') or []
+        if slow_ms is not None and (not isinstance(slow_ms, (int, float)) or slow_ms <= 0):
+            return jsonify({'error': 'slowRequestMs must be a positive number of milliseconds, or null'}), 400
+        if not isinstance(next_requests, int) or not 0 <= next_requests <= 1000:
+            return jsonify({'error': 'profileNextRequests must be a whole number between 0 and 1000'}), 400
+        if not isinstance(routes, list) or not all(isinstance(route, str) for route in routes):
+            return jsonify({'error': 'routes must be a list of route patterns such as /api/search'}), 400
+        try:
+            profiler.configure(slow_ms, next_requests, bool(options.get('profileNextSync')), routes)
+            logger.info(f"Profiling configured: slowRequestMs={slow_ms}, nextRequests={next_requests}, "
+                        f"nextSync={bool(options.get('profileNextSync'))}, routes={routes}")
+        except Exception as e:
+            logger.error(f"Error configuring profiling: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    try:
+        return jsonify({'config': profiler.status(), 'profiles': profiler.list_profiles()})
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profiling/<name>')
+@require_admin
+def download_profile(name):
+    path = profiler.profile_path(name)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
 @app.route('/search-test')
 def search_test():
-    return render_template_string(get_template('search_test.html'))
+    return render_page('search_test.html')
 
 @app.route('/api/debug-search')
 def debug_search():
     """Debug endpoint to check search functionality"""
     try:
+        chart = current_chart()
+        data_file = chart.path(DB_FILE if chart.store else DATA_FILE)
         info = {
-            'data_file_exists': os.path.exists(DATA_FILE),
-            'data_file_path': os.path.abspath(DATA_FILE) if os.path.exists(DATA_FILE) else 'Not found',
-            'data_file_size': os.path.getsize(DATA_FILE) if os.path.exists(DATA_FILE) else 0,
+            'chart': chart.name,
+            'storage': chart.storage,
+            'data_file_exists': os.path.exists(data_file),
+            'data_file_path': os.path.abspath(data_file) if os.path.exists(data_file) else 'Not found',
+            'data_file_size': os.path.getsize(data_file) if os.path.exists(data_file) else 0,
         }
         
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                
-                def count_employees(node):
-                    count = 1
-                    for child in node.get('children', []):
-                        count += count_employees(child)
-                    return count
-                
-                info['total_employees'] = count_employees(data) if data else 0
-                info['root_employee'] = data.get('name', 'Unknown') if data else 'No data'
-                info['has_children'] = bool(data.get('children')) if data else False
-                
-                def flatten(node, results=None):
-                    if results is None:
-                        results = []
-                    if node and isinstance(node, dict):
-                        results.append({
-                            'id': node.get('id'),
-                            'name': node.get('name'),
-                            'title': node.get('title'),
-                            'department': node.get('department')
-                        })
-                        children = node.get('children', [])
-                        if children and isinstance(children, list):
-                            for child in children:
-                                flatten(child, results)
-                    return results
-                
-                all_employees = flatten(data)
-                info['sample_employees'] = all_employees[:5] if all_employees else []
-                info['searchable_count'] = len(all_employees)
+        if chart.store:
+            if chart.store.exists():
+                rows = list(islice(chart.store.rows(), 5))
+                sample = [json.loads(data) for _, _, data, _, _, _ in rows]
+                info['total_employees'] = info['searchable_count'] = chart.store.count()
+                info['root_employee'] = sample[0].get('name', 'Unknown') if sample else 'No data'
+                info['has_children'] = bool(rows and rows[0][4])
+                info['sample_employees'] = [
+                    {key: node.get(key) for key in ('id', 'name', 'title', 'department')} for node in sample
+                ]
+            else:
+                info['error'] = 'Database has no employees yet. Try triggering an update.'
+            return jsonify(info)
+        
+        snapshot = get_current_snapshot()
+        if snapshot:
+            data = snapshot.root
+            info['total_employees'] = snapshot.count if data else 0
+            info['root_employee'] = data.get('name', 'Unknown') if data else 'No data'
+            info['has_children'] = bool(data.get('children')) if data else False
+            info['sample_employees'] = [
+                {
+                    'id': node.get('id'),
+                    'name': node.get('name'),
+                    'title': node.get('title'),
+                    'department': node.get('department')
+                }
+                for node in snapshot.employees[:5]
+            ]
+            info['searchable_count'] = snapshot.count
         else:
             info['error'] = 'Data file does not exist. Try triggering an update.'
             
@@ -685,35 +1811,13 @@ def debug_search():
 
 @app.route('/api/force-update', methods=['POST'])
 def force_update():
-    """Force an immediate update and wait for completion"""
+    """Start an immediate update; poll the returned job for its progress and outcome"""
+    denied = csv_only_response()
+    if denied:
+        return denied
     try:
         logger.info("Force update requested")
-        update_employee_data()
-        
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                
-            def count_employees(node):
-                if not node:
-                    return 0
-                count = 1
-                for child in node.get('children', []):
-                    count += count_employees(child)
-                return count
-                
-            total = count_employees(data)
-            return jsonify({
-                'success': True,
-                'message': f'Data updated successfully. {total} employees in hierarchy.',
-                'file_created': True
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Update completed but no data file created. Check Azure AD credentials.',
-                'file_created': False
-            })
+        return jsonify(dict(start_sync_job(), success=True)), 202
     except Exception as e:
         logger.error(f"Force update error: {e}")
         import traceback
@@ -724,7 +1828,29 @@ def force_update():
             'traceback': traceback.format_exc()
         }), 500
 
-OFFLINE_MODE = os.environ.get('OFFLINE_MODE') == 'true'
+@app.route('/api/charts')
+def list_charts():
+    """The charts served by this process and whether each is loaded in this worker's memory"""
+    return jsonify({
+        'charts': [chart.status() for chart in chart_registry],
+        'memoryBudgetBytes': chart_registry.memory_budget or None
+    })
+
+# Everything but metrics, static files and admin profiling is also served per chart
+# under /c/<chart>/, e.g. /c/sales/api/employees
+SHARED_ENDPOINTS = {'prometheus_metrics', 'serve_static', 'profiling_settings', 'download_profile'}
+
+for rule in list(app.url_map.iter_rules()):
+    if rule.endpoint not in SHARED_ENDPOINTS:
+        app.add_url_rule('/c/<chart>' + rule.rule, endpoint=rule.endpoint, methods=rule.methods)
+
+@app.url_value_preprocessor
+def select_chart(endpoint, values):
+    if values and 'chart' in values:
+        chart = chart_registry.get(values.pop('chart'))
+        if chart is None:
+            abort(404)
+        g.chart = chart
 
 if __name__ != '__main__':
     if not OFFLINE_MODE:
@@ -0,0 +1,230 @@
+"""
+Template and static asset serving.
+
+Templates are read and compiled once per process (and recompiled when the file changes
+if the app runs in debug mode or TEMPLATES_AUTO_RELOAD is set). Static assets referenced
+through asset_url() get a content hash in their URL, e.g. /static/app.1a2b3c4d5e6f.js, so
+they can be cached by browsers forever and still change the moment the file does.
+
+Compressible assets are served gzip or brotli encoded when the browser accepts it. Run
+this module to build precompressed .gz and .br files next to the originals:
+
+    python assets.py
+
+Brotli output needs the optional 'brotli' package; without precompressed files, gzip
+variants are compressed on first use and kept in memory.
+"""
+
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.svg', '.json', '.txt', '.map', '.ico'}
+FINGERPRINT_LENGTH = 12
+FINGERPRINTED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+# Fingerprinted URLs never change content, so they can be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Encodings in order of preference, with the suffix of their precompressed files
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class TemplateCache:
+    """Compiled Jinja templates, looked up in the same places get_template() used to search"""
+
+    def __init__(self, app, search_dirs, auto_reload=False):
+        self.app = app
+        self.search_dirs = search_dirs
+        self.auto_reload = auto_reload
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _find(self, name):
+        for directory in self.search_dirs:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, name):
+        """The compiled template, or None if it can't be found"""
+        cached = self._templates.get(name)
+        if cached is not None and not (self.auto_reload or self.app.debug):
+            return cached[2]
+
+        with self._lock:
+            cached = self._templates.get(name)
+            path = cached[0] if cached else self._find(name)
+            if path is None:
+                return None
+            try:
+                signature = file_signature(path)
+            except FileNotFoundError:
+                self._templates.pop(name, None)
+                return None
+            if cached is None or cached[1] != signature:
+                with open(path, 'r', encoding='utf-8') as f:
+                    template = self.app.jinja_env.from_string(f.read())
+                self.app.logger.info(f"Loaded template {name} from {path}")
+                cached = (path, signature, template)
+                self._templates[name] = cached
+            return cached[2]
+
+    def render(self, name, **context):
+        template = self.get(name)
+        if template is None:
+            return None
+        self.app.update_template_context(context)
+        return template.render(context)
+
+
+class StaticAssets:
+    """Serves a static folder with fingerprinted URLs, cache headers and compressed variants"""
+
+    def __init__(self, directory, overrides=None):
+        self.directory = directory
+        # Logical name -> file that replaces it when present (e.g. an uploaded logo)
+        self.overrides = overrides or {}
+        self._hashes = {}
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def _path(self, filename):
+        override = self.overrides.get(filename)
+        if override and os.path.exists(os.path.join(self.directory, override)):
+            filename = override
+        path = os.path.realpath(os.path.join(self.directory, filename))
+        if not path.startswith(os.path.realpath(self.directory) + os.sep):
+            return None
+        return path
+
+    def content_hash(self, filename):
+        """Short hash of a file's content, cached until the file changes"""
+        path = self._path(filename)
+        signature = file_signature(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        value = digest.hexdigest()[:FINGERPRINT_LENGTH]
+        self._hashes[path] = (signature, value)
+        return value
+
+    def url(self, filename):
+        """URL for a static file, fingerprinted with its content hash (asset_url in templates)"""
+        try:
+            stem, ext = os.path.splitext(filename)
+            return f'/static/{stem}.{self.content_hash(filename)}{ext}'
+        except (OSError, TypeError):
+            return f'/static/{filename}'
+
+    def _accepted_encodings(self):
+        accepted = request.accept_encodings
+        return [(encoding, suffix) for encoding, suffix in ENCODINGS if accepted[encoding]]
+
+    def _gzip_in_memory(self, path, signature):
+        cached = self._compressed.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, 'rb') as f:
+            data = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        with self._lock:
+            self._compressed[path] = (signature, data)
+        return data
+
+    def serve(self, filename):
+        """Response for /static/<filename>, or None if there is no such file"""
+        immutable = False
+        match = FINGERPRINTED_NAME.match(filename)
+        if match and not os.path.exists(os.path.join(self.directory, filename)):
+            filename = match.group('stem') + match.group('ext')
+        path = self._path(filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        if match:
+            # An old fingerprint still gets the current file, just not cached for long
+            immutable = match.group('hash') == self.content_hash(filename)
+
+        signature = file_signature(path)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        etag = f'{signature[0]:x}-{signature[1]:x}'
+        encoding = None
+        body = path
+
+        if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            for candidate, suffix in self._accepted_encodings():
+                variant = path + suffix
+                if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= signature[0]:
+                    encoding, body = candidate, variant
+                    break
+            if encoding is None and request.accept_encodings['gzip']:
+                encoding, body = 'gzip', io.BytesIO(self._gzip_in_memory(path, signature))
+
+        response = send_file(
+            body,
+            mimetype=mimetype,
+            download_name=os.path.basename(filename),
+            etag=f'{etag}-{encoding}' if encoding else etag,
+            last_modified=signature[0] / 1e9,
+            max_age=IMMUTABLE_MAX_AGE if immutable else None,
+            conditional=True
+        )
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def build_precompressed(directory):
+    """Write .gz (and .br, if brotli is installed) files next to every compressible asset"""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+            for suffix, compress in variants:
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+                print(f"{path + suffix}: {len(data)} -> {len(compressed)} bytes")
+    if brotli is None:
+        print("brotli is not installed, so only gzip variants were written (pip install brotli)")
+    return written
+
+
+if __name__ == '__main__':
+    static_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    print(f"Wrote {build_precompressed(static_dir)} precompressed files")
@@ -0,0 +1,229 @@
+"""
+Micro-benchmarks for the org chart's hot paths.
+
+Each benchmark runs against synthetic orgs of several sizes (see synthetic_org.py) inside a
+scratch directory, so your real employee_data.json and settings are never touched. Results
+are saved as JSON so runs from different commits can be compared:
+
+    python benchmarks/run_benchmarks.py                         # 1k, 10k and 100k employees
+    python benchmarks/run_benchmarks.py --sizes 1000,500000 --repeat 3
+    python benchmarks/run_benchmarks.py --only search,employees_api
+    python benchmarks/run_benchmarks.py --compare results/old.json results/new.json
+
+Benchmarks:
+    hierarchy_build  build_org_hierarchy() on the flat employee list a Graph sync produces
+    csv_import       import_csv_to_json.import_csv() from CSV to snapshot file
+    snapshot_load    parsing the snapshot file and building its in-memory indexes
+    snapshot_save    save_snapshot(): write, change feed diff and history entry
+    search           /api/search latency through Flask's test client (per query)
+    employees_api    /api/employees through Flask's test client, including serialization
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_org import generate_employees, write_csv
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+SEARCH_QUERIES = ['al', 'smith', 'engineer', 'finance', 'patel 12', 'no-such-person']
+BENCHMARKS = ['hierarchy_build', 'csv_import', 'snapshot_load', 'snapshot_save', 'search', 'employees_api']
+
+
+def summarize(samples):
+    """Summary statistics for a list of timings in seconds, reported in milliseconds"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=REPO_ROOT, text=True).strip())
+        return commit, dirty
+    except Exception:
+        return 'unknown', False
+
+
+def load_app(workdir):
+    """Import the Flask app with its data files pointed at the scratch directory"""
+    os.environ['OFFLINE_MODE'] = 'true'
+    os.environ['RUN_INITIAL_UPDATE'] = 'false'
+    os.chdir(workdir)
+    import app as app_module
+    return app_module
+
+
+def run_size(app_module, size, repeat, only, workdir, depth, skew):
+    from import_csv_to_json import import_csv
+    from snapshot_io import SnapshotCache
+
+    results = {}
+    employees = generate_employees(size, depth=depth, skew=skew)
+    print(f"\n== {size} employees ==")
+
+    def record(name, samples, **extra):
+        results[name] = dict(summarize(samples), **extra)
+        print(f"  {name:<16} median {results[name]['median_ms']:>10.2f} ms   p95 {results[name]['p95_ms']:>10.2f} ms")
+
+    hierarchy = app_module.build_org_hierarchy(employees)
+    if 'hierarchy_build' in only:
+        record('hierarchy_build', measure(lambda: app_module.build_org_hierarchy(employees), repeat))
+
+    if 'csv_import' in only:
+        csv_path = os.path.join(workdir, f'employees_{size}.csv')
+        write_csv(csv_path, employees)
+        out_path = os.path.join(workdir, f'imported_{size}.json')
+        record('csv_import', measure(lambda: import_csv(csv_path, out_path), repeat),
+               csv_bytes=os.path.getsize(csv_path))
+        os.remove(csv_path)
+        os.remove(out_path)
+
+    # Start every size from a clean set of data files
+    for path in (app_module.DATA_FILE, app_module.CHANGES_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(app_module.HISTORY_DIR, ignore_errors=True)
+
+    if 'snapshot_save' in only:
+        record('snapshot_save', measure(lambda: app_module.save_snapshot(hierarchy), repeat))
+    else:
+        app_module.save_snapshot(hierarchy)
+
+    if 'snapshot_load' in only:
+        record('snapshot_load', measure(lambda: SnapshotCache(app_module.DATA_FILE).get(), repeat),
+               snapshot_bytes=os.path.getsize(app_module.DATA_FILE))
+
+    client = app_module.app.test_client()
+    # Warm up the worker's snapshot cache, as any real request would have
+    client.get('/api/employees')
+
+    if 'search' in only:
+        samples = []
+        for _ in range(repeat):
+            for query in SEARCH_QUERIES:
+                start = time.perf_counter()
+                response = client.get('/api/search', query_string={'q': query})
+                response.get_data()
+                samples.append(time.perf_counter() - start)
+        record('search', samples, queries=len(SEARCH_QUERIES))
+
+    if 'employees_api' in only:
+        sizes = []
+
+        def fetch():
+            response = client.get('/api/employees')
+            sizes.append(len(response.get_data()))
+
+        record('employees_api', measure(fetch, repeat), response_bytes=sizes[-1])
+
+    return results
+
+
+def compare(baseline_path, candidate_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {baseline['commit']} ({baseline['timestamp']})")
+    print(f"Candidate: {candidate['commit']} ({candidate['timestamp']})\n")
+    print(f"{'benchmark':<16} {'size':>8} {'baseline ms':>12} {'candidate ms':>13} {'change':>8}")
+    for size, benches in candidate['results'].items():
+        for name, stats in benches.items():
+            old = baseline['results'].get(size, {}).get(name)
+            if not old:
+                continue
+            change = (stats['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+            print(f"{name:<16} {size:>8} {old['median_ms']:>12.2f} {stats['median_ms']:>13.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the org chart's hot paths")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated headcounts to benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark")
+    parser.add_argument('--only', help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--depth', type=int, default=6, help="Levels below the top-level employee")
+    parser.add_argument('--skew', type=float, default=1.5, help="Fan-out skew (smaller is more skewed)")
+    parser.add_argument('--output', help="Where to save results (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    only = set(args.only.split(',')) if args.only else set(BENCHMARKS)
+    unknown = only - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    commit, dirty = git_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}{'-dirty' if dirty else ''}.json")
+    output = os.path.abspath(output)
+
+    workdir = tempfile.mkdtemp(prefix='orgchart-bench-')
+    try:
+        app_module = load_app(workdir)
+        results = {}
+        for size in sizes:
+            results[str(size)] = run_size(app_module, size, args.repeat, only, workdir, args.depth, args.skew)
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'depth': args.depth,
+        'skew': args.skew,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Synthetic org generator for benchmarks and load tests.
+
+Builds a realistic-looking org of any size: the hierarchy is generated level by level
+so its depth is controlled exactly, managers get a heavy-tailed share of the reports
+at the next level (lower skew values mean a few managers with very large teams), and
+departments, titles and locations are drawn from weighted distributions.
+
+Usage:
+    python benchmarks/synthetic_org.py 10000 --csv employees_10k.csv
+    python benchmarks/synthetic_org.py 100000 --depth 8 --skew 1.2 --json employees_100k.json
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+from datetime import date, timedelta
+
+DEPARTMENTS = [
+    'Engineering', 'Sales', 'Operations', 'Customer Support', 'Marketing', 'Finance',
+    'Human Resources', 'Legal', 'Product', 'IT', 'Facilities', 'Research',
+]
+LOCATIONS = ['Headquarters', 'London', 'New York', 'Berlin', 'Singapore', 'Remote', 'Manchester', 'Austin']
+LEADER_TITLES = ['Director', 'Vice President', 'Head of Department']
+MANAGER_TITLES = ['Manager', 'Senior Manager', 'Team Lead']
+STAFF_TITLES = ['Associate', 'Analyst', 'Engineer', 'Senior Engineer', 'Specialist', 'Coordinator', 'Consultant']
+FIRST_NAMES = ['Alex', 'Jordan', 'Sam', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Drew', 'Robin']
+LAST_NAMES = ['Smith', 'Patel', 'Garcia', 'Nguyen', 'Okafor', 'Kowalski', 'Rossi', 'Tanaka', 'Murphy', 'Silva', 'Cohen', 'Berg']
+
+
+def zipf_weights(count, exponent=1.1):
+    """Weights for a Zipf-like distribution: the first item is the most common"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def level_sizes(headcount, depth):
+    """Split headcount into depth + 1 levels growing by a constant branching factor"""
+    if headcount <= 1 or depth <= 0:
+        return [1] + ([headcount - 1] if headcount > 1 else [])
+    low, high = 1.0, float(headcount)
+    for _ in range(100):
+        branching = (low + high) / 2
+        total = sum(branching ** level for level in range(depth + 1))
+        if total > headcount:
+            high = branching
+        else:
+            low = branching
+    sizes = [max(1, round(low ** level)) for level in range(depth + 1)]
+    sizes[0] = 1
+    # Fix up rounding so the levels add up to exactly the requested headcount
+    sizes[-1] += headcount - sum(sizes)
+    while sizes[-1] <= 0:
+        sizes.pop()
+        sizes[-1] += headcount - sum(sizes)
+    return sizes
+
+
+def generate_employees(headcount=1000, depth=6, skew=1.5, departments=None, department_skew=1.1,
+                       new_hire_ratio=0.05, seed=42):
+    """Generate a flat list of employees in the same shape fetch_all_employees() returns.
+
+    depth is the number of levels below the top-level employee, skew is the Pareto shape used
+    for fan-out (smaller is more skewed) and new_hire_ratio the share hired in the last 90 days.
+    """
+    rng = random.Random(seed)
+    departments = departments or DEPARTMENTS
+    department_weights = zipf_weights(len(departments), department_skew)
+    location_weights = zipf_weights(len(LOCATIONS), 0.8)
+    today = date.today()
+
+    employees = []
+    previous_level = []
+
+    for level, size in enumerate(level_sizes(headcount, depth)):
+        if level == 0:
+            managers = [None]
+        else:
+            weights = [rng.paretovariate(skew) for _ in previous_level]
+            managers = rng.choices(previous_level, weights=weights, k=size)
+
+        current_level = []
+        for manager in managers:
+            index = len(employees)
+            emp_id = f'{index:08x}-0000-4000-8000-{index:012x}'
+
+            if manager is None:
+                title = 'Chief Executive Officer'
+                department = 'Executive'
+            else:
+                if level == 1 or rng.random() < 0.03:
+                    department = rng.choices(departments, weights=department_weights)[0]
+                else:
+                    department = manager['department']
+                if level == 1:
+                    title = rng.choice(LEADER_TITLES)
+                elif level < depth:
+                    title = rng.choice(MANAGER_TITLES)
+                else:
+                    title = rng.choice(STAFF_TITLES)
+                title = f'{title}, {department}'
+
+            if rng.random() < new_hire_ratio:
+                hired = today - timedelta(days=rng.randint(0, 90))
+            else:
+                hired = today - timedelta(days=rng.randint(91, 3650))
+            hire_date = hired.isoformat()
+
+            first = rng.choice(FIRST_NAMES)
+            last = rng.choice(LAST_NAMES)
+            employee = {
+                'id': emp_id,
+                'name': f'{first} {last} {index}',
+                'title': title,
+                'department': department,
+                'email': f'{first.lower()}.{last.lower()}{index}@example.com',
+                'phone': f'+44 7700 {index % 1000000:06d}',
+                'location': rng.choices(LOCATIONS, weights=location_weights)[0],
+                'managerId': manager['id'] if manager else None,
+                'employeeHireDate': hire_date,
+                'hireDate': f'{hire_date}T00:00:00',
+                'isNewEmployee': False,
+                'children': []
+            }
+            employees.append(employee)
+            current_level.append(employee)
+        previous_level = current_level
+
+    return employees
+
+
+CSV_COLUMNS = ['id', 'name', 'title', 'department', 'email', 'phone', 'location', 'managerId', 'employeeHireDate']
+
+
+def write_csv(path, employees):
+    """Write employees in the format import_csv_to_json.py expects"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for emp in employees:
+            writer.writerow([emp.get(column) or '' for column in CSV_COLUMNS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic org")
+    parser.add_argument('headcount', type=int)
+    parser.add_argument('--depth', type=int, default=6, help="Levels below the top-level employee")
+    parser.add_argument('--skew', type=float, default=1.5, help="Fan-out skew (Pareto shape, smaller is more skewed)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--csv', help="Write a CSV for import_csv_to_json.py")
+    parser.add_argument('--json', help="Write a flat JSON list of employees")
+    args = parser.parse_args()
+
+    employees = generate_employees(args.headcount, args.depth, args.skew, seed=args.seed)
+    if args.csv:
+        write_csv(args.csv, employees)
+        print(f"Wrote {len(employees)} employees to {args.csv}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(employees, f)
+        print(f"Wrote {len(employees)} employees to {args.json}")
+    if not args.csv and not args.json:
+        json.dump(employees[:5], sys.stdout, indent=2)
+        print(f"\n... {len(employees)} employees generated (use --csv or --json to save them)")
+
+
+if __name__ == '__main__':
+    main()
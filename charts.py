@@ -0,0 +1,198 @@
+"""
+Several named org charts served by one process.
+
+Each chart has its own folder holding its snapshot, settings, change feed, history and
+locks, and its own source: a Graph tenant and top-level user, or CSV imports only. Extra
+charts are listed in CHARTS_FILE and served under /c/<chart>/. The 'default' chart keeps
+using the files in the working directory, so a single-chart install needs no configuration.
+
+Snapshots are loaded on first use and stay in memory while the charts fit in the memory
+budget. Past that, the least recently used charts are dropped from memory and reloaded from
+disk the next time they are asked for. Charts stored in SQLite ('storage': 'sqlite') are read
+from their database per request and take no part in the budget.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHART = 'default'
+CHARTS_DIR = 'charts'
+CHART_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+SOURCES = ('graph', 'csv')
+STORAGES = ('json', 'sqlite')
+# A loaded snapshot with its indexes takes about four times the size of its file (measured at 100k employees)
+MEMORY_PER_FILE_BYTE = 4
+
+_current = contextvars.ContextVar('chart', default=None)
+
+
+def current():
+    """The chart set with using() in this thread, or None"""
+    return _current.get()
+
+
+@contextmanager
+def using(chart):
+    token = _current.set(chart)
+    try:
+        yield chart
+    finally:
+        _current.reset(token)
+
+
+def bind(chart, func):
+    """func wrapped to run with chart as the current chart, for threads and scheduled jobs"""
+    @wraps(func)
+    def bound(*args, **kwargs):
+        with using(chart):
+            return func(*args, **kwargs)
+    return bound
+
+
+def _config_value(value):
+    # Values written as $NAME are read from the environment, so secrets can stay out of the file
+    if isinstance(value, str) and value.startswith('$'):
+        return os.environ.get(value[1:])
+    return value
+
+
+class Chart:
+    """One chart's configuration; the app attaches its snapshot cache (or SQLite store), history store, sync and publish lock"""
+
+    def __init__(self, name, directory='', source='graph', title=None, tenant_id=None, client_id=None,
+                 client_secret=None, top_level_email=None, top_level_id=None, storage='json'):
+        if source not in SOURCES:
+            raise ValueError(f"Chart {name}: source must be one of {', '.join(SOURCES)}")
+        if storage not in STORAGES:
+            raise ValueError(f"Chart {name}: storage must be one of {', '.join(STORAGES)}")
+        self.name = name
+        self.directory = directory
+        self.source = source
+        self.storage = storage
+        self.title = title
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.top_level_email = top_level_email
+        self.top_level_id = top_level_id
+        # URL prefix of the chart's pages and API
+        self.prefix = '' if name == DEFAULT_CHART else f'/c/{name}'
+        self.snapshots = None
+        self.store = None
+        self.history = None
+        self.sync = None
+        self.publish_lock = None
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename) if self.directory else filename
+
+    def memory_estimate(self):
+        """Approximate bytes held by the chart's in-memory snapshot, 0 when it isn't loaded"""
+        snapshot = self.snapshots.peek() if self.snapshots else None
+        return snapshot.version[2] * MEMORY_PER_FILE_BYTE if snapshot else 0
+
+    def evict(self):
+        """Drop the in-memory snapshot and reconstructed history; both reload from disk on demand"""
+        if self.snapshots:
+            self.snapshots.invalidate()
+        if self.history:
+            self.history.clear_cache()
+
+    def status(self):
+        return {
+            'name': self.name,
+            'title': self.title,
+            'source': self.source,
+            'storage': self.storage,
+            'url': self.prefix + '/',
+            'loaded': self.memory_estimate() > 0,
+            'memoryEstimateBytes': self.memory_estimate()
+        }
+
+
+class ChartRegistry:
+    def __init__(self, charts, memory_budget=0):
+        self._charts = OrderedDict((chart.name, chart) for chart in charts)
+        self.memory_budget = memory_budget
+        # Loaded charts and their estimated size, least recently used first
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def default(self):
+        return self._charts[DEFAULT_CHART]
+
+    def get(self, name):
+        return self._charts.get(name)
+
+    def __iter__(self):
+        return iter(list(self._charts.values()))
+
+    def touch(self, chart):
+        """Note that chart was just used, evicting the least recently used others if over budget"""
+        size = chart.memory_estimate()
+        evicted = []
+        with self._lock:
+            if size:
+                self._loaded[chart.name] = size
+                self._loaded.move_to_end(chart.name)
+            else:
+                self._loaded.pop(chart.name, None)
+            if not self.memory_budget:
+                return
+            total = sum(self._loaded.values())
+            for name in list(self._loaded):
+                if total <= self.memory_budget:
+                    break
+                if name == chart.name:
+                    continue
+                total -= self._loaded.pop(name)
+                evicted.append(self._charts[name])
+        for other in evicted:
+            other.evict()
+            logger.info(f"Evicted chart {other.name} from memory to stay within the {self.memory_budget // (1024 * 1024)} MB budget")
+
+
+def load_charts(path, defaults, memory_budget=0):
+    """Registry of the default chart plus those configured in path (if it exists).
+
+    path holds {"charts": {"<name>": {...}}}, where each chart may set title, source ('graph'
+    or 'csv'), storage ('json' or 'sqlite'), tenantId, clientId, clientSecret, topLevelUserEmail
+    and topLevelUserId. Unset values fall back to defaults, which holds the same keys taken from
+    the environment.
+    """
+    configured = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            configured = json.load(f).get('charts') or {}
+
+    charts = []
+    for name, options in [(DEFAULT_CHART, configured.get(DEFAULT_CHART) or {})] + \
+            [(name, options) for name, options in configured.items() if name != DEFAULT_CHART]:
+        if not CHART_NAME.match(name):
+            raise ValueError(f"Invalid chart name {name!r}: use letters, digits, '-' and '_'")
+        options = dict(defaults, **{key: _config_value(value) for key, value in (options or {}).items()})
+        charts.append(Chart(
+            name,
+            directory='' if name == DEFAULT_CHART else os.path.join(CHARTS_DIR, name),
+            source=options.get('source', 'graph'),
+            title=options.get('title'),
+            tenant_id=options.get('tenantId'),
+            client_id=options.get('clientId'),
+            client_secret=options.get('clientSecret'),
+            top_level_email=options.get('topLevelUserEmail'),
+            top_level_id=options.get('topLevelUserId'),
+            storage=options.get('storage') or 'json'
+        ))
+    if len(charts) > 1:
+        logger.info(f"Serving {len(charts)} charts: {', '.join(chart.name for chart in charts)}")
+    return ChartRegistry(charts, memory_budget)
@@ -37,4 +37,19 @@ tmp_upload_dir = None
 
 # SSL (uncomment if you want to use SSL)
 # keyfile = 'path/to/keyfile'
-# certfile = 'path/to/certfile'
\ No newline at end of file
+# certfile = 'path/to/certfile'
+
+# Metrics: every worker shares its /metrics values through this directory
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+
+def on_starting(server):
+    import metrics
+    metrics.reset_directory(os.environ['METRICS_DIR'])
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.REGISTRY.flush(force=True)
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid, os.environ['METRICS_DIR'])
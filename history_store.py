@@ -0,0 +1,302 @@
+"""
+Compressed history of org chart snapshots.
+
+Each day's snapshot is stored as a gzipped file in the history directory. Most days
+are stored as a delta against the previous day (records added/changed and IDs
+removed), with a full checkpoint every few entries so that reconstructing a past
+org state never needs to replay more than a handful of deltas.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Fields derived at request time that are not worth keeping in history
+TRANSIENT_FIELDS = ('children', 'isNewEmployee', 'changeType')
+
+# Level 6 compresses almost as well as the default of 9 in a fraction of the time
+GZIP_LEVEL = 6
+# Records encoded per json.dumps call when writing a history file
+WRITE_BATCH = 1000
+# Temporary files older than this are left over from an interrupted write
+STALE_TMP_SECONDS = 3600
+
+
+def iter_payload(payload):
+    """Encode a history payload (a dict of scalars and lists) as JSON in pieces.
+
+    Lists are encoded a batch of items at a time with the C encoder, which is much faster
+    than json.dump's pure Python streaming and never builds the whole file in memory.
+    """
+    yield '{'
+    for position, (key, value) in enumerate(payload.items()):
+        yield (',' if position else '') + json.dumps(key) + ':'
+        if not isinstance(value, list):
+            yield json.dumps(value, ensure_ascii=False)
+            continue
+        yield '['
+        for start in range(0, len(value), WRITE_BATCH):
+            batch = json.dumps(value[start:start + WRITE_BATCH], ensure_ascii=False, separators=(',', ':'))
+            yield (',' if start else '') + batch[1:-1]
+        yield ']'
+    yield '}'
+
+
+def flatten_records(root):
+    """Flatten a hierarchy into an ordered {id: [parent_id, fields]} mapping"""
+    records = OrderedDict()
+    if not root:
+        return records
+    stack = [(root, None)]
+    while stack:
+        node, parent_id = stack.pop()
+        fields = {key: value for key, value in node.items() if key not in TRANSIENT_FIELDS}
+        records[node.get('id')] = [parent_id, fields]
+        for child in reversed(node.get('children') or []):
+            stack.append((child, node.get('id')))
+    return records
+
+
+def build_tree(records, root_id):
+    """Rebuild a nested hierarchy from flattened records"""
+    nodes = {}
+    for emp_id, (_, fields) in records.items():
+        node = dict(fields)
+        node['children'] = []
+        nodes[emp_id] = node
+    for emp_id, (parent_id, _) in records.items():
+        if parent_id is not None and parent_id in nodes:
+            nodes[parent_id]['children'].append(nodes[emp_id])
+    return nodes.get(root_id)
+
+
+class HistoryStore:
+    """Day-by-day snapshot history with delta encoding and periodic checkpoints"""
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, directory, checkpoint_interval=7, retention_days=365, cache_size=4, on_lookup=None):
+        self.directory = directory
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self.retention_days = retention_days
+        self.cache_size = cache_size
+        self.on_lookup = on_lookup
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        path = self._path(self.INDEX_NAME)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {'entries': []}
+
+    def _save_index(self, index):
+        path = self._path(self.INDEX_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _read(self, name):
+        with gzip.open(self._path(name), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, name, payload):
+        path = self._path(name)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL) as f:
+            for chunk in iter_payload(payload):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _cache_key(entry):
+        # Another process may rewrite the same day, so the write time is part of the key
+        return entry['date'], entry.get('written')
+
+    def _remember(self, key, records, root_id):
+        self._cache[key] = (records, root_id)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Forget the reconstructed snapshots kept in memory"""
+        with self._lock:
+            self._cache.clear()
+
+    def _records_for(self, entries, position):
+        """Reconstruct the flattened records for entries[position]"""
+        key = self._cache_key(entries[position])
+        hit = key in self._cache
+        if self.on_lookup:
+            self.on_lookup(hit)
+        if hit:
+            self._cache.move_to_end(key)
+            records, root_id = self._cache[key]
+            return OrderedDict((k, list(v)) for k, v in records.items()), root_id
+
+        start = position
+        while entries[start]['kind'] != 'full':
+            start -= 1
+
+        payload = self._read(entries[start]['file'])
+        records = OrderedDict((k, v) for k, v in payload['records'])
+        root_id = payload['root']
+        for entry in entries[start + 1:position + 1]:
+            delta = self._read(entry['file'])
+            for emp_id in delta['removed']:
+                records.pop(emp_id, None)
+            for emp_id, record in delta['upserts']:
+                records[emp_id] = record
+            root_id = delta['root']
+
+        self._remember(key, records, root_id)
+        return OrderedDict((k, list(v)) for k, v in records.items()), root_id
+
+    def dates(self):
+        """Dates for which a snapshot is available, oldest first"""
+        with self._lock:
+            return [entry['date'] for entry in self._load_index()['entries']]
+
+    def record(self, hierarchy, day=None):
+        """Store a snapshot for the given day (today by default), replacing any earlier one for that day"""
+        if not hierarchy:
+            return
+        day = (day or date.today()).isoformat()
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            index = self._load_index()
+            entries = index['entries']
+
+            replaced_full = False
+            if entries and entries[-1]['date'] == day:
+                replaced = entries.pop()
+                replaced_full = replaced['kind'] == 'full'
+                self._cache.pop(self._cache_key(replaced), None)
+
+            records = flatten_records(hierarchy)
+            root_id = hierarchy.get('id')
+
+            since_full = 0
+            for entry in reversed(entries):
+                if entry['kind'] == 'full':
+                    break
+                since_full += 1
+
+            if not entries or replaced_full or since_full + 1 >= self.checkpoint_interval:
+                kind = 'full'
+                payload = {'root': root_id, 'records': list(records.items())}
+            else:
+                kind = 'delta'
+                previous, _ = self._records_for(entries, len(entries) - 1)
+                upserts = [
+                    (emp_id, record) for emp_id, record in records.items()
+                    if previous.get(emp_id) != record
+                ]
+                removed = [emp_id for emp_id in previous if emp_id not in records]
+                payload = {'root': root_id, 'upserts': upserts, 'removed': removed}
+
+            name = f'{day}.{kind}.json.gz'
+            self._write(name, payload)
+            entry = {
+                'date': day,
+                'kind': kind,
+                'file': name,
+                'count': len(records),
+                'written': datetime.now().isoformat()
+            }
+            entries.append(entry)
+            self._remember(self._cache_key(entry), records, root_id)
+
+            # Clean up the file of a replaced entry if its name changed
+            for stale in (f'{day}.full.json.gz', f'{day}.delta.json.gz'):
+                if stale != name and os.path.exists(self._path(stale)):
+                    os.remove(self._path(stale))
+
+            self._prune(index)
+            self._save_index(index)
+
+            logger.info(f"Recorded {kind} history snapshot for {day} ({len(records)} employees)")
+
+    def _prune(self, index):
+        """Drop entries older than the retention period, keeping the chain reconstructable"""
+        if not self.retention_days:
+            return
+        entries = index['entries']
+        cutoff = (date.today() - timedelta(days=self.retention_days)).isoformat()
+        expired = 0
+        while expired < len(entries) - 1 and entries[expired]['date'] < cutoff:
+            expired += 1
+        if not expired:
+            return
+
+        first = entries[expired]
+        if first['kind'] != 'full':
+            # The oldest retained day becomes the new checkpoint
+            records, root_id = self._records_for(entries, expired)
+            name = f"{first['date']}.full.json.gz"
+            self._write(name, {'root': root_id, 'records': list(records.items())})
+            os.remove(self._path(first['file']))
+            first['kind'] = 'full'
+            first['file'] = name
+
+        for entry in entries[:expired]:
+            self._cache.pop(self._cache_key(entry), None)
+            try:
+                os.remove(self._path(entry['file']))
+            except FileNotFoundError:
+                pass
+        del entries[:expired]
+        logger.info(f"Pruned {expired} history snapshots older than {cutoff}")
+
+    def compact(self):
+        """Apply the retention period and delete files the index no longer refers to; returns the number deleted"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return 0
+            index = self._load_index()
+            self._prune(index)
+            self._save_index(index)
+            referenced = {entry['file'] for entry in index['entries']}
+            removed = 0
+            for name in os.listdir(self.directory):
+                path = self._path(name)
+                if name.endswith('.tmp'):
+                    # Another process may be writing it right now
+                    orphaned = time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS
+                else:
+                    orphaned = name.endswith('.json.gz') and name not in referenced
+                if orphaned:
+                    os.remove(path)
+                    removed += 1
+            logger.info(f"Compacted history: {len(index['entries'])} snapshots kept, {removed} stray files removed")
+            return removed
+
+    def snapshot_at(self, as_of):
+        """Reconstruct the hierarchy as it was on the given date, or None if there is no history that old"""
+        as_of = as_of.isoformat() if isinstance(as_of, date) else as_of
+        with self._lock:
+            entries = self._load_index()['entries']
+            position = None
+            for i, entry in enumerate(entries):
+                if entry['date'] <= as_of:
+                    position = i
+                else:
+                    break
+            if position is None:
+                return None
+            records, root_id = self._records_for(entries, position)
+        return build_tree(records, root_id)
@@ -1,44 +1,105 @@
 """
 You only need to use this if you have your static org data in the required CSV format.
 This will convert that CSV file into the correct JSON format and save it as employee_data.json.
-IF YOU ALREADY HAVE AN EMPLOYEE_DATA.JSON FILE, BACK IT UP BEFORE RUNNING THIS.
+The existing employee_data.json is only replaced once the whole CSV has been validated, and
+the new file is swapped in atomically, so a running server never sees a half-written file.
+
+The CSV is streamed rather than loaded into memory: each row is serialised once into a
+scratch file, and only the IDs and the reporting lines are kept in memory while the
+hierarchy is assembled, so files with hundreds of thousands of rows are fine.
+
+Usage:
+    python import_csv_to_json.py employees.csv
+    python import_csv_to_json.py staff.csv --map id=EmployeeID --map managerId=ManagerID
+    python import_csv_to_json.py staff.csv.gz --config import_config.json --root E0001
+    python import_csv_to_json.py employees.csv --output employee_data.db   (for SQLite storage)
+
+The config file is JSON, for example:
+    {
+        "columns": {"id": "EmployeeID", "name": "Full Name", "managerId": "ManagerID"},
+        "root": "E0001",
+        "delimiter": ","
+    }
 """
 
+import argparse
 import csv
+import gzip
 import json
-import sys
 import os
-from collections import defaultdict
+import sys
+import tempfile
+from array import array
+
+from snapshot_io import atomic_write, read_snapshot
+from sqlite_store import SqliteStore
 
 # Configuration
 CSV_FILE = "employees.csv"          # Change this or pass as argument
 OUTPUT_FILE = "employee_data.json"   # Must match what Flask app expects
-ID_FIELD = "id"                      # Column name for unique ID
-MANAGER_FIELD = "managerId"          # Column for manager's ID (empty for top)
-
-def build_hierarchy(employees):
-    """Build nested hierarchy from flat list of employees"""
-    by_id = {}
-    for emp in employees:
-        emp_id = emp[ID_FIELD]
-        emp["children"] = []
-        by_id[emp_id] = emp
-
-    root = None
-    for emp in employees:
-        manager_id = emp.get(MANAGER_FIELD)
-        if not manager_id or manager_id not in by_id:
-            if root is not None:
-                print(f"Warning: Multiple potential roots found: {root['name']} and {emp['name']}")
-            root = by_id[emp[ID_FIELD]]
-        else:
-            manager = by_id[manager_id]
-            manager["children"].append(by_id[emp[ID_FIELD]])
+# Outputs with these extensions are written as a SQLite database (STORAGE_BACKEND=sqlite)
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Snapshot field -> CSV column. Override with --map or a config file.
+DEFAULT_COLUMNS = {
+    "id": "id",                      # Column name for unique ID
+    "name": "name",
+    "title": "title",
+    "department": "department",
+    "email": "email",
+    "phone": "phone",
+    "location": "location",
+    "managerId": "managerId",        # Column for manager's ID (empty for top)
+    "employeeHireDate": "employeeHireDate",
+}
+REQUIRED_FIELDS = ("id", "name", "managerId")
+
+# Stop collecting individual problems after this many, the counts are still reported
+MAX_REPORTED_ISSUES = 50
+PROGRESS_INTERVAL = 10000
+
+
+class ImportReport:
+    """Errors and warnings found while importing, with CSV row numbers"""
+
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+        self.error_count = 0
+        self.warning_count = 0
+        self.rows_read = 0
+        self.employees = 0
+        self.root = None
+
+    def error(self, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ISSUES:
+            self.errors.append(message)
+
+    def warning(self, message):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_REPORTED_ISSUES:
+            self.warnings.append(message)
+
+    def to_dict(self):
+        return {
+            'rowsRead': self.rows_read,
+            'employees': self.employees,
+            'root': self.root,
+            'errorCount': self.error_count,
+            'warningCount': self.warning_count,
+            'errors': self.errors,
+            'warnings': self.warnings,
+        }
 
-    if root is None:
-        raise ValueError("No root employee found! Make sure the top-level person has no managerId or an invalid one.")
 
-    return root
+class ImportValidationError(Exception):
+    """Raised when the CSV cannot be turned into a valid hierarchy"""
+
+    def __init__(self, report):
+        super().__init__(f"CSV validation failed with {report.error_count} error(s)")
+        self.report = report
+
 
 def clean_value(value):
     """Clean empty strings, 'null', 'NULL', etc."""
@@ -55,23 +116,243 @@ def get_file_info(path):
         return f"exists (size: {os.path.getsize(path)} bytes)"
     return "does NOT exist"
 
-def main(csv_path=None, output_path=None, force=False):
+def load_config(path):
+    """Load an import config file (columns, root, delimiter, encoding)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def open_csv(path, encoding='utf-8'):
+    """Open a CSV file for reading, transparently decompressing .gz files"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding=encoding)
+    return open(path, newline='', encoding=encoding)
+
+def check_columns(csv_path, columns=None, delimiter=',', encoding='utf-8'):
+    """Check the CSV header has the required columns, raising ImportValidationError if not"""
+    columns = dict(DEFAULT_COLUMNS, **(columns or {}))
+    with open_csv(csv_path, encoding) as f:
+        fieldnames = csv.DictReader(f, delimiter=delimiter).fieldnames or []
+    missing = {columns[field] for field in REQUIRED_FIELDS} - set(fieldnames)
+    if missing:
+        report = ImportReport()
+        report.error(f"Missing required columns: {sorted(missing)} (available: {fieldnames})")
+        raise ImportValidationError(report)
+
+def _employee_from_row(row, columns):
+    emp = {
+        "id": str(row[columns["id"]]).strip(),
+        "name": row[columns["name"]].strip(),
+        "title": clean_value(row.get(columns["title"], "")) or "Employee",
+        "department": clean_value(row.get(columns["department"], "")) or "Unassigned",
+        "email": clean_value(row.get(columns["email"])),
+        "phone": clean_value(row.get(columns["phone"])),
+        "location": clean_value(row.get(columns["location"])),
+        "managerId": clean_value(row.get(columns["managerId"])),
+    }
+    hire_date = clean_value(row.get(columns["employeeHireDate"]))
+    if hire_date:
+        emp["employeeHireDate"] = hire_date
+        emp["hireDate"] = hire_date if 'T' in hire_date else hire_date + "T00:00:00"
+    return emp
+
+def _find_cycles(unvisited, managers, rows, ids, report):
+    """Report the manager cycles that make the given employees unreachable from the root"""
+    state = {}
+    for start in unvisited:
+        path = []
+        node = start
+        while node != -1 and node not in state:
+            state[node] = start
+            path.append(node)
+            node = managers[node]
+        if node != -1 and state[node] == start:
+            cycle = path[path.index(node):]
+            members = ", ".join(f"{ids[i]} (row {rows[i]})" for i in cycle)
+            report.error(f"Manager cycle: {members}")
+
+def import_csv(csv_path, output_path, columns=None, root_id=None, delimiter=',', encoding='utf-8',
+               progress=None, report=None):
+    """Stream a CSV of employees into a nested snapshot, returning an ImportReport.
+
+    Raises ImportValidationError (with the report attached) if the CSV has duplicate IDs,
+    manager cycles, more than one root without root_id, or no usable rows at all.
+    progress, if given, is called with the number of rows read so far.
+    """
+    columns = dict(DEFAULT_COLUMNS, **(columns or {}))
+    report = report or ImportReport()
+
+    ids = []                     # row index -> employee ID
+    rows = array('l')            # row index -> CSV line number
+    offsets = array('q')         # row index -> offset of the serialised row in the scratch file
+    lengths = array('l')
+    manager_ids = []             # row index -> manager ID as written in the CSV
+    index_by_id = {}
+
+    scratch = tempfile.TemporaryFile()
+    try:
+        with open_csv(csv_path, encoding) as f:
+            reader = csv.DictReader(f, delimiter=delimiter)
+            fieldnames = reader.fieldnames or []
+            missing = {columns[field] for field in REQUIRED_FIELDS} - set(fieldnames)
+            if missing:
+                report.error(f"Missing required columns: {sorted(missing)} (available: {fieldnames})")
+                raise ImportValidationError(report)
+
+            for row in reader:
+                report.rows_read += 1
+                row_num = reader.line_num
+                if progress and report.rows_read % PROGRESS_INTERVAL == 0:
+                    progress(report.rows_read)
+
+                if not (row.get(columns["id"]) or "").strip():
+                    report.warning(f"Row {row_num} has no ID, skipping")
+                    continue
+                if not (row.get(columns["name"]) or "").strip():
+                    report.warning(f"Row {row_num} has no name, skipping")
+                    continue
+
+                emp = _employee_from_row(row, columns)
+                emp_id = emp["id"]
+                if emp_id in index_by_id:
+                    first = rows[index_by_id[emp_id]]
+                    report.error(f"Duplicate ID {emp_id} on row {row_num} (first seen on row {first})")
+                    continue
+
+                # Everything except the closing brace, children are appended when writing
+                encoded = json.dumps(emp, separators=(',', ':'))[:-1].encode('ascii')
+                index_by_id[emp_id] = len(ids)
+                ids.append(emp_id)
+                rows.append(row_num)
+                offsets.append(scratch.tell())
+                lengths.append(len(encoded))
+                manager_ids.append(emp["managerId"])
+                scratch.write(encoded)
+
+        if progress:
+            progress(report.rows_read)
+
+        count = len(ids)
+        if not count:
+            report.error("No employees found in CSV")
+            raise ImportValidationError(report)
+
+        # Resolve reporting lines into first-child / next-sibling links, keeping CSV order
+        managers = array('l', [-1]) * count
+        first_child = array('l', [-1]) * count
+        last_child = array('l', [-1]) * count
+        next_sibling = array('l', [-1]) * count
+        roots = []
+        for i in range(count):
+            manager_id = manager_ids[i]
+            manager = index_by_id.get(manager_id, -1) if manager_id else -1
+            if manager == i:
+                manager = -1
+                report.warning(f"Row {rows[i]}: {ids[i]} is listed as their own manager, treating as top-level")
+            elif manager_id and manager == -1:
+                report.warning(f"Row {rows[i]}: manager {manager_id} of {ids[i]} not found, treating as top-level")
+            managers[i] = manager
+            if manager == -1:
+                roots.append(i)
+            elif first_child[manager] == -1:
+                first_child[manager] = last_child[manager] = i
+            else:
+                next_sibling[last_child[manager]] = i
+                last_child[manager] = i
+        del manager_ids
+
+        if root_id is not None:
+            root = index_by_id.get(root_id)
+            if root is None:
+                report.error(f"Configured root {root_id} is not in the CSV")
+            else:
+                for other in roots:
+                    if other != root:
+                        report.warning(f"Row {rows[other]}: {ids[other]} is not under root {root_id}, excluded")
+        elif len(roots) > 1:
+            listed = ", ".join(f"{ids[i]} (row {rows[i]})" for i in roots[:10])
+            more = f" and {len(roots) - 10} more" if len(roots) > 10 else ""
+            report.error(f"Multiple roots found: {listed}{more}. Choose one with --root.")
+            root = None
+        elif roots:
+            root = roots[0]
+        else:
+            report.error("No root employee found! Make sure the top-level person has no managerId or an invalid one.")
+            root = None
+
+        # Anyone unreachable from a top-level employee is stuck in (or under) a manager cycle
+        reachable = bytearray(count)
+        for start in roots:
+            stack = [start]
+            while stack:
+                i = stack.pop()
+                reachable[i] = 1
+                child = first_child[i]
+                while child != -1:
+                    stack.append(child)
+                    child = next_sibling[child]
+        unvisited = [i for i in range(count) if not reachable[i]]
+        if unvisited:
+            _find_cycles(unvisited, managers, rows, ids, report)
+        del reachable
+
+        if report.error_count:
+            raise ImportValidationError(report)
+
+        written = 0
+        with atomic_write(output_path, 'wb') as out:
+            # Iterative depth-first write: each entry is either a node to open or a closing token
+            stack = [root]
+            while stack:
+                item = stack.pop()
+                if isinstance(item, bytes):
+                    out.write(item)
+                    continue
+                scratch.seek(offsets[item])
+                out.write(scratch.read(lengths[item]))
+                out.write(b',"children":[')
+                written += 1
+                children = []
+                child = first_child[item]
+                while child != -1:
+                    children.append(child)
+                    child = next_sibling[child]
+                stack.append(b']}')
+                for position in range(len(children) - 1, -1, -1):
+                    stack.append(children[position])
+                    if position:
+                        stack.append(b',')
+
+        report.employees = written
+        report.root = {'id': ids[root], 'row': rows[root]}
+        return report
+    finally:
+        scratch.close()
+
+def print_report(report):
+    for warning in report.warnings:
+        print(f"Warning: {warning}")
+    if report.warning_count > len(report.warnings):
+        print(f"... and {report.warning_count - len(report.warnings)} more warnings")
+    for error in report.errors:
+        print(f"Error: {error}")
+    if report.error_count > len(report.errors):
+        print(f"... and {report.error_count - len(report.errors)} more errors")
+
+def main(csv_path=None, output_path=None, columns=None, root_id=None, config_path=None):
+    config = load_config(config_path) if config_path else {}
     csv_path = csv_path or CSV_FILE
     output_path = output_path or OUTPUT_FILE
+    columns = dict(config.get('columns', {}), **(columns or {}))
+    root_id = root_id or config.get('root')
 
-    if not csv_path.endswith('.csv'):
-        print("Please provide a .csv file")
+    if not (csv_path.endswith('.csv') or csv_path.endswith('.csv.gz')):
+        print("Please provide a .csv (or .csv.gz) file")
         sys.exit(1)
 
     cwd = os.getcwd()
     print(f"Current working directory: {cwd}")
     print(f"CSV path: {os.path.abspath(csv_path)}")
     print(f"Output path: {os.path.abspath(output_path)}")
-    print(f"Force overwrite: {force}")
-
-    if force and os.path.exists(output_path):
-        print(f"Force mode: Deleting existing {output_path}")
-        os.remove(output_path)
 
     print(f"\nFile status BEFORE import:")
     print(f"  - {output_path}: {get_file_info(output_path)}")
@@ -82,75 +363,70 @@ def main(csv_path=None, output_path=None, force=False):
 
     print(f"Reading employees from: {csv_path}")
 
-    employees = []
-    try:
-        with open(csv_path, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            expected_headers = {ID_FIELD, "name", MANAGER_FIELD}
-            missing = expected_headers - set(reader.fieldnames or [])
-            if missing:
-                print(f"Error: Missing required columns: {missing}")
-                print(f"Available columns: {list(reader.fieldnames)}")
-                sys.exit(1)
-
-            for row_num, row in enumerate(reader, start=2):
-                if not row.get(ID_FIELD):
-                    print(f"Warning: Row {row_num} has no ID, skipping")
-                    continue
-                if not row.get("name"):
-                    print(f"Warning: Row {row_num} has no name, skipping")
-                    continue
+    staged_path = None
+    if output_path.endswith(SQLITE_SUFFIXES):
+        # The CSV is validated into a scratch snapshot first, so a rejected file leaves the database alone
+        fd, staged_path = tempfile.mkstemp(suffix='.json', dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
 
-                emp = {
-                    "id": str(row[ID_FIELD]).strip(),
-                    "name": row["name"].strip(),
-                    "title": clean_value(row.get("title", "")) or "Employee",
-                    "department": clean_value(row.get("department", "")) or "Unassigned",
-                    "email": clean_value(row.get("email")),
-                    "phone": clean_value(row.get("phone")),
-                    "location": clean_value(row.get("location")),
-                    "managerId": clean_value(row.get(MANAGER_FIELD)),
-                }
-                employees.append(emp)
-
-        print(f"Loaded {len(employees)} employees from CSV")
-
-        root = build_hierarchy(employees)
-
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(root, f, indent=2, ensure_ascii=False)
-            print(f"Write completed successfully.")
-        except PermissionError as e:
-            print(f"Permission denied writing to {output_path}: {e}")
-            print("Try running as admin or check file locks.")
-            sys.exit(1)
-        except Exception as e:
-            print(f"Unexpected error writing file: {e}")
-            sys.exit(1)
-
-        print(f"Success: Org chart JSON saved to {output_path}")
-        print(f"Root employee: {root['name']} ({root['title']})")
-
-        print(f"\nFile status AFTER import:")
-        print(f"  - {output_path}: {get_file_info(output_path)}")
-
-        with open(output_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"Validation: Root ID={data['id']}, Name='{data['name']}', Children={len(data['children'])}")
-
-    except FileNotFoundError:
-        print(f"Error: File not found: {csv_path}")
-        print("Make sure the CSV file exists and the path is correct.")
+    try:
+        report = import_csv(
+            csv_path,
+            staged_path or output_path,
+            columns=columns,
+            root_id=root_id,
+            delimiter=config.get('delimiter', ','),
+            encoding=config.get('encoding', 'utf-8'),
+            progress=lambda rows: print(f"  ... {rows} rows read"),
+        )
+        if staged_path:
+            SqliteStore(output_path).write(read_snapshot(staged_path))
+    except ImportValidationError as e:
+        print_report(e.report)
+        print(f"Import aborted: {e}. {output_path} was not changed.")
+        sys.exit(1)
+    except PermissionError as e:
+        print(f"Permission denied writing to {output_path}: {e}")
+        print("Try running as admin or check file locks.")
         sys.exit(1)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    finally:
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+
+    print_report(report)
+    print(f"Loaded {report.employees} employees from {report.rows_read} CSV rows")
+    print(f"Success: Org chart saved to {output_path}")
+    print(f"Root employee: {report.root['id']} (row {report.root['row']})")
+
+    print(f"\nFile status AFTER import:")
+    print(f"  - {output_path}: {get_file_info(output_path)}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Convert an employee CSV into employee_data.json")
+    parser.add_argument('csv', nargs='?', help="CSV file to import (.csv or .csv.gz)")
+    parser.add_argument('--output', help=f"Snapshot to write (default {OUTPUT_FILE}; a .db file for SQLite storage)")
+    parser.add_argument('--config', help="JSON config file with columns/root/delimiter/encoding")
+    parser.add_argument('--map', action='append', default=[], metavar='FIELD=COLUMN',
+                        help="Map a snapshot field to a CSV column, e.g. --map managerId=ManagerID")
+    parser.add_argument('--root', help="ID of the top-level employee when the CSV has several roots")
+    # The snapshot is always replaced atomically, so --force has nothing left to do; it is still
+    # accepted so that existing scripts passing it keep working
+    parser.add_argument('--force', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    columns = {}
+    for mapping in args.map:
+        field, _, column = mapping.partition('=')
+        if field not in DEFAULT_COLUMNS or not column:
+            parser.error(f"Invalid --map {mapping!r}, fields are: {', '.join(DEFAULT_COLUMNS)}")
+        columns[field] = column
+    args.columns = columns
+    return args
 
 if __name__ == "__main__":
-    force = '--force' in sys.argv
-    csv_arg = next((arg for arg in sys.argv if arg.endswith('.csv')), None)
-    if csv_arg:
-        main(csv_arg, force=force)
-    else:
-        main(force=force)
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    main(args.csv, args.output, columns=args.columns,
+         root_id=args.root, config_path=args.config)
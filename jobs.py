@@ -0,0 +1,195 @@
+"""
+Background jobs (Graph syncs and CSV imports) with status, progress and cancellation.
+
+Each job's status is a small JSON file in the jobs folder, written only by the process
+running the job, so any gunicorn worker can answer /api/jobs/<id>. Cancelling a job drops
+a marker file next to it; the job checks for the marker between pages or batches of rows
+and stops by raising JobCancelled.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+from snapshot_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ('queued', 'running')
+# Finished jobs kept for /api/jobs
+MAX_FINISHED_JOBS = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        # Without gunicorn there is a single server process, so another pid is a previous run
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Job:
+    """Handle used by the code running a job to report on it"""
+
+    def __init__(self, store, job_id, kind, fields=None):
+        self.store = store
+        self.id = job_id
+        self.kind = kind
+        # Fields the job was created with, such as a sync's mode
+        self.fields = fields or {}
+        self._started = None
+
+    def update(self, **fields):
+        """Merge fields into the job's status"""
+        return self.store._update(self.id, fields)
+
+    def start(self, phase, **fields):
+        self._started = time.monotonic()
+        return self.update(state='running', phase=phase, startedAt=datetime.now().isoformat(), **fields)
+
+    def finish(self, state, error=None, **fields):
+        duration = round(time.monotonic() - self._started, 3) if self._started is not None else None
+        status = self.update(state=state, phase='done', error=error, finishedAt=datetime.now().isoformat(),
+                             durationSeconds=duration, **fields)
+        self.store._clear_cancel(self.id)
+        return status
+
+    def cancel_requested(self):
+        return os.path.exists(self.store._cancel_path(self.id))
+
+    def check_cancelled(self):
+        """Raise JobCancelled if someone has asked for this job to stop"""
+        if self.cancel_requested():
+            raise JobCancelled(f'{self.kind} job {self.id} was cancelled')
+
+
+class JobStore:
+    def __init__(self, directory, max_finished=MAX_FINISHED_JOBS):
+        self.directory = directory
+        self.max_finished = max_finished
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.cancel')
+
+    def _read(self, job_id):
+        if not job_id or os.path.basename(job_id) != job_id:
+            return None
+        try:
+            with open(self._status_path(job_id), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _update(self, job_id, fields):
+        status = self._read(job_id) or {}
+        status.update(fields)
+        status['updatedAt'] = datetime.now().isoformat()
+        with atomic_write(self._status_path(job_id)) as f:
+            json.dump(status, f)
+        return status
+
+    def _clear_cancel(self, job_id):
+        try:
+            os.remove(self._cancel_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _present(self, status):
+        """A status as reported to clients, noting pending cancellation and jobs whose process died"""
+        if status.get('state') in ACTIVE_STATES:
+            if not _process_alive(status.get('pid')):
+                status = dict(status, state='failed', phase='done',
+                              error=status.get('error') or 'The server process running this job stopped')
+            elif os.path.exists(self._cancel_path(status['id'])):
+                status = dict(status, cancelRequested=True)
+        return status
+
+    def create(self, kind, **fields):
+        """Register a new queued job and return its handle"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._prune()
+        job_id = uuid.uuid4().hex[:12]
+        self._update(job_id, dict(
+            fields,
+            id=job_id,
+            kind=kind,
+            state='queued',
+            phase='queued',
+            pid=os.getpid(),
+            createdAt=datetime.now().isoformat()
+        ))
+        return Job(self, job_id, kind, fields)
+
+    def get(self, job_id):
+        status = self._read(job_id)
+        return self._present(status) if status else None
+
+    def list(self, kind=None, limit=20):
+        """Recent jobs, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                status = self._read(name[:-len('.json')])
+                if status and (kind is None or status.get('kind') == kind):
+                    jobs.append(self._present(status))
+        jobs.sort(key=lambda status: status.get('createdAt', ''), reverse=True)
+        return jobs[:limit]
+
+    def latest(self, kind, **fields):
+        """The newest job of a kind (and with the given fields) in any state, in any process"""
+        for status in self.list(kind, limit=None):
+            if all(status.get(k) == v for k, v in fields.items()):
+                return status
+        return None
+
+    def active(self, kind, **fields):
+        """The newest queued or running job of a kind (and with the given fields), in any process"""
+        for status in self.list(kind, limit=None):
+            if status.get('state') in ACTIVE_STATES and all(status.get(k) == v for k, v in fields.items()):
+                return status
+        return None
+
+    def cancel(self, job_id):
+        """Ask a job to stop; returns its status, or None if there is no such job"""
+        status = self.get(job_id)
+        if status is None or status.get('state') not in ACTIVE_STATES:
+            return status
+        open(self._cancel_path(job_id), 'w').close()
+        logger.info(f"Cancellation requested for {status.get('kind')} job {job_id}")
+        return self.get(job_id)
+
+    def _prune(self):
+        if not os.path.isdir(self.directory):
+            return
+        finished = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                status = self._read(name[:-len('.json')])
+                if status is None or status.get('state') not in ACTIVE_STATES:
+                    finished.append(((status or {}).get('createdAt', ''), name[:-len('.json')]))
+        finished.sort()
+        for _, job_id in finished[:max(0, len(finished) - self.max_finished + 1)]:
+            for path in (self._status_path(job_id), self._cancel_path(job_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,387 @@
+"""
+End-to-end load test for the org chart under its production servers.
+
+Starts the mock Graph server (mock_graph.py), launches the app under one or more server
+configurations pointed at it, waits for the initial sync, then drives a weighted mix of
+page, /api/employees and /api/search requests from concurrent keep-alive clients while a
+sync is triggered periodically through /api/update-now. Reports throughput and p50/p95/p99
+latency per endpoint for each configuration and saves the results as JSON.
+
+    python loadtest/load_test.py                                   # gunicorn_config.py and run_waitress.py
+    python loadtest/load_test.py --server gunicorn:workers=4,threads=4,worker-class=gthread \\
+                                 --server waitress:threads=16 --headcount 20000 --duration 60
+    python loadtest/load_test.py --target staging=http://10.0.0.5:5000 --sync-interval 0
+
+Server configurations are KIND[:OPTION=VALUE,...]. For gunicorn the options are passed
+as command line flags over gunicorn_config.py (workers, threads, worker-class, ...); for
+waitress only threads is supported. --target skips launching and tests a running server.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(LOADTEST_DIR)
+RESULTS_DIR = os.path.join(LOADTEST_DIR, 'results')
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_org import FIRST_NAMES, LAST_NAMES, DEPARTMENTS
+from loadtest.mock_graph import make_server
+
+DEFAULT_SERVERS = ['gunicorn', 'waitress']
+DEFAULT_MIX = 'page=1,employees=2,search=7'
+ENDPOINTS = ('page', 'employees', 'search')
+SYNC_GRACE_SECONDS = 120
+SEARCH_TERMS = [name.lower() for name in FIRST_NAMES + LAST_NAMES] + [d.lower() for d in DEPARTMENTS] + ['no-such-person']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(samples, duration):
+    """Throughput and latency percentiles (in milliseconds) for one endpoint"""
+    latencies = sorted(latency for latency, ok in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    if not latencies:
+        return {'requests': 0, 'errors': 0}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def gunicorn_executable():
+    candidate = os.path.join(os.path.dirname(sys.executable), 'gunicorn')
+    return candidate if os.path.exists(candidate) else shutil.which('gunicorn') or 'gunicorn'
+
+
+def parse_server(spec):
+    kind, _, options = spec.partition(':')
+    if kind not in ('gunicorn', 'waitress'):
+        raise ValueError(f"Unknown server kind '{kind}' (expected gunicorn or waitress)")
+    parsed = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        parsed[key] = value
+    if kind == 'waitress' and set(parsed) - {'threads'}:
+        raise ValueError("waitress only supports the threads option")
+    return kind, parsed
+
+
+class LaunchedServer:
+    """Runs the app under gunicorn or waitress in a scratch directory, pointed at the mock"""
+
+    def __init__(self, spec, mock_url, tenant):
+        self.kind, self.options = parse_server(spec)
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.workdir = tempfile.mkdtemp(prefix=f'orgchart-load-{self.kind}-')
+        # Static assets are served relative to the working directory
+        os.symlink(os.path.join(REPO_ROOT, 'static'), os.path.join(self.workdir, 'static'))
+        self.data_file = os.path.join(self.workdir, 'employee_data.json')
+
+        env = dict(os.environ)
+        env.pop('OFFLINE_MODE', None)
+        env.update({
+            'AZURE_TENANT_ID': tenant,
+            'AZURE_CLIENT_ID': 'load-test',
+            'AZURE_CLIENT_SECRET': 'load-test',
+            'AZURE_AUTHORITY_HOST': mock_url,
+            'GRAPH_API_ENDPOINT': f'{mock_url}/v1.0',
+            'RUN_INITIAL_UPDATE': 'true',
+            'PORT': str(self.port),
+            'METRICS_DIR': os.path.join(self.workdir, 'metrics'),
+        })
+
+        if self.kind == 'gunicorn':
+            # Not "python -m gunicorn": the repo's own gunicorn.py would shadow the package
+            command = [gunicorn_executable(), '-c', os.path.join(REPO_ROOT, 'gunicorn_config.py'),
+                       '--pythonpath', REPO_ROOT, '--bind', f'127.0.0.1:{self.port}']
+            for key, value in self.options.items():
+                command += [f'--{key}', value] if value else [f'--{key}']
+            command.append('app:app')
+        else:
+            if 'threads' in self.options:
+                env['WAITRESS_THREADS'] = self.options['threads']
+            command = [sys.executable, os.path.join(REPO_ROOT, 'run_waitress.py')]
+
+        self.log_path = os.path.join(self.workdir, 'server.log')
+        self.log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(command, cwd=self.workdir, env=env, stdout=self.log,
+                                        stderr=subprocess.STDOUT, start_new_session=True)
+
+    def snapshot_signature(self):
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def wait_until_ready(self, timeout):
+        """Wait for the server to accept connections and finish its initial sync"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.kind} exited with code {self.process.returncode}, see {self.log_path}")
+            if self.snapshot_signature() is not None:
+                try:
+                    with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                        return
+                except OSError:
+                    pass
+            time.sleep(0.25)
+        raise TimeoutError(f"{self.kind} was not ready after {timeout}s, see {self.log_path}")
+
+    def stop(self, keep_workdir=False):
+        if self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        self.log.close()
+        if not keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def request_path(endpoint, rng):
+    if endpoint == 'page':
+        return '/'
+    if endpoint == 'employees':
+        return '/api/employees'
+    return '/api/search?q=' + quote(rng.choice(SEARCH_TERMS))
+
+
+def client_worker(base_url, weights, stop_at, samples, seed):
+    """Issue requests over one keep-alive connection until stop_at"""
+    parts = urlsplit(base_url)
+    rng = random.Random(seed)
+    endpoints = list(weights)
+    endpoint_weights = list(weights.values())
+    connection = None
+    while time.monotonic() < stop_at:
+        endpoint = rng.choices(endpoints, weights=endpoint_weights)[0]
+        path = request_path(endpoint, rng)
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                connection = None
+        except (OSError, http.client.HTTPException):
+            ok = False
+            if connection is not None:
+                connection.close()
+            connection = None
+        samples[endpoint].append((time.perf_counter() - start, ok))
+    if connection is not None:
+        connection.close()
+
+
+def sync_driver(base_url, interval, stop_at, samples, server):
+    """Trigger a sync every interval seconds and, for launched servers, time it to completion"""
+    parts = urlsplit(base_url)
+    while time.monotonic() + interval < stop_at:
+        time.sleep(interval)
+        before = server.snapshot_signature() if server else None
+        start = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+            connection.request('POST', '/api/update-now')
+            ok = connection.getresponse().status == 200
+            connection.close()
+        except (OSError, http.client.HTTPException):
+            ok = False
+        if ok and server:
+            # The sync runs in the background: it is finished once the snapshot file is replaced.
+            # One still running when the load stops is waited for, so its duration is still recorded.
+            deadline = max(stop_at, time.monotonic()) + SYNC_GRACE_SECONDS
+            while time.monotonic() < deadline and server.snapshot_signature() == before:
+                time.sleep(0.1)
+            ok = server.snapshot_signature() != before
+        samples['sync'].append((time.perf_counter() - start, ok))
+
+
+def run_load(base_url, args, weights, server=None):
+    samples = defaultdict(list)
+    parts = urlsplit(base_url)
+    # Warm every worker's snapshot cache before measuring
+    for _ in range(max(4, args.concurrency)):
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+            connection.request('GET', '/api/employees')
+            connection.getresponse().read()
+            connection.close()
+        except (OSError, http.client.HTTPException):
+            pass
+
+    start = time.monotonic()
+    stop_at = start + args.duration
+    clients = [threading.Thread(target=client_worker, args=(base_url, weights, stop_at, samples, seed))
+               for seed in range(args.concurrency)]
+    syncer = None
+    if args.sync_interval > 0:
+        syncer = threading.Thread(target=sync_driver, args=(base_url, args.sync_interval, stop_at, samples, server))
+        syncer.start()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - start
+    if syncer:
+        syncer.join()
+
+    results = {endpoint: summarize(samples[endpoint], elapsed) for endpoint in list(weights) + ['sync']
+               if samples[endpoint]}
+    total = sum(len(samples[endpoint]) for endpoint in weights)
+    results['total'] = {'requests': total, 'rps': round(total / elapsed, 2)}
+    return results
+
+
+def print_results(label, results):
+    print(f"\n{label}")
+    print(f"  {'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, stats in results.items():
+        if endpoint == 'total':
+            continue
+        print(f"  {endpoint:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.1f} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    print(f"  {'total':<10} {results['total']['requests']:>9} {'':>7} {results['total']['rps']:>9.1f}")
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        endpoint, _, weight = part.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{endpoint}' (expected one of {', '.join(ENDPOINTS)})")
+        weights[endpoint] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the org chart against a mock Graph API")
+    parser.add_argument('--server', action='append', metavar='KIND[:OPTION=VALUE,...]',
+                        help=f"Server configuration to launch (default: {' and '.join(DEFAULT_SERVERS)})")
+    parser.add_argument('--target', action='append', metavar='LABEL=URL', help="Test an already running server")
+    parser.add_argument('--headcount', type=int, default=5000, help="Size of the synthetic tenant")
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--skew', type=float, default=1.5)
+    parser.add_argument('--mock-url', help="Use a separately started mock_graph.py instead of an in-process one")
+    parser.add_argument('--latency-ms', type=float, default=20, help="Mock Graph latency per request")
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--throttle-rate', type=float, default=0.02, help="Share of Graph requests throttled with 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of load per configuration")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent keep-alive clients")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weighted request mix (default {DEFAULT_MIX})")
+    parser.add_argument('--sync-interval', type=float, default=10,
+                        help="Seconds between triggered syncs during the run (0 disables)")
+    parser.add_argument('--startup-timeout', type=float, default=300, help="Seconds to wait for the initial sync")
+    parser.add_argument('--keep-workdirs', action='store_true', help="Keep launched servers' data files and logs")
+    parser.add_argument('--output', help="Where to save results (default loadtest/results/<time>.json)")
+    args = parser.parse_args()
+
+    servers = args.server or ([] if args.target else DEFAULT_SERVERS)
+    for spec in servers:
+        try:
+            parse_server(spec)
+        except ValueError as e:
+            parser.error(str(e))
+
+    tenant = 'loadtest'
+    mock = None
+    mock_url = args.mock_url
+    if servers and not mock_url:
+        print(f"Generating a {args.headcount} employee tenant...")
+        mock = make_server('127.0.0.1', free_port(), [f'{tenant}={args.headcount}:{args.depth}:{args.skew}'],
+                           latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+        threading.Thread(target=mock.serve_forever, daemon=True).start()
+        mock_url = f'http://127.0.0.1:{mock.server_address[1]}'
+        print(f"Mock Graph running at {mock_url}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'headcount': args.headcount,
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'mix': args.mix,
+        'sync_interval': args.sync_interval,
+        'mock': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'throttle_rate': args.throttle_rate},
+        'results': {},
+    }
+
+    try:
+        for spec in servers:
+            print(f"\nStarting {spec}...")
+            server = LaunchedServer(spec, mock_url, tenant)
+            try:
+                started = time.monotonic()
+                server.wait_until_ready(args.startup_timeout)
+                print(f"  initial sync finished in {time.monotonic() - started:.1f}s, running load for {args.duration:g}s")
+                results = run_load(server.url, args, args.mix, server)
+            except BaseException:
+                server.stop(keep_workdir=True)
+                raise
+            server.stop(args.keep_workdirs)
+            report['results'][spec] = results
+            print_results(spec, results)
+
+        for target in args.target or []:
+            label, _, url = target.partition('=')
+            print(f"\nRunning load against {label} ({url}) for {args.duration:g}s")
+            results = run_load(url.rstrip('/'), args, args.mix)
+            report['results'][label] = results
+            print_results(label, results)
+    finally:
+        if mock:
+            report['mock']['stats'] = dict(mock.RequestHandlerClass.state.stats)
+            mock.shutdown()
+
+    output = os.path.abspath(args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Local stand-in for Azure AD token issuance and the Microsoft Graph /users API.
+
+Serves synthetic tenants (see benchmarks/synthetic_org.py) with Graph-style paging via
+@odata.nextLink, optional per-request latency and randomly injected 429 throttling, so the
+app can be run and load tested without a real tenant. Point the app at it with:
+
+    AZURE_TENANT_ID=contoso AZURE_CLIENT_ID=mock AZURE_CLIENT_SECRET=mock
+    AZURE_AUTHORITY_HOST=http://127.0.0.1:8400
+    GRAPH_API_ENDPOINT=http://127.0.0.1:8400/v1.0
+
+Usage:
+    python loadtest/mock_graph.py --tenant contoso=5000 --tenant fabrikam=50000:8:1.2
+    python loadtest/mock_graph.py --latency-ms 80 --jitter-ms 40 --throttle-rate 0.05 --retry-after 1
+
+Each --tenant is NAME=HEADCOUNT[:DEPTH[:SKEW]]. GET /_mock/stats returns request counters.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_org import generate_employees
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 999
+TOKEN_PREFIX = 'mock-token-'
+
+USER_PATH = re.compile(r'^/v1\.0/users/([^/]+)$')
+TOKEN_PATH = re.compile(r'^/([^/]+)/oauth2/v2\.0/token$')
+
+
+def to_graph_user(employee, by_id):
+    """Convert a synthetic employee into the shape Graph returns for /users"""
+    manager = by_id.get(employee['managerId'])
+    return {
+        'id': employee['id'],
+        'displayName': employee['name'],
+        'jobTitle': employee['title'],
+        'department': employee['department'],
+        'mail': employee['email'],
+        'mobilePhone': employee['phone'],
+        'officeLocation': employee['location'],
+        'employeeHireDate': employee['employeeHireDate'] + 'T00:00:00Z',
+        'manager': {'id': manager['id'], 'displayName': manager['name']} if manager else None,
+    }
+
+
+class Tenant:
+    def __init__(self, name, headcount, depth=6, skew=1.5):
+        self.name = name
+        employees = generate_employees(headcount, depth=depth, skew=skew, seed=zlib.crc32(name.encode()))
+        by_id = {emp['id']: emp for emp in employees}
+        self.users = [to_graph_user(emp, by_id) for emp in employees]
+        self.by_id = {user['id']: user for user in self.users}
+
+
+class MockGraphState:
+    def __init__(self, tenants, latency_ms=0, jitter_ms=0, throttle_rate=0.0, retry_after=1):
+        self.tenants = tenants
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.stats = {'tokens': 0, 'pages': 0, 'users': 0, 'throttled': 0, 'unauthorized': 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+
+def shape_user(user, select, expand_manager):
+    if select:
+        shaped = {key: user.get(key) for key in select}
+        shaped['id'] = user['id']
+    else:
+        shaped = {key: value for key, value in user.items() if key != 'manager'}
+    if expand_manager:
+        shaped['manager'] = user['manager']
+    return shaped
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate_latency(self):
+        delay = self.state.latency_ms + random.uniform(0, self.state.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = parse_qs(self.rfile.read(length).decode('utf-8'))
+        match = TOKEN_PATH.match(urlsplit(self.path).path)
+        if not match:
+            return self.send_json(404, {'error': 'not_found'})
+
+        tenant = match.group(1)
+        if tenant not in self.state.tenants:
+            return self.send_json(400, {'error': 'invalid_request', 'error_description': f'Unknown tenant {tenant}'})
+        if body.get('grant_type') != ['client_credentials']:
+            return self.send_json(400, {'error': 'unsupported_grant_type'})
+
+        self.simulate_latency()
+        self.state.count('tokens')
+        self.send_json(200, {'token_type': 'Bearer', 'expires_in': 3599, 'access_token': TOKEN_PREFIX + tenant})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/_mock/stats':
+            with self.state.lock:
+                return self.send_json(200, dict(self.state.stats))
+
+        auth = self.headers.get('Authorization', '')
+        tenant = self.state.tenants.get(auth[len('Bearer ' + TOKEN_PREFIX):]) if auth.startswith('Bearer ' + TOKEN_PREFIX) else None
+        if tenant is None:
+            self.state.count('unauthorized')
+            return self.send_json(401, {'error': {'code': 'InvalidAuthenticationToken', 'message': 'Access token is empty or invalid.'}})
+
+        self.simulate_latency()
+        if self.state.throttle_rate and random.random() < self.state.throttle_rate:
+            self.state.count('throttled')
+            return self.send_json(
+                429,
+                {'error': {'code': 'TooManyRequests', 'message': 'Too many requests'}},
+                {'Retry-After': str(self.state.retry_after)}
+            )
+
+        query = parse_qs(parts.query)
+        select = [field for field in query.get('$select', [''])[0].split(',') if field]
+        expand_manager = query.get('$expand', [''])[0].startswith('manager')
+
+        match = USER_PATH.match(parts.path)
+        if match:
+            user = tenant.by_id.get(match.group(1))
+            if not user:
+                return self.send_json(404, {'error': {'code': 'Request_ResourceNotFound', 'message': 'Not found'}})
+            self.state.count('users')
+            return self.send_json(200, shape_user(user, select, expand_manager))
+
+        if parts.path != '/v1.0/users':
+            return self.send_json(404, {'error': {'code': 'BadRequest', 'message': f'Unsupported path {parts.path}'}})
+
+        top = min(int(query.get('$top', [DEFAULT_PAGE_SIZE])[0]), MAX_PAGE_SIZE)
+        skip = int(query.get('$skiptoken', ['0'])[0])
+        page = tenant.users[skip:skip + top]
+
+        payload = {'value': [shape_user(user, select, expand_manager) for user in page]}
+        if skip + top < len(tenant.users):
+            next_query = {key: values[0] for key, values in query.items()}
+            next_query['$skiptoken'] = str(skip + top)
+            host = self.headers.get('Host', f'{self.server.server_address[0]}:{self.server.server_address[1]}')
+            payload['@odata.nextLink'] = f'http://{host}{parts.path}?{urlencode(next_query, safe="$(),=")}'
+
+        self.state.count('pages')
+        self.state.count('users', len(page))
+        self.send_json(200, payload)
+
+
+def parse_tenant(spec):
+    name, _, config = spec.partition('=')
+    values = config.split(':') if config else []
+    headcount = int(values[0]) if values else 1000
+    depth = int(values[1]) if len(values) > 1 else 6
+    skew = float(values[2]) if len(values) > 2 else 1.5
+    return name, headcount, depth, skew
+
+
+def make_server(host='127.0.0.1', port=8400, tenant_specs=None, **options):
+    """Build (but do not start) a mock Graph server"""
+    tenants = {}
+    for spec in tenant_specs or ['contoso=1000']:
+        name, headcount, depth, skew = parse_tenant(spec)
+        tenants[name] = Tenant(name, headcount, depth, skew)
+    handler = type('Handler', (MockGraphHandler,), {'state': MockGraphState(tenants, **options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Azure AD token + Graph /users server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8400)
+    parser.add_argument('--tenant', action='append', metavar='NAME=HEADCOUNT[:DEPTH[:SKEW]]',
+                        help="Synthetic tenant to serve (default contoso=1000)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Fixed latency added to every request")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Random extra latency, up to this much")
+    parser.add_argument('--throttle-rate', type=float, default=0, help="Share of Graph requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host,
+        args.port,
+        args.tenant,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after
+    )
+    tenants = ', '.join(f'{t.name} ({len(t.users)} users)' for t in server.RequestHandlerClass.state.tenants.values())
+    print(f"Mock Graph listening on http://{args.host}:{args.port} serving {tenants}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
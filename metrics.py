@@ -0,0 +1,320 @@
+"""
+Minimal Prometheus metrics: counters, gauges and histograms rendered in the text
+exposition format, without any extra dependencies.
+
+Gunicorn runs several worker processes and a scrape only reaches one of them. When
+METRICS_DIR is set (gunicorn_config.py sets it) each process writes its values to
+METRICS_DIR/<pid>.json every few seconds, and rendering adds up the files of all
+processes. When gunicorn reaps a worker its values are folded into retired.json, so
+counters never go backwards when workers are recycled.
+"""
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Seconds between writes of this process's values when sharing them through METRICS_DIR
+FLUSH_INTERVAL = 5
+RETIRED_FILE = 'retired.json'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _merge_sum(merged, values):
+    for key, value in values:
+        key = tuple(key)
+        merged[key] = merged[key] + value if key in merged else value
+
+
+def _merge_max(merged, values):
+    for key, value in values:
+        key = tuple(key)
+        merged[key] = max(merged[key], value) if key in merged else value
+
+
+def _merge_histogram(merged, values):
+    for key, (counts, total, count) in values:
+        key = tuple(key)
+        if key in merged:
+            current = merged[key]
+            merged[key] = [[a + b for a, b in zip(current[0], counts)], current[1] + total, current[2] + count]
+        else:
+            merged[key] = [list(counts), total, count]
+
+
+MERGERS = {'counter': _merge_sum, 'gauge': _merge_max, 'histogram': _merge_histogram}
+
+
+class Metric:
+    kind = None
+    shared = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self):
+        """This process's values as JSON-friendly [labels, value] pairs"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self, merged):
+        for key, value in sorted(merged.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down.
+
+    By default only the value of the process serving the scrape is reported, which suits
+    gauges computed at scrape time. With shared=True the value is also written to
+    METRICS_DIR and the largest value across processes is reported (e.g. timestamps).
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), shared=False):
+        super().__init__(name, documentation, labelnames)
+        self.shared = shared
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then the sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def values(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+
+    def samples(self, merged):
+        for key, (counts, total, count) in sorted(merged.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                yield self.name + '_bucket', _format_labels(self.labelnames, key, le), cumulative
+            yield self.name + '_sum', _format_labels(self.labelnames, key), total
+            yield self.name + '_count', _format_labels(self.labelnames, key), count
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self, directory=None):
+        self.metrics = []
+        self.collectors = []
+        self.directory = directory
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics.append(metric)
+        return metric
+
+    def on_collect(self, fn):
+        """Run fn before every render, e.g. to set gauges that are computed at scrape time"""
+        self.collectors.append(fn)
+        return fn
+
+    def collect(self):
+        for fn in self.collectors:
+            fn()
+
+    def state(self):
+        """Values to share with other processes: everything except per-process gauges"""
+        return {metric.name: {'kind': metric.kind, 'values': metric.values()}
+                for metric in self.metrics if metric.shared}
+
+    def _own_file(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def flush(self, force=False):
+        """Write this process's values to METRICS_DIR, at most every FLUSH_INTERVAL seconds"""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_flush = now
+            _write_state(self._own_file(), self.state())
+        finally:
+            self._flush_lock.release()
+
+    def render(self):
+        """Text exposition of every metric, across all processes sharing METRICS_DIR"""
+        self.collect()
+        others = []
+        if self.directory:
+            own_file = self._own_file()
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path != own_file:
+                    state = _read_state(path)
+                    if state:
+                        others.append(state)
+
+        lines = []
+        for metric in self.metrics:
+            merge = MERGERS[metric.kind]
+            merged = {}
+            merge(merged, metric.values())
+            for state in others:
+                merge(merged, state.get(metric.name, {}).get('values', []))
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples(merged):
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _write_state(path, state):
+    # No fsync: these files only need to survive the process, not a power cut
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+REGISTRY = Registry(os.environ.get('METRICS_DIR') or None)
+if REGISTRY.directory:
+    os.makedirs(REGISTRY.directory, exist_ok=True)
+
+
+def _reset_after_fork():
+    # Gunicorn workers are forked from a master that may already have recorded values;
+    # the master reports those itself, so each worker starts from zero
+    for metric in REGISTRY.metrics:
+        metric.reset()
+    REGISTRY._flush_lock = threading.Lock()
+    REGISTRY._last_flush = 0.0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), shared=False):
+    return REGISTRY.register(Gauge(name, documentation, labelnames, shared))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def reset_directory(directory):
+    """Remove values left over from a previous run (gunicorn on_starting hook)"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(pid, directory):
+    """Fold an exited process's values into retired.json (gunicorn child_exit hook)"""
+    path = os.path.join(directory, f'{pid}.json')
+    state = _read_state(path)
+    if state is None:
+        return
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    retired = _read_state(retired_path) or {}
+    for name, metric in state.items():
+        merge = MERGERS[metric['kind']]
+        merged = {}
+        merge(merged, retired.get(name, {}).get('values', []))
+        merge(merged, metric['values'])
+        retired[name] = {'kind': metric['kind'], 'values': [[list(key), value] for key, value in merged.items()]}
+    _write_state(retired_path, retired)
+    os.remove(path)
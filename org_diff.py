@@ -0,0 +1,118 @@
+"""
+Snapshot diffing for the org chart.
+
+Compares two hierarchy snapshots (the nested structure saved in employee_data.json)
+and works out who joined, who left, who moved to a different manager and whose
+details changed. Both snapshots are indexed by employee ID with a content hash per
+record, so the comparison is linear in the size of the org.
+"""
+
+import hashlib
+import json
+
+# Fields compared when looking for attribute changes
+TRACKED_FIELDS = ('name', 'title', 'department', 'email', 'phone', 'location', 'employeeHireDate')
+
+
+def iter_hierarchy(root):
+    """Yield (node, manager_id, depth) for every node in the hierarchy, parents first"""
+    if not root:
+        return
+    stack = [(root, None, 0)]
+    while stack:
+        node, manager_id, depth = stack.pop()
+        yield node, manager_id, depth
+        children = node.get('children') or []
+        for child in reversed(children):
+            if child and isinstance(child, dict):
+                stack.append((child, node.get('id'), depth + 1))
+
+
+def record_hash(node):
+    """Hash of the tracked fields of a single employee record"""
+    values = [node.get(field) for field in TRACKED_FIELDS]
+    encoded = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def index_snapshot(root):
+    """Map employee ID to (manager_id, content_hash, node)"""
+    index = {}
+    for node, manager_id, _ in iter_hierarchy(root):
+        emp_id = node.get('id')
+        if emp_id is not None:
+            index[emp_id] = (manager_id, record_hash(node), node)
+    return index
+
+
+def _summary(node, manager_id):
+    return {
+        'id': node.get('id'),
+        'name': node.get('name'),
+        'title': node.get('title'),
+        'department': node.get('department'),
+        'managerId': manager_id,
+    }
+
+
+def diff_snapshots(old_root, new_root):
+    """Compare two hierarchy snapshots and return joiners, leavers, moves and changes"""
+    old_index = index_snapshot(old_root)
+    new_index = index_snapshot(new_root)
+
+    def manager_name(index, manager_id):
+        entry = index.get(manager_id)
+        return entry[2].get('name') if entry else None
+
+    joiners = []
+    moves = []
+    changes = []
+
+    for emp_id, (manager_id, content_hash, node) in new_index.items():
+        previous = old_index.get(emp_id)
+        if previous is None:
+            joiners.append(_summary(node, manager_id))
+            continue
+
+        old_manager_id, old_hash, old_node = previous
+        if old_manager_id != manager_id:
+            moves.append({
+                'id': emp_id,
+                'name': node.get('name'),
+                'fromManagerId': old_manager_id,
+                'fromManagerName': manager_name(old_index, old_manager_id),
+                'toManagerId': manager_id,
+                'toManagerName': manager_name(new_index, manager_id),
+            })
+
+        if old_hash != content_hash:
+            fields = {}
+            for field in TRACKED_FIELDS:
+                if old_node.get(field) != node.get(field):
+                    fields[field] = {'old': old_node.get(field), 'new': node.get(field)}
+            changes.append({'id': emp_id, 'name': node.get('name'), 'fields': fields})
+
+    leavers = [
+        _summary(node, manager_id)
+        for emp_id, (manager_id, _, node) in old_index.items()
+        if emp_id not in new_index
+    ]
+
+    return {
+        'joiners': joiners,
+        'leavers': leavers,
+        'moves': moves,
+        'changes': changes,
+    }
+
+
+def change_types(entry):
+    """Map employee ID to the kind of change recorded for them in a change feed entry"""
+    types = {}
+    for change in entry.get('changes', []):
+        types[change['id']] = 'updated'
+    for move in entry.get('moves', []):
+        types[move['id']] = 'moved'
+    for joiner in entry.get('joiners', []):
+        types[joiner['id']] = 'joined'
+    return types
@@ -0,0 +1,122 @@
+"""
+Flat exports of the org chart, one record per employee.
+
+The hierarchy is walked iteratively and rows are encoded and yielded a chunk at a time,
+so an export of any size streams straight from the in-memory snapshot (or from SQLite)
+without building the whole file. CSV columns start with the ones import_csv_to_json.py
+reads, so an export can be imported again as it is.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from org_diff import iter_hierarchy
+
+EXPORT_FIELDS = [
+    'id', 'name', 'title', 'department', 'email', 'phone', 'location', 'managerId', 'employeeHireDate',
+    'managerName', 'depth', 'managementChain', 'directReports', 'totalReports'
+]
+# Separator between the manager IDs of managementChain in CSV exports
+CHAIN_SEPARATOR = '/'
+CHUNK_SIZE = 64 * 1024
+
+
+def locate(root, employee_id):
+    """(node, chain) for an employee, where chain is the (id, name) of their managers from the top; (None, None) if absent"""
+    path = []
+    for node, _, depth in iter_hierarchy(root):
+        del path[depth:]
+        if node.get('id') == employee_id:
+            return node, path
+        path.append((node.get('id'), node.get('name')))
+    return None, None
+
+
+def iter_records(root, descendants, chain=()):
+    """Yield a flat record for root and everyone below it, managers before their reports.
+
+    descendants maps id(node) to the number of people below it (see count_descendants) and
+    chain is the (id, name) of root's own managers, so depths and chains stay org-wide when
+    exporting a subtree.
+    """
+    rows = (
+        (node, depth, sum(1 for child in node.get('children') or [] if isinstance(child, dict)),
+         descendants.get(id(node), 0))
+        for node, _, depth in iter_hierarchy(root)
+    )
+    return iter_row_records(rows, chain)
+
+
+def iter_row_records(rows, chain=()):
+    """Yield a flat record per (node, depth, direct reports, total reports) row, given in depth-first order.
+
+    Depths count from the first row, which sits below the managers in chain.
+    """
+    path = list(chain)
+    base = len(path)
+    first = None
+    for node, depth, direct_reports, total_reports in rows:
+        if first is None:
+            first = depth
+        depth -= first
+        del path[base + depth:]
+        manager = path[-1] if path else None
+        yield {
+            'id': node.get('id'),
+            'name': node.get('name'),
+            'title': node.get('title'),
+            'department': node.get('department'),
+            'email': node.get('email'),
+            'phone': node.get('phone'),
+            'location': node.get('location'),
+            'managerId': manager[0] if manager else node.get('managerId'),
+            'employeeHireDate': node.get('employeeHireDate'),
+            'managerName': manager[1] if manager else None,
+            'depth': base + depth,
+            'managementChain': [manager_id for manager_id, _ in path],
+            'directReports': direct_reports,
+            'totalReports': total_reports
+        }
+        path.append((node.get('id'), node.get('name')))
+
+
+def iter_csv(records, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        record['managementChain'] = CHAIN_SEPARATOR.join(str(manager_id) for manager_id in record['managementChain'])
+        writer.writerow(['' if record[field] is None else record[field] for field in EXPORT_FIELDS])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(records, chunk_size=CHUNK_SIZE):
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    lines = []
+    size = 0
+    for record in records:
+        line = encode(record)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+            size = 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text chunks as UTF-8, yielding compressed bytes as they become available"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
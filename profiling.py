@@ -0,0 +1,321 @@
+"""
+On-demand profiling of slow requests and syncs.
+
+Nothing is profiled until an admin turns it on (see /api/admin/profiling); until then the
+only cost per request is checking a config file's timestamp once a second. Three modes can
+be combined:
+
+  - Slow requests: a background thread samples the stacks of in-flight requests every few
+    milliseconds, and any request slower than the threshold has its samples saved in the
+    collapsed-stack format used by flame graph tools (speedscope, flamegraph.pl).
+  - Next N requests: each is run under cProfile and saved as a .prof file (pstats, snakeviz).
+  - Next sync: the next Graph API sync is run under cProfile.
+
+The config and the "next N" allowance live in the profiles folder, so every gunicorn
+worker (and the process running scheduled syncs) picks them up. Each allowance is a ticket
+file that is claimed by deleting it, which only one process can do.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from snapshot_io import atomic_write
+
+CONFIG_NAME = 'config.json'
+TICKETS_DIR = 'tickets'
+MAX_PROFILES = 50
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+# How often each process checks for a changed config
+CONFIG_CHECK_INTERVAL = 1.0
+
+
+def collapse_stack(frame):
+    """Render a frame's stack as 'outer;...;inner' for the collapsed-stack format"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def start_cprofile():
+    """Start a cProfile profiler, or return None if this thread can't be profiled right now"""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows one cProfile at a time per process
+        return None
+    return profile
+
+
+class ProfiledRequest:
+    def __init__(self, kind, route, profile=None):
+        self.kind = kind
+        self.route = route
+        self.profile = profile
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+
+
+class Profiler:
+    def __init__(self, directory, max_profiles=MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._config = {}
+        self._config_signature = None
+        self._next_check = 0.0
+        # Ticket kinds known to be used up for a given config version
+        self._exhausted = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    # -- configuration --------------------------------------------------------
+
+    def config(self, refresh=False):
+        """The current profiling config; empty when profiling is off"""
+        now = time.monotonic()
+        if not refresh and now < self._next_check:
+            return self._config
+        self._next_check = now + CONFIG_CHECK_INTERVAL
+        try:
+            st = os.stat(self._path(CONFIG_NAME))
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._config_signature:
+            config = {}
+            if signature is not None:
+                try:
+                    with open(self._path(CONFIG_NAME), 'r') as f:
+                        config = json.load(f)
+                except (OSError, ValueError):
+                    config = {}
+            self._config = config
+            self._config_signature = signature
+        return self._config
+
+    def configure(self, slow_request_ms=None, next_requests=0, next_sync=False, routes=None):
+        """Replace the profiling config; passing nothing turns profiling off"""
+        os.makedirs(self._path(TICKETS_DIR), exist_ok=True)
+        for name in os.listdir(self._path(TICKETS_DIR)):
+            try:
+                os.remove(self._path(TICKETS_DIR, name))
+            except FileNotFoundError:
+                pass
+
+        version = uuid.uuid4().hex[:8]
+        for i in range(next_requests):
+            open(self._path(TICKETS_DIR, f'request-{version}-{i}'), 'x').close()
+        if next_sync:
+            open(self._path(TICKETS_DIR, f'sync-{version}'), 'x').close()
+
+        config = {}
+        if slow_request_ms or next_requests or next_sync:
+            config = {
+                'version': version,
+                'slowRequestMs': slow_request_ms,
+                'nextRequests': next_requests,
+                'nextSync': bool(next_sync),
+                'routes': routes or [],
+                'updatedAt': datetime.now().isoformat()
+            }
+        with atomic_write(self._path(CONFIG_NAME)) as f:
+            json.dump(config, f)
+        self.config(refresh=True)
+        return self.status()
+
+    def status(self):
+        config = self.config(refresh=True)
+        remaining = {'request': 0, 'sync': 0}
+        try:
+            for name in os.listdir(self._path(TICKETS_DIR)):
+                kind = name.split('-', 1)[0]
+                if kind in remaining and name.startswith(f"{kind}-{config.get('version')}"):
+                    remaining[kind] += 1
+        except FileNotFoundError:
+            pass
+        return dict(config, remainingRequests=remaining['request'], syncPending=bool(remaining['sync']))
+
+    def _claim(self, kind, config):
+        """Take one of this config's tickets of the given kind, if any are left"""
+        version = config.get('version')
+        if self._exhausted.get(kind) == version:
+            return False
+        prefix = f'{kind}-{version}'
+        try:
+            names = [name for name in os.listdir(self._path(TICKETS_DIR)) if name.startswith(prefix)]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            try:
+                os.remove(self._path(TICKETS_DIR, name))
+                return True
+            except FileNotFoundError:
+                continue
+        self._exhausted[kind] = version
+        return False
+
+    def _start_claimed(self, kind, config):
+        """A running cProfile for one of this config's tickets of the given kind, or None.
+
+        The ticket is only taken once the profiler has started, so a request or sync that
+        can't be profiled (another profile is already running) leaves it for the next one.
+        """
+        if self._exhausted.get(kind) == config.get('version'):
+            return None
+        profile = start_cprofile()
+        if profile is None:
+            return None
+        if not self._claim(kind, config):
+            profile.disable()
+            return None
+        return profile
+
+    # -- requests -------------------------------------------------------------
+
+    def begin_request(self, route):
+        """Start profiling the current request if asked to; returns a handle for end_request"""
+        config = self.config()
+        if not config:
+            return None
+        if config.get('routes') and route not in config['routes']:
+            return None
+        if config.get('nextRequests'):
+            profile = self._start_claimed('request', config)
+            if profile is not None:
+                return ProfiledRequest('request', route, profile)
+        if config.get('slowRequestMs'):
+            handle = ProfiledRequest('slow-request', route)
+            with self._lock:
+                self._active[handle.thread_id] = handle
+            self._ensure_sampler()
+            return handle
+        return None
+
+    def end_request(self, handle, method, path, status):
+        if handle is None:
+            return
+        duration_ms = (time.perf_counter() - handle.started) * 1000
+        details = {'route': handle.route, 'method': method, 'path': path, 'status': status,
+                   'durationMs': round(duration_ms, 1)}
+        if handle.profile is not None:
+            handle.profile.disable()
+            self._save_cprofile(handle.profile, 'request', details)
+            return
+
+        with self._lock:
+            self._active.pop(handle.thread_id, None)
+        threshold = self.config().get('slowRequestMs')
+        if threshold and duration_ms >= threshold and handle.stacks:
+            details['samples'] = sum(handle.stacks.values())
+            details['sampleIntervalMs'] = SAMPLE_INTERVAL * 1000
+            self._save('slow-request', 'folded', details,
+                       lambda f: f.write(''.join(f'{stack} {count}\n' for stack, count in handle.stacks.most_common())))
+
+    def _ensure_sampler(self):
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        with self._lock:
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='request-sampler', daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            with self._lock:
+                if not self._active:
+                    if not self.config().get('slowRequestMs'):
+                        self._sampler = None
+                        return
+                    continue
+                frames = sys._current_frames()
+                for thread_id, handle in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        handle.stacks[collapse_stack(frame)] += 1
+                del frames
+
+    # -- syncs ----------------------------------------------------------------
+
+    @contextmanager
+    def profile_sync(self, label='sync'):
+        """Run the block under cProfile if a sync profile has been requested"""
+        config = self.config(refresh=True)
+        profile = self._start_claimed('sync', config) if config.get('nextSync') else None
+        if profile is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._save_cprofile(profile, 'sync', {
+                'route': label,
+                'durationMs': round((time.perf_counter() - started) * 1000, 1)
+            })
+
+    # -- storage --------------------------------------------------------------
+
+    def _save_cprofile(self, profile, kind, details):
+        self._save(kind, 'prof', details, None, profile)
+
+    def _save(self, kind, extension, details, write_text=None, profile=None):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:6]}.{extension}"
+        if profile is not None:
+            profile.dump_stats(self._path(name))
+        else:
+            with atomic_write(self._path(name)) as f:
+                write_text(f)
+        metadata = dict(details, name=name, kind=kind, pid=os.getpid(), createdAt=datetime.now().isoformat())
+        with atomic_write(self._path(name + '.json')) as f:
+            json.dump(metadata, f)
+        self._prune()
+
+    def _prune(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(('.prof.json', '.folded.json')))
+        for sidecar in names[:-self.max_profiles] if len(names) > self.max_profiles else []:
+            for path in (self._path(sidecar), self._path(sidecar[:-len('.json')])):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self):
+        """Metadata for the captured profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(('.prof.json', '.folded.json')):
+                try:
+                    with open(self._path(name), 'r') as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return profiles
+
+    def profile_path(self, name):
+        """Path of a captured profile, or None if there is no such profile"""
+        if os.path.basename(name) != name or not name.endswith(('.prof', '.folded')):
+            return None
+        path = self._path(name)
+        return path if os.path.exists(path) else None
@@ -47,7 +47,6 @@ def main():
     try:
         import flask
         import requests
-        import schedule
     except ImportError:
         install_requirements()
     
@@ -19,12 +19,13 @@ if __name__ == '__main__':
     logger.info("=== OFFLINE MODE ACTIVE ===")
     logger.info("No Azure Graph API calls or auto-updates will occur.")
     logger.info("Serving existing employee_data.json file.")
-    logger.info("Populate/update the JSON via CSV import script if needed.")
+    logger.info("Populate/update the JSON via CSV import script if needed,")
+    logger.info("or upload a CSV to /api/import-csv (requires ADMIN_TOKEN and OFFLINE_MODE=true) to swap it in live.")
     logger.info("=============================")
     
     host = '0.0.0.0'
-    port = 5000
-    threads = 6  # Number of threads to handle requests
+    port = int(os.environ.get('PORT', 5000))
+    threads = int(os.environ.get('WAITRESS_THREADS', 6))  # Number of threads to handle requests
     
     logger.info(f"Starting Offline Waitress server on {host}:{port}")
     logger.info(f"Server running with {threads} threads")
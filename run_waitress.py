@@ -7,6 +7,7 @@ from waitress import serve
 from app import app, start_scheduler
 import logging
 import sys
+import os
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,8 +19,8 @@ if __name__ == '__main__':
     start_scheduler()
     
     host = '0.0.0.0'
-    port = 5000
-    threads = 6  # Number of threads to handle requests
+    port = int(os.environ.get('PORT', 5000))
+    threads = int(os.environ.get('WAITRESS_THREADS', 6))  # Number of threads to handle requests
     
     logger.info(f"Starting Waitress server on {host}:{port}")
     logger.info(f"Server running with {threads} threads")
@@ -0,0 +1,192 @@
+"""
+Event-driven scheduler for recurring jobs (data refreshes, full rebuilds, history compaction).
+
+A single thread sleeps on a condition until the earliest job is due, so it wakes exactly
+when something needs to run, and configure() or stop() wake it immediately. Each run
+happens in its own thread; a job whose previous run is still going is skipped rather than
+started twice. Each due time can be pushed back by a random jitter, so that several
+servers sharing a tenant don't all call the Graph API at the same second.
+
+Times are local wall-clock times, like the 'updateTime' setting they come from.
+"""
+
+import logging
+import os
+import random
+import threading
+import weakref
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+# Longest single sleep; due times are recomputed on waking, which also covers clock changes
+MAX_SLEEP = 3600
+
+_instances = weakref.WeakSet()
+
+
+def parse_time_of_day(value):
+    """(hour, minute) from 'HH:MM'; raises ValueError for anything else"""
+    hour, _, minute = str(value).partition(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f'Invalid time of day: {value}')
+    return hour, minute
+
+
+class Every:
+    """Fixed interval, counted from when the schedule was configured"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError('Interval must be positive')
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def describe(self):
+        return f'every {self.seconds // 60} minutes' if self.seconds % 60 == 0 else f'every {self.seconds} seconds'
+
+
+class Daily:
+    def __init__(self, at):
+        self.at = at
+        self.hour, self.minute = parse_time_of_day(at)
+
+    def next_after(self, moment):
+        due = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return due if due > moment else due + timedelta(days=1)
+
+    def describe(self):
+        return f'daily at {self.at}'
+
+
+class Weekly:
+    def __init__(self, day, at):
+        if str(day).lower() not in WEEKDAYS:
+            raise ValueError(f'Invalid day of the week: {day}')
+        self.day = day.lower()
+        self.weekday = WEEKDAYS.index(self.day)
+        self.at = at
+        self.hour, self.minute = parse_time_of_day(at)
+
+    def next_after(self, moment):
+        due = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        due += timedelta(days=(self.weekday - moment.weekday()) % 7)
+        return due if due > moment else due + timedelta(days=7)
+
+    def describe(self):
+        return f'{self.day}s at {self.at}'
+
+
+class ScheduledJob:
+    def __init__(self, name, cadence, func, jitter=0):
+        self.name = name
+        self.cadence = cadence
+        self.func = func
+        self.jitter = jitter
+        self.next_run = None
+        self.thread = None
+
+    def plan(self, after):
+        self.next_run = self.cadence.next_after(after)
+        if self.jitter:
+            self.next_run += timedelta(seconds=random.uniform(0, self.jitter))
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class Scheduler:
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        _instances.add(self)
+
+    def configure(self, jobs):
+        """Replace the scheduled jobs; takes effect immediately, even while the scheduler sleeps.
+
+        Jobs keep their next run time if their cadence description is unchanged.
+        """
+        now = datetime.now()
+        with self._cond:
+            previous = self._jobs
+            self._jobs = {}
+            for job in jobs:
+                old = previous.get(job.name)
+                if old is not None and old.cadence.describe() == job.cadence.describe():
+                    job.next_run, job.thread = old.next_run, old.thread
+                else:
+                    job.plan(now)
+                self._jobs[job.name] = job
+            self._cond.notify_all()
+        for job in jobs:
+            logger.info(f"Scheduled {job.name} {job.cadence.describe()} (next run {job.next_run:%Y-%m-%d %H:%M:%S})")
+
+    def start(self):
+        with self._cond:
+            if self.running():
+                return False
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+        logger.info("Scheduler started")
+        return True
+
+    def stop(self, timeout=5):
+        """Stop scheduling new runs and wait for the scheduler thread to exit"""
+        with self._cond:
+            self._stopping = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        logger.info("Scheduler stopped")
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopping:
+                now = datetime.now()
+                for job in list(self._jobs.values()):
+                    if job.next_run is not None and job.next_run <= now:
+                        self._launch(job, now)
+                upcoming = [job.next_run for job in self._jobs.values() if job.next_run is not None]
+                delay = min((min(upcoming) - now).total_seconds(), MAX_SLEEP) if upcoming else MAX_SLEEP
+                self._cond.wait(max(delay, 0))
+
+    def _launch(self, job, now):
+        job.plan(now)
+        if job.running():
+            logger.warning(f"Skipping scheduled {job.name}: the previous run is still going")
+            return
+        job.thread = threading.Thread(target=self._run, args=(job,), name=f'{self.name}-{job.name}', daemon=True)
+        job.thread.start()
+
+    def _run(self, job):
+        try:
+            job.func()
+        except Exception as e:
+            logger.error(f"Scheduled {job.name} failed: {e}")
+
+
+def _reset_after_fork():
+    # The scheduler thread doesn't exist in a forked child (e.g. a gunicorn worker forked
+    # from the master that runs the schedule), and its condition may have been held at fork
+    for instance in list(_instances):
+        instance._cond = threading.Condition()
+        instance._thread = None
+        for job in instance._jobs.values():
+            job.thread = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
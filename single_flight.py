@@ -0,0 +1,245 @@
+"""
+Single-flight execution of employee data syncs.
+
+Only one sync runs at a time. A caller that arrives while a sync is running joins it
+instead of starting another: callers in the same process wait for it and share its
+result, and callers in other processes (other gunicorn workers, or the master running
+scheduled syncs) see the lock file held and wait for it to be released.
+
+The cross-process lock is an flock, so it is released if the process holding it dies.
+Platforms without fcntl (Windows) run the app in a single waitress process, where the
+in-process lock is all that is needed. ProcessLock applies the same locking to work that
+is refused rather than joined while it runs, such as CSV imports, or that waits its turn,
+such as publishing a new snapshot.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_instances = weakref.WeakSet()
+_locks = weakref.WeakSet()
+
+
+def _open_lock_file(path):
+    if fcntl is None or not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(path, 'a')
+
+
+def _try_lock_file(path):
+    """Lock path without blocking: the open file, None if there's no file lock, False if it's held elsewhere"""
+    handle = _open_lock_file(path)
+    if handle is None:
+        return None
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    return handle
+
+
+class Flight:
+    """One run of the sync, shared by every caller that asked for it while it was running"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.context = None
+        self.result = None
+        self.done = threading.Event()
+
+
+class SingleFlight:
+    """Runs func in a background thread, at most once at a time.
+
+    If prepare is given, it is called with the arguments of whichever start() or run() call
+    starts a run, before the run begins, and its result is passed to func (e.g. to register
+    a job that other callers can look up). Arguments of calls that join a run are ignored.
+    """
+
+    def __init__(self, func, lock_path=None, name='sync', prepare=None):
+        self.func = func
+        self.prepare = prepare
+        self.lock_path = lock_path
+        self.name = name
+        self._flight = None
+        self._handle = None
+        self._lock = threading.Lock()
+        _instances.add(self)
+        # When the last run in this process ended, for cooldowns
+        self.last_finished = None
+
+    def _try_lock_file(self):
+        return _try_lock_file(self.lock_path)
+
+    def _wait_for_lock_file(self):
+        """Block until a run in another process has finished"""
+        handle = _open_lock_file(self.lock_path)
+        if handle is None:
+            return
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        finally:
+            handle.close()
+
+    def _execute(self, flight, handle):
+        try:
+            flight.result = self.func(flight.context) if self.prepare else self.func()
+        except Exception as e:
+            logger.error(f"{self.name} failed: {e}")
+        finally:
+            with self._lock:
+                self._flight = None
+                self._handle = None
+                self.last_finished = time.time()
+            if handle:
+                handle.close()
+            flight.done.set()
+
+    def _join(self, cooldown=0, args=()):
+        """The flight in progress in this process, starting one if nothing is running anywhere.
+
+        Returns (flight, started); flight is None when a run is in progress in another process,
+        or when the last run ended less than cooldown seconds ago.
+        """
+        with self._lock:
+            if self._flight is not None:
+                return self._flight, False
+            if cooldown and self.last_finished and time.time() - self.last_finished < cooldown:
+                return None, False
+            handle = self._try_lock_file()
+            if handle is False:
+                return None, False
+            flight = Flight()
+            if self.prepare:
+                try:
+                    flight.context = self.prepare(*args)
+                except Exception:
+                    if handle:
+                        handle.close()
+                    raise
+            self._flight = flight
+            self._handle = handle
+        threading.Thread(target=self._execute, args=(flight, handle), name=f'{self.name}-flight', daemon=True).start()
+        return flight, True
+
+    def start(self, *args, cooldown=0):
+        """Start a run in the background unless one is already running.
+
+        Returns (context, started): the prepare() result of the run in progress in this process
+        (None when it runs in another process, or without prepare), and whether this call
+        started it. With a cooldown, no new run starts until that many seconds after the last
+        one ended.
+        """
+        flight, started = self._join(cooldown, args)
+        return (flight.context if flight else None), started
+
+    def run(self, *args, timeout=None):
+        """Run (or join the run in progress) and wait for it to finish.
+
+        Returns the run's result, or None if it ran in another process or didn't finish in time.
+        """
+        flight, _ = self._join(args=args)
+        if flight is None:
+            self._wait_for_lock_file()
+            return None
+        flight.done.wait(timeout)
+        return flight.result
+
+    def running(self):
+        """Whether a run is in progress in this or any other process"""
+        if self._flight is not None:
+            return True
+        handle = self._try_lock_file()
+        if handle is False:
+            return True
+        if handle:
+            handle.close()
+        return False
+
+
+class ProcessLock:
+    """A lock held by at most one thread in one process at a time.
+
+    acquire() returns straight away unless asked to wait; used in a with block, it waits.
+    The holder may release it from another thread, e.g. the one it handed the work to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._handle = None
+        _locks.add(self)
+
+    def acquire(self, blocking=False):
+        """True if the lock is now held by the caller; False if it is held elsewhere and blocking is off"""
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            handle = self._wait_for_lock_file() if blocking else _try_lock_file(self.path)
+        except BaseException:
+            self._lock.release()
+            raise
+        if handle is False:
+            self._lock.release()
+            return False
+        self._handle = handle
+        return True
+
+    def _wait_for_lock_file(self):
+        handle = _open_lock_file(self.path)
+        if handle is None:
+            return None
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        except BaseException:
+            handle.close()
+            raise
+        return handle
+
+    def release(self):
+        handle, self._handle = self._handle, None
+        if handle:
+            handle.close()
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire(blocking=True)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _reset_after_fork():
+    # A worker forked while the master is syncing inherits the locked file, and would keep the
+    # lock held after the master's sync ends; the run itself doesn't exist in the child
+    for instance in list(_instances):
+        instance._lock = threading.Lock()
+        if instance._handle:
+            instance._handle.close()
+        instance._handle = None
+        instance._flight = None
+    # Likewise for ProcessLocks, which the child never acquired
+    for lock in list(_locks):
+        lock._lock = threading.Lock()
+        if lock._handle:
+            lock._handle.close()
+        lock._handle = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
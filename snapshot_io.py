@@ -0,0 +1,263 @@
+"""
+Helpers for reading and writing the employee_data.json snapshot.
+
+Shared by the Flask app and the CSV importer so that both write the snapshot in the
+same format, and always atomically: the new file is written next to the old one and
+swapped into place, so a reader never sees a half-written snapshot.
+"""
+
+import gc
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from org_diff import iter_hierarchy
+
+
+def _read_umask():
+    # There is no way to read the umask without setting it, so it is read once, before any threads start
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _read_umask()
+
+
+def _file_mode(path):
+    """Permissions for a new version of path: those of the existing file, else what open() would give"""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    """Open a temporary file next to path and move it over path once the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# Size of the pieces iter_json() yields
+CHUNK_SIZE = 64 * 1024
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _open_node(node):
+    """JSON for a node up to the start of its children, plus the children still to write"""
+    children = node.get('children')
+    if not children or not isinstance(children, list) or not any(
+            isinstance(child, dict) and child.get('children') for child in children):
+        # Leaves and managers of leaves (most of the tree) are encoded in one go
+        return _encode(node), None
+    fields = {key: value for key, value in node.items() if key != 'children'}
+    head = _encode(fields)[:-1]
+    return head + (',"children":[' if fields else '"children":['), children
+
+
+def iter_json(root, chunk_size=CHUNK_SIZE):
+    """Serialize a hierarchy as compact JSON, yielding chunks of roughly chunk_size characters.
+
+    The tree is walked iteratively and each node is encoded on its own, so memory use stays
+    flat however large the org is and deep hierarchies can't hit the recursion limit.
+    """
+    parts = []
+    size = 0
+    head, children = _open_node(root)
+    parts.append(head)
+    stack = [[children, 0]] if children else []
+    while stack:
+        top = stack[-1]
+        siblings, index = top
+        if index == len(siblings):
+            parts.append(']}')
+            stack.pop()
+            continue
+        top[1] = index + 1
+        head, children = _open_node(siblings[index])
+        if index:
+            head = ',' + head
+        parts.append(head)
+        size += len(head)
+        if children:
+            stack.append([children, 0])
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    yield ''.join(parts)
+
+
+def write_snapshot(path, hierarchy):
+    """Atomically write a hierarchy to the snapshot file"""
+    # ASCII output keeps the file readable whatever the platform's default encoding is
+    with atomic_write(path) as f:
+        for chunk in iter_json(hierarchy):
+            f.write(chunk)
+
+
+def read_snapshot(path):
+    """Read a hierarchy from the snapshot file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def count_descendants(nodes):
+    """{id(node): number of people below it} for nodes listed parents first (as iter_hierarchy yields them)"""
+    counts = {}
+    for node in reversed(nodes):
+        total = 0
+        for child in node.get('children') or []:
+            if isinstance(child, dict):
+                total += 1 + counts.get(id(child), 0)
+        counts[id(node)] = total
+    return counts
+
+
+def truncate_tree(root, levels, descendants):
+    """Copy of the top levels of a hierarchy (1 = root only), for rendering a collapsed chart.
+
+    Every node in the copy carries childCount and descendantCount; nodes on the last level
+    keep their counts but have an empty children list, so the client can fetch them on demand.
+    """
+    def copy(node):
+        children = [child for child in node.get('children') or [] if isinstance(child, dict)]
+        fields = {key: value for key, value in node.items() if key != 'children'}
+        fields['childCount'] = len(children)
+        fields['descendantCount'] = descendants.get(id(node), 0)
+        fields['children'] = []
+        return fields, children
+
+    top, children = copy(root)
+    stack = [(top, children, 1)]
+    while stack:
+        parent, children, depth = stack.pop()
+        if depth >= levels:
+            continue
+        for child in children:
+            copied, grandchildren = copy(child)
+            parent['children'].append(copied)
+            stack.append((copied, grandchildren, depth + 1))
+    return top
+
+
+# Fields with few distinct values across an org (titles, departments, locations, hire dates)
+SHARED_VALUE_FIELDS = ('title', 'department', 'location', 'employeeHireDate', 'hireDate')
+
+
+@contextmanager
+def gc_paused():
+    """Suspend the cyclic garbage collector while building a large acyclic structure.
+
+    Parsing a snapshot allocates hundreds of thousands of containers, each of which would
+    otherwise count towards (and keep triggering) collections that find nothing to free.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class Snapshot:
+    """A loaded hierarchy plus the lookups the API needs, built once per load.
+
+    Repeated values are shared between nodes: each distinct title, department, location or
+    hire date is held once, and managerId points at the manager's own id string.
+    """
+
+    def __init__(self, root, version=None):
+        self.root = root
+        self.version = version
+        self.by_id = by_id = {}
+        self.employees = employees = []
+        shared = {}
+        for node, manager_id, _ in iter_hierarchy(root):
+            employees.append(node)
+            emp_id = node.get('id')
+            if emp_id is not None:
+                by_id[emp_id] = node
+            for field in SHARED_VALUE_FIELDS:
+                value = node.get(field)
+                if value.__class__ is str:
+                    node[field] = shared.setdefault(value, value)
+            if manager_id is not None and node.get('managerId') == manager_id:
+                node['managerId'] = manager_id
+        self.count = len(employees)
+        self.lock = threading.Lock()
+        self.annotation_key = None
+        self._descendants = None
+        # Responses derived from this snapshot (e.g. collapsed views), dropped with it on reload
+        self.views = {}
+
+    @property
+    def descendants(self):
+        if self._descendants is None:
+            self._descendants = count_descendants(self.employees)
+        return self._descendants
+
+
+class SnapshotCache:
+    """Keeps the snapshot file in memory, reloading it when the file on disk is replaced.
+
+    Writers replace the file atomically, so checking the file's identity on each call is
+    enough for every worker process to pick up a new snapshot without a restart.
+    """
+
+    def __init__(self, path, on_lookup=None):
+        self.path = path
+        self.on_lookup = on_lookup
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        """Return the current Snapshot, or None if there is no snapshot file"""
+        signature = self._signature()
+        if signature is None:
+            return None
+        snapshot = self._snapshot
+        hit = snapshot is not None and snapshot.version == signature
+        if not hit:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != signature:
+                    with gc_paused():
+                        snapshot = Snapshot(read_snapshot(self.path), signature)
+                    self._snapshot = snapshot
+        if self.on_lookup:
+            self.on_lookup(hit)
+        return snapshot
+
+    def peek(self):
+        """The Snapshot held in memory, if any, without checking the file"""
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
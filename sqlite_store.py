@@ -0,0 +1,314 @@
+"""
+SQLite storage for a chart's org, as an alternative to employee_data.json.
+
+The org lives in one table with a row per employee, in depth-first order: a subtree is the
+range of positions from its root to root + descendants, the levels just below someone are
+walked with a recursive query on the manager index, and management chains walk up the same
+way. Names, titles and departments are indexed in an FTS5 trigram table, so search finds any
+substring, as it does on the in-memory snapshot.
+
+Nothing is kept in memory between requests, so very large orgs cost each worker next to
+nothing. Writes replace the whole org in a single transaction and the database runs in WAL
+mode, so readers keep seeing the previous org until the new one is committed and never wait
+for a write.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import weakref
+from datetime import datetime
+
+from org_diff import iter_hierarchy
+from snapshot_io import CHUNK_SIZE, count_descendants
+
+logger = logging.getLogger(__name__)
+
+# Fields derived at request time, so they are not stored
+TRANSIENT_FIELDS = ('children', 'isNewEmployee', 'changeType')
+# Rows per executemany call while writing
+WRITE_BATCH = 5000
+# Seconds to wait for another process's write before giving up
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    manager_id TEXT,
+    depth INTEGER NOT NULL,
+    reports INTEGER NOT NULL,
+    descendants INTEGER NOT NULL,
+    name TEXT,
+    title TEXT,
+    department TEXT,
+    hire_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS employees_manager ON employees (manager_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS employee_search USING fts5(
+    name, title, department, content='employees', content_rowid='position', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+ROW_COLUMNS = 'e.id, e.hire_date, e.data, e.depth, e.reports, e.descendants'
+
+SUBTREE_LEVELS_QUERY = f"""
+WITH RECURSIVE subtree(id, level) AS (
+    SELECT id, 1 FROM employees WHERE {{root}}
+    UNION ALL
+    SELECT e.id, s.level + 1 FROM employees e JOIN subtree s ON e.manager_id = s.id WHERE s.level < ?
+)
+SELECT {ROW_COLUMNS} FROM subtree JOIN employees e ON e.id = subtree.id ORDER BY e.position
+"""
+
+CHAIN_QUERY = """
+WITH RECURSIVE chain(id, manager_id, name, depth) AS (
+    SELECT id, manager_id, name, depth FROM employees WHERE id = ?
+    UNION ALL
+    SELECT e.id, e.manager_id, e.name, e.depth FROM employees e JOIN chain c ON e.id = c.manager_id
+)
+SELECT id, name FROM chain WHERE id != ? ORDER BY depth
+"""
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+_instances = weakref.WeakSet()
+
+
+# The trigram index needs at least this many characters; shorter queries scan the table
+MIN_INDEXED_QUERY = 3
+
+
+def search_expression(query):
+    """FTS5 query matching query as a substring of any indexed column"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _head(data, extra):
+    """JSON for a stored node plus extra fields, up to the start of its children"""
+    parts = [part for part in (data[1:-1], _encode(extra)[1:-1] if extra else '') if part]
+    parts.append('"children":[')
+    return '{' + ','.join(parts)
+
+
+def iter_rows_json(rows, annotate=None, counts=False, chunk_size=CHUNK_SIZE):
+    """Serialize rows in depth-first order as a nested hierarchy, yielding chunks of JSON.
+
+    annotate(emp_id, hire_date) returns request-time fields to add to each node. With counts,
+    every node carries childCount and descendantCount, as in a collapsed view.
+    """
+    parts = []
+    size = 0
+    base = None
+    open_depth = -1
+    for emp_id, hire_date, data, depth, reports, descendants in rows:
+        if base is None:
+            base = depth
+        depth -= base
+        extra = annotate(emp_id, hire_date) if annotate else {}
+        if counts:
+            extra['childCount'] = reports
+            extra['descendantCount'] = descendants
+        head = _head(data, extra)
+        if depth <= open_depth:
+            head = ']}' * (open_depth - depth + 1) + ',' + head
+        open_depth = depth
+        parts.append(head)
+        size += len(head)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    parts.append(']}' * (open_depth + 1))
+    yield ''.join(parts)
+
+
+class SqliteStore:
+    """A chart's org in a SQLite database, queried per request"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Responses derived from the current org (e.g. collapsed views), keyed by the app
+        self.views = {}
+        # Held while reading or changing views, which request threads share
+        self.lock = threading.Lock()
+        _instances.add(self)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit, with transactions opened explicitly by write()
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key):
+        row = self._connection().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def exists(self):
+        """True once an org has been written (without creating the database)"""
+        return os.path.exists(self.path) and self.version() is not None
+
+    def version(self):
+        """Number of the org currently stored, increased by every write; None before the first"""
+        return self._meta('version')
+
+    def written_at(self):
+        """When the current org was written, as a Unix timestamp"""
+        return self._meta('written')
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+
+    def write(self, hierarchy):
+        """Replace the stored org with hierarchy in one transaction"""
+        nodes = []
+        depths = []
+        for node, _, depth in iter_hierarchy(hierarchy):
+            nodes.append(node)
+            depths.append(depth)
+        descendants = count_descendants(nodes)
+
+        def rows():
+            path = []
+            for position, (node, depth) in enumerate(zip(nodes, depths)):
+                del path[depth:]
+                fields = {key: value for key, value in node.items() if key not in TRANSIENT_FIELDS}
+                yield (
+                    position,
+                    node.get('id'),
+                    path[-1] if path else None,
+                    depth,
+                    sum(1 for child in node.get('children') or [] if isinstance(child, dict)),
+                    descendants.get(id(node), 0),
+                    node.get('name'),
+                    node.get('title'),
+                    node.get('department'),
+                    node.get('hireDate'),
+                    _encode(fields)
+                )
+                path.append(node.get('id'))
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM employees')
+            batch = []
+            for row in rows():
+                batch.append(row)
+                if len(batch) >= WRITE_BATCH:
+                    conn.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                    batch = []
+            conn.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            conn.execute("INSERT INTO employee_search (employee_search) VALUES ('rebuild')")
+            version = (self._meta('version') or 0) + 1
+            conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                             [('version', version), ('written', datetime.now().timestamp())])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        logger.info(f"Wrote {len(nodes)} employees to {self.path} (version {version})")
+
+    def _root_condition(self, root_id):
+        if root_id is None:
+            return 'position = 0', ()
+        return 'id = ?', (root_id,)
+
+    def contains(self, emp_id):
+        row = self._connection().execute('SELECT 1 FROM employees WHERE id = ?', (emp_id,)).fetchone()
+        return row is not None
+
+    def rows(self, root_id=None, levels=None):
+        """(id, hire_date, data, depth, reports, descendants) for a subtree (the whole org by default) in depth-first order.
+
+        levels limits the subtree to that many levels (1 = root only). Rows are read lazily
+        by a single query, so they all come from the same version of the org.
+        """
+        condition, params = self._root_condition(root_id)
+        if levels is not None:
+            query = SUBTREE_LEVELS_QUERY.format(root=condition)
+            params += (levels,)
+        elif root_id is None:
+            query = f'SELECT {ROW_COLUMNS} FROM employees e ORDER BY e.position'
+        else:
+            query = f"""
+                SELECT {ROW_COLUMNS} FROM employees e, (SELECT position, descendants FROM employees WHERE {condition}) r
+                WHERE e.position BETWEEN r.position AND r.position + r.descendants ORDER BY e.position
+            """
+        cursor = self._connection().execute(query, params)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def chain(self, emp_id):
+        """(id, name) of an employee's managers from the top"""
+        return [tuple(row) for row in self._connection().execute(CHAIN_QUERY, (emp_id, emp_id))]
+
+    def search(self, query, limit=10):
+        """IDs of the first employees (in chart order) whose name, title or department contains query, ignoring case"""
+        query = query.lower()
+        conn = self._connection()
+        if len(query) >= MIN_INDEXED_QUERY:
+            return [row[0] for row in conn.execute(
+                'SELECT e.id FROM employee_search s JOIN employees e ON e.position = s.rowid '
+                'WHERE employee_search MATCH ? ORDER BY e.position LIMIT ?', (search_expression(query), limit))]
+        if query.isascii():
+            # SQLite's lower() only folds ASCII, which is enough for an ASCII query
+            return [row[0] for row in conn.execute(
+                'SELECT id FROM employees WHERE instr(lower(name), ?1) OR instr(lower(title), ?1) '
+                'OR instr(lower(department), ?1) ORDER BY position LIMIT ?2', (query, limit))]
+        ids = []
+        for emp_id, *fields in conn.execute('SELECT id, name, title, department FROM employees ORDER BY position'):
+            if any(query in (field or '').lower() for field in fields):
+                ids.append(emp_id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    def iter_subtrees_json(self, ids, annotate=None):
+        """A JSON list of the subtrees under ids, in chunks"""
+        yield '['
+        for index, emp_id in enumerate(ids):
+            if index:
+                yield ','
+            yield from iter_rows_json(self.rows(emp_id), annotate)
+        yield ']'
+
+    def tree(self, root_id=None):
+        """The stored org (or a subtree) as nested dicts, or None if it is empty or root_id is unknown"""
+        root = None
+        stack = []
+        base = None
+        for _, _, data, depth, _, _ in self.rows(root_id):
+            if base is None:
+                base = depth
+            node = json.loads(data)
+            node['children'] = []
+            del stack[depth - base:]
+            if stack:
+                stack[-1]['children'].append(node)
+            else:
+                root = node
+            stack.append(node)
+        return root
+
+
+def _reset_after_fork():
+    # SQLite connections must not be used across a fork; workers open their own
+    for instance in list(_instances):
+        instance._local = threading.local()
+        instance.lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,5 +1,8 @@
 let currentData = null;
 let allEmployees = [];
+let treeIsPartial = false; // true while only the collapsed levels have been downloaded
+let fullTreePromise = null;
+let detailEmployee = null;
 let root = null;
 let svg = null;
 let g = null;
@@ -7,12 +10,27 @@ let zoom = null;
 let appSettings = {};
 let currentLayout = 'vertical'; // Default layout
 
-const API_BASE_URL = window.location.origin;
+// Charts other than the default are served under /c/<chart>/ (see charts.py)
+const API_BASE_URL = window.location.origin + (window.CHART_BASE || '');
 const nodeWidth = 220;
 const nodeHeight = 80;
 const levelHeight = 120;
 const userIconUrl = window.location.origin + '/static/usericon.png';
 
+// Above this many visible nodes the chart is drawn on a canvas instead of as SVG elements
+const CANVAS_NODE_THRESHOLD = 1500;
+// Below these zoom levels the canvas leaves out everything but names, then everything but the boxes
+const CANVAS_DETAIL_ZOOM = 0.6;
+const CANVAS_NAME_ZOOM = 0.35;
+let canvas = null;
+let canvasIndex = null; // quadtree of the visible nodes while the canvas renderer is active
+let canvasLinks = [];
+let canvasFrame = null;
+const canvasHighlights = new Set();
+const userIcon = new Image();
+userIcon.onload = () => scheduleCanvasDraw();
+userIcon.src = userIconUrl;
+
 async function loadSettings() {
     try {
         const response = await fetch(`${API_BASE_URL}/api/settings`);
@@ -78,15 +96,40 @@ function setLayoutOrientation(orientation) {
     }
 }
 
+const WARMING_UP_MAX_RETRIES = 60;
+
+// Fetch from the API, waiting and retrying while the server is loading its first data (503 + Retry-After)
+async function fetchWhenReady(url, onWaiting) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(url);
+        if (response.status !== 503 || attempt >= WARMING_UP_MAX_RETRIES) {
+            return response;
+        }
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+        if (onWaiting) {
+            const body = await response.json().catch(() => ({}));
+            onWaiting(body.error || 'Employee data is loading, please wait...');
+        }
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+    }
+}
+
 async function init() {
     await loadSettings();
     
     try {
-        const response = await fetch(`${API_BASE_URL}/api/employees`);
+        // Only the levels shown initially are downloaded; deeper levels are fetched on demand
+        const collapseLevel = appSettings.collapseLevel || '2';
+        const query = collapseLevel !== 'all' ? `?collapseLevel=${encodeURIComponent(collapseLevel)}` : '';
+        const response = await fetchWhenReady(`${API_BASE_URL}/api/employees${query}`, message => {
+            const status = document.querySelector('#orgChart .loading p');
+            if (status) status.textContent = message;
+        });
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         currentData = await response.json();
+        treeIsPartial = query !== '';
         
         if (currentData) {
             allEmployees = flattenTree(currentData);
@@ -100,6 +143,77 @@ async function init() {
     }
 }
 
+// Direct reports of a chart node, including ones not downloaded yet
+function reportCount(d) {
+    return d.data.childCount ?? (d._children?.length || d.children?.length || 0);
+}
+
+function hasUnloadedReports(d) {
+    return !d.children && !d._children && reportCount(d) > 0;
+}
+
+function isCollapsed(d) {
+    return !!d._children?.length || hasUnloadedReports(d);
+}
+
+async function fetchSubtree(employeeId, levels) {
+    const response = await fetch(`${API_BASE_URL}/api/employees?root=${encodeURIComponent(employeeId)}&collapseLevel=${levels}`);
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+}
+
+// Download the direct reports of a node that was cut off by the collapsed view
+async function loadChildren(d) {
+    const data = await fetchSubtree(d.data.id, 2);
+    const subtree = d3.hierarchy(data);
+    d.data.children = data.children;
+    d.children = subtree.children || null;
+    if (d.children) {
+        d.children.forEach(child => {
+            child.parent = d;
+            child.each(n => { n.depth += d.depth; });
+        });
+    }
+    allEmployees.push(...data.children);
+}
+
+// Replace a collapsed view with the full tree (needed by search, expand all and full exports),
+// keeping the nodes that are currently expanded open
+function ensureFullTree() {
+    if (!treeIsPartial) return Promise.resolve();
+    if (!fullTreePromise) {
+        fullTreePromise = (async () => {
+            const response = await fetch(`${API_BASE_URL}/api/employees`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            const expanded = new Set();
+            const positions = {};
+            root.each(d => {
+                if (d.children) expanded.add(d.data.id);
+                positions[d.data.id] = [d.x0, d.y0];
+            });
+
+            currentData = data;
+            allEmployees = flattenTree(data);
+            root = d3.hierarchy(data);
+            root.each(d => {
+                [d.x0, d.y0] = positions[d.data.id] || [root.x0 || 0, root.y0 || 0];
+                if (d.children && !expanded.has(d.data.id)) {
+                    d._children = d.children;
+                    d.children = null;
+                }
+            });
+            treeIsPartial = false;
+        })();
+        fullTreePromise.catch(() => { fullTreePromise = null; });
+    }
+    return fullTreePromise;
+}
+
 function flattenTree(node, list = []) {
     if (!node) return list;
     list.push(node);
@@ -120,6 +234,18 @@ function renderOrgChart(data) {
 
     const width = container.clientWidth;
     const height = container.clientHeight || 800;
+    const ratio = window.devicePixelRatio || 1;
+
+    // Sits under the SVG, which keeps handling zoom, pan and clicks
+    canvas = d3.select('#orgChart')
+        .append('canvas')
+        .attr('class', 'org-canvas')
+        .attr('width', width * ratio)
+        .attr('height', height * ratio)
+        .style('width', `${width}px`)
+        .style('height', `${height}px`)
+        .style('display', 'none')
+        .node();
 
     svg = d3.select('#orgChart')
         .append('svg')
@@ -130,9 +256,12 @@ function renderOrgChart(data) {
         .scaleExtent([0.1, 3])
         .on('zoom', (event) => {
             g.attr('transform', event.transform);
+            scheduleCanvasDraw();
         });
 
-    svg.call(zoom);
+    svg.call(zoom)
+        .on('click', canvasClick)
+        .on('mousemove', canvasHover);
 
     g = svg.append('g');
 
@@ -179,6 +308,14 @@ function update(source) {
         });
     }
 
+    if (nodes.length > CANVAS_NODE_THRESHOLD) {
+        renderCanvas(nodes, links);
+        return;
+    }
+    if (canvasIndex) {
+        leaveCanvas();
+    }
+
     const link = g.selectAll('.link')
         .data(links, d => d.target.data.id);
 
@@ -221,6 +358,8 @@ function update(source) {
             let classes = 'node-rect';
             if (appSettings.highlightNewEmployees !== false && d.data.isNewEmployee) {
                 classes += ' new-employee';
+            } else if (appSettings.highlightRecentChanges !== false && d.data.changeType) {
+                classes += ' recent-change';
             }
             return classes;
         })
@@ -228,34 +367,12 @@ function update(source) {
         .attr('y', -nodeHeight/2)
         .attr('width', nodeWidth)
         .attr('height', nodeHeight)
-        .style('fill', d => {
-            const nodeColors = appSettings.nodeColors || {};
-            switch(d.depth) {
-                case 0: return nodeColors.level0 || '#90EE90';
-                case 1: return nodeColors.level1 || '#FFFFE0';
-                case 2: return nodeColors.level2 || '#E0F2FF';
-                case 3: return nodeColors.level3 || '#FFE4E1';
-                case 4: return nodeColors.level4 || '#E8DFF5';
-                case 5: return nodeColors.level5 || '#FFEAA7';
-                default: return '#F0F0F0'; 
-            }
-        })
+        .style('fill', d => nodeFill(d.depth))
         .style('stroke', d => {
             if (appSettings.highlightNewEmployees !== false && d.data.isNewEmployee) {
                 return null;
             }
-            const nodeColors = appSettings.nodeColors || {};
-            let fillColor;
-            switch(d.depth) {
-                case 0: fillColor = nodeColors.level0 || '#90EE90'; break;
-                case 1: fillColor = nodeColors.level1 || '#FFFFE0'; break;
-                case 2: fillColor = nodeColors.level2 || '#E0F2FF'; break;
-                case 3: fillColor = nodeColors.level3 || '#FFE4E1'; break;
-                case 4: fillColor = nodeColors.level4 || '#E8DFF5'; break;
-                case 5: fillColor = nodeColors.level5 || '#FFEAA7'; break;
-                default: fillColor = '#F0F0F0';
-            }
-            return adjustColor(fillColor, -50);
+            return adjustColor(nodeFill(d.depth), -50);
         })
         .style('stroke-width', '2px');
 
@@ -307,8 +424,7 @@ function update(source) {
         const countGroup = nodeEnter.append('g')
             .attr('class', 'count-badge')
             .style('display', d => {
-                const totalCount = d._children?.length || d.children?.length || 0;
-                return totalCount > 0 ? 'block' : 'none';
+                return reportCount(d) > 0 ? 'block' : 'none';
             });
 
         countGroup.append('circle')
@@ -327,14 +443,14 @@ function update(source) {
             .style('font-size', '11px')
             .style('font-weight', 'bold')
             .text(d => {
-                const count = d._children?.length || d.children?.length || 0;
+                const count = reportCount(d);
                 return count > 99 ? '99+' : count;
             });
     }
 
     const expandBtn = nodeEnter.append('g')
         .attr('class', 'expand-group')
-        .style('display', d => (d._children?.length || d.children?.length) ? 'block' : 'none')
+        .style('display', d => reportCount(d) > 0 ? 'block' : 'none')
         .on('click', (event, d) => {
             event.stopPropagation();
             toggle(d);
@@ -351,7 +467,7 @@ function update(source) {
         .attr('y', currentLayout === 'vertical' ? nodeHeight/2 + 15 : 4)
         .attr('x', currentLayout === 'horizontal' ? nodeWidth/2 + 10 : 0)
         .attr('text-anchor', 'middle')
-        .text(d => d._children?.length ? '+' : '-');
+        .text(d => isCollapsed(d) ? '+' : '-');
 
     if (appSettings.highlightNewEmployees !== false) {
         const newBadgeGroup = nodeEnter.append('g')
@@ -375,6 +491,28 @@ function update(source) {
             .text('NEW');
     }
 
+    if (appSettings.highlightRecentChanges !== false) {
+        const changeBadgeGroup = nodeEnter.append('g')
+            .attr('class', 'change-badge-group')
+            .style('display', d => d.data.changeType ? 'block' : 'none');
+
+        changeBadgeGroup.append('rect')
+            .attr('class', 'change-badge')
+            .attr('x', nodeWidth/2 - 105)
+            .attr('y', -nodeHeight/2 - 10)
+            .attr('width', 55)
+            .attr('height', 18)
+            .attr('rx', 9)
+            .attr('ry', 9);
+
+        changeBadgeGroup.append('text')
+            .attr('class', 'change-badge-text')
+            .attr('x', nodeWidth/2 - 77)
+            .attr('y', -nodeHeight/2 + 2)
+            .attr('text-anchor', 'middle')
+            .text(d => (d.data.changeType || '').toUpperCase());
+    }
+
 
     const nodeUpdate = node.merge(nodeEnter)
         .transition()
@@ -382,7 +520,7 @@ function update(source) {
         .attr('transform', d => `translate(${d.x}, ${d.y})`);
 
     nodeUpdate.select('.expand-text')
-        .text(d => d._children?.length ? '+' : '-')
+        .text(d => isCollapsed(d) ? '+' : '-')
         .attr('y', currentLayout === 'vertical' ? nodeHeight/2 + 15 : 4)
         .attr('x', currentLayout === 'horizontal' ? nodeWidth/2 + 10 : 0);
 
@@ -391,18 +529,17 @@ function update(source) {
         .attr('cx', currentLayout === 'horizontal' ? nodeWidth/2 + 10 : 0);
 
     nodeUpdate.select('.expand-group')
-        .style('display', d => (d._children?.length || d.children?.length) ? 'block' : 'none');
+        .style('display', d => reportCount(d) > 0 ? 'block' : 'none');
 
     if (appSettings.showEmployeeCount !== false) {
         nodeUpdate.select('.count-badge')
             .style('display', d => {
-                const totalCount = d._children?.length || d.children?.length || 0;
-                return totalCount > 0 ? 'block' : 'none';
+                return reportCount(d) > 0 ? 'block' : 'none';
             });
 
         nodeUpdate.select('.count-badge text')
             .text(d => {
-                const count = d._children?.length || d.children?.length || 0;
+                const count = reportCount(d);
                 return count > 99 ? '99+' : count;
             });
     }
@@ -419,6 +556,263 @@ function update(source) {
     });
 }
 
+function nodeFill(depth) {
+    const nodeColors = appSettings.nodeColors || {};
+    switch(depth) {
+        case 0: return nodeColors.level0 || '#90EE90';
+        case 1: return nodeColors.level1 || '#FFFFE0';
+        case 2: return nodeColors.level2 || '#E0F2FF';
+        case 3: return nodeColors.level3 || '#FFE4E1';
+        case 4: return nodeColors.level4 || '#E8DFF5';
+        case 5: return nodeColors.level5 || '#FFEAA7';
+        default: return '#F0F0F0';
+    }
+}
+
+function truncate(text, length) {
+    return text.length > length ? text.substring(0, length) + '...' : text;
+}
+
+// Canvas renderer, used instead of SVG elements when more than CANVAS_NODE_THRESHOLD nodes are
+// visible. Only the nodes inside the viewport are drawn, with less detail when zoomed out.
+function renderCanvas(nodes, links) {
+    if (!canvasIndex) {
+        g.selectAll('.node, .link').interrupt().remove();
+        g.style('display', 'none');
+        canvas.style.display = 'block';
+    }
+    canvasIndex = d3.quadtree(nodes, d => d.x, d => d.y);
+    canvasLinks = links;
+    nodes.forEach(d => {
+        d.x0 = d.x;
+        d.y0 = d.y;
+    });
+    scheduleCanvasDraw();
+}
+
+function leaveCanvas() {
+    canvasIndex = null;
+    canvasLinks = [];
+    canvas.style.display = 'none';
+    g.style('display', null);
+    svg.style('cursor', null);
+}
+
+function scheduleCanvasDraw() {
+    if (canvasIndex && !canvasFrame) {
+        canvasFrame = requestAnimationFrame(drawCanvas);
+    }
+}
+
+// Nodes centred inside the given chart-coordinate rectangle
+function canvasNodesIn(x0, y0, x1, y1) {
+    const found = [];
+    canvasIndex.visit((quad, qx0, qy0, qx1, qy1) => {
+        if (!quad.length) {
+            do {
+                const d = quad.data;
+                if (d.x >= x0 && d.x <= x1 && d.y >= y0 && d.y <= y1) found.push(d);
+            } while ((quad = quad.next));
+        }
+        return qx0 > x1 || qy0 > y1 || qx1 < x0 || qy1 < y0;
+    });
+    return found;
+}
+
+function drawCanvas() {
+    canvasFrame = null;
+    if (!canvasIndex) return;
+
+    const ctx = canvas.getContext('2d');
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.width / ratio;
+    const height = canvas.height / ratio;
+    const transform = d3.zoomTransform(svg.node());
+    const [x0, y0] = transform.invert([0, 0]);
+    const [x1, y1] = transform.invert([width, height]);
+
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.clearRect(0, 0, width, height);
+    ctx.setTransform(ratio * transform.k, 0, 0, ratio * transform.k, ratio * transform.x, ratio * transform.y);
+
+    ctx.beginPath();
+    canvasLinks.forEach(({source, target}) => {
+        if (Math.max(source.x, target.x) + nodeWidth < x0 || Math.min(source.x, target.x) - nodeWidth > x1 ||
+            Math.max(source.y, target.y) + nodeHeight < y0 || Math.min(source.y, target.y) - nodeHeight > y1) {
+            return;
+        }
+        traceLink(ctx, source, target);
+    });
+    ctx.strokeStyle = '#999';
+    ctx.lineWidth = 2;
+    ctx.stroke();
+
+    // Margins cover the badges and expand button drawn outside each box
+    canvasNodesIn(x0 - nodeWidth / 2 - 20, y0 - nodeHeight / 2 - 30, x1 + nodeWidth / 2 + 20, y1 + nodeHeight / 2 + 15)
+        .forEach(d => drawCanvasNode(ctx, d, transform.k));
+}
+
+function traceLink(ctx, s, d) {
+    if (currentLayout === 'vertical') {
+        const midY = (s.y + d.y) / 2;
+        ctx.moveTo(s.x, s.y + nodeHeight/2);
+        ctx.lineTo(s.x, midY);
+        ctx.lineTo(d.x, midY);
+        ctx.lineTo(d.x, d.y - nodeHeight/2);
+    } else {
+        const midX = (s.x + d.x) / 2;
+        ctx.moveTo(s.x + nodeWidth/2, s.y);
+        ctx.lineTo(midX, s.y);
+        ctx.lineTo(midX, d.y);
+        ctx.lineTo(d.x - nodeWidth/2, d.y);
+    }
+}
+
+function canvasBadge(ctx, x, y, width, color, label, fontSize) {
+    ctx.beginPath();
+    ctx.roundRect ? ctx.roundRect(x, y, width, 18, 9) : ctx.rect(x, y, width, 18);
+    ctx.fillStyle = color;
+    ctx.fill();
+    ctx.strokeStyle = 'white';
+    ctx.lineWidth = 2;
+    ctx.stroke();
+    ctx.fillStyle = 'white';
+    ctx.font = `bold ${fontSize}px sans-serif`;
+    ctx.textAlign = 'center';
+    ctx.fillText(label, x + width / 2, y + 12);
+}
+
+// Centre of a node's expand button, relative to the node
+function expandButtonOffset() {
+    return currentLayout === 'vertical' ? [0, nodeHeight/2 + 5] : [nodeWidth/2 + 10, -5];
+}
+
+function drawCanvasNode(ctx, d, scale) {
+    const left = d.x - nodeWidth/2;
+    const top = d.y - nodeHeight/2;
+    const fill = nodeFill(d.depth);
+    const isNew = appSettings.highlightNewEmployees !== false && d.data.isNewEmployee;
+    const isChanged = appSettings.highlightRecentChanges !== false && d.data.changeType;
+
+    ctx.fillStyle = fill;
+    if (scale < CANVAS_NAME_ZOOM) {
+        ctx.fillRect(left, top, nodeWidth, nodeHeight);
+        return;
+    }
+
+    ctx.beginPath();
+    ctx.roundRect ? ctx.roundRect(left, top, nodeWidth, nodeHeight, 4) : ctx.rect(left, top, nodeWidth, nodeHeight);
+    ctx.fill();
+    if (canvasHighlights.has(d.data.id)) {
+        ctx.strokeStyle = '#ff6b6b';
+        ctx.lineWidth = 4;
+    } else if (isNew) {
+        ctx.strokeStyle = '#28a745';
+        ctx.lineWidth = 4;
+    } else if (isChanged) {
+        ctx.strokeStyle = '#fd7e14';
+        ctx.lineWidth = 3;
+    } else {
+        ctx.strokeStyle = adjustColor(fill, -50);
+        ctx.lineWidth = 2;
+    }
+    ctx.stroke();
+
+    const showImage = appSettings.showProfileImages !== false;
+    const textX = showImage ? d.x + nodeWidth/2 - 10 : d.x;
+    ctx.textAlign = showImage ? 'right' : 'center';
+    ctx.fillStyle = '#333';
+    ctx.font = 'bold 14px sans-serif';
+    ctx.fillText(truncate(d.data.name, 22), textX, d.y - 20);
+    if (scale < CANVAS_DETAIL_ZOOM) return;
+
+    ctx.fillStyle = '#555';
+    ctx.font = '11px sans-serif';
+    ctx.fillText(truncate(d.data.title || '', 28), textX, d.y - 5);
+    if (appSettings.showDepartments !== false) {
+        ctx.fillStyle = '#666';
+        ctx.font = 'italic 11px sans-serif';
+        ctx.fillText(truncate(d.data.department || 'Not specified', 28), textX, d.y + 25);
+    }
+
+    if (showImage && userIcon.complete && userIcon.naturalWidth) {
+        ctx.save();
+        ctx.beginPath();
+        ctx.arc(left + 35, d.y, 25, 0, 2 * Math.PI);
+        ctx.clip();
+        ctx.drawImage(userIcon, left + 10, d.y - 25, 50, 50);
+        ctx.restore();
+    }
+
+    const count = reportCount(d);
+    if (count > 0) {
+        if (appSettings.showEmployeeCount !== false) {
+            ctx.beginPath();
+            ctx.arc(left + 15, top + 15, 12, 0, 2 * Math.PI);
+            ctx.fillStyle = '#ff6b6b';
+            ctx.fill();
+            ctx.strokeStyle = 'white';
+            ctx.lineWidth = 2;
+            ctx.stroke();
+            ctx.fillStyle = 'white';
+            ctx.font = 'bold 11px sans-serif';
+            ctx.textAlign = 'center';
+            ctx.fillText(count > 99 ? '99+' : count, left + 15, top + 19);
+        }
+
+        const [dx, dy] = expandButtonOffset();
+        ctx.beginPath();
+        ctx.arc(d.x + dx, d.y + dy, 10, 0, 2 * Math.PI);
+        ctx.fillStyle = '#0078d4';
+        ctx.fill();
+        ctx.fillStyle = 'white';
+        ctx.font = 'bold 14px sans-serif';
+        ctx.textAlign = 'center';
+        ctx.fillText(isCollapsed(d) ? '+' : '-', d.x + dx, d.y + dy + 5);
+    }
+
+    if (isNew) {
+        canvasBadge(ctx, d.x + nodeWidth/2 - 45, top - 10, 35, '#28a745', 'NEW', 10);
+    }
+    if (isChanged) {
+        canvasBadge(ctx, d.x + nodeWidth/2 - 105, top - 10, 55, '#fd7e14', d.data.changeType.toUpperCase(), 9);
+    }
+}
+
+// The node (and whether its expand button) under a point in chart coordinates
+function canvasHitTest(x, y) {
+    const [dx, dy] = expandButtonOffset();
+    const candidates = canvasNodesIn(x - nodeWidth/2 - 20, y - nodeHeight/2 - 20, x + nodeWidth/2 + 20, y + nodeHeight/2 + 20);
+    for (const d of candidates) {
+        if (reportCount(d) > 0 && Math.hypot(x - d.x - dx, y - d.y - dy) <= 10) {
+            return {node: d, button: true};
+        }
+    }
+    const node = candidates.find(d => Math.abs(x - d.x) <= nodeWidth/2 && Math.abs(y - d.y) <= nodeHeight/2);
+    return node ? {node, button: false} : null;
+}
+
+function canvasPoint(event) {
+    return d3.zoomTransform(svg.node()).invert(d3.pointer(event, svg.node()));
+}
+
+function canvasClick(event) {
+    if (!canvasIndex) return;
+    const hit = canvasHitTest(...canvasPoint(event));
+    if (!hit) return;
+    event.stopPropagation();
+    if (hit.button) {
+        toggle(hit.node);
+    } else {
+        showEmployeeDetail(hit.node.data);
+    }
+}
+
+function canvasHover(event) {
+    if (!canvasIndex) return;
+    svg.style('cursor', canvasHitTest(...canvasPoint(event)) ? 'pointer' : null);
+}
+
 function diagonal(s, d) {
     if (currentLayout === 'vertical') {
         const midY = (s.y + d.y) / 2;
@@ -435,7 +829,17 @@ function diagonal(s, d) {
     }
 }
 
-function toggle(d) {
+async function toggle(d) {
+    if (hasUnloadedReports(d)) {
+        try {
+            await loadChildren(d);
+        } catch (error) {
+            console.error('Error loading direct reports:', error);
+            return;
+        }
+        update(d);
+        return;
+    }
     if (d.children) {
         d._children = d.children;
         d.children = null;
@@ -455,7 +859,8 @@ function toggle(d) {
     update(d);
 }
 
-function expandAll() {
+async function expandAll() {
+    await ensureFullTree();
     root.each(d => {
         if (d._children) {
             d.children = d._children;
@@ -716,7 +1121,10 @@ function printChart() {
     printWin.print();
 }
 
-function exportToImage(format = 'svg', exportFullChart = false) {
+async function exportToImage(format = 'svg', exportFullChart = false) {
+    if (exportFullChart) {
+        await ensureFullTree();
+    }
     const svgElement = createExportSVG(exportFullChart);
     const svgString = new XMLSerializer().serializeToString(svgElement);
     
@@ -954,6 +1362,7 @@ function createExportSVG(exportFullChart = false) {
 }
 
 function showEmployeeDetail(employee) {
+    detailEmployee = employee;
     const detailPanel = document.getElementById('employeeDetail');
     const headerContent = document.getElementById('employeeDetailContent');
     const infoContent = document.getElementById('employeeInfo');
@@ -994,6 +1403,17 @@ function showEmployeeDetail(employee) {
     `;
     
     const directReports = employee.children || [];
+    if (employee.childCount > directReports.length) {
+        // Reports below the collapsed view haven't been downloaded yet
+        fetchSubtree(employee.id, 2)
+            .then(data => {
+                employee.children = data.children;
+                if (detailEmployee === employee && document.getElementById('employeeDetail').classList.contains('active')) {
+                    showEmployeeDetail(employee);
+                }
+            })
+            .catch(error => console.error('Error loading direct reports:', error));
+    }
     if (directReports.length > 0) {
         infoHTML += `
             <div class="direct-reports">
@@ -1032,6 +1452,12 @@ function findNodeById(node, targetId) {
 
 function highlightNode(nodeId, highlight = true) {
     if (appSettings.searchHighlight !== false) {
+        if (highlight) {
+            canvasHighlights.add(nodeId);
+        } else {
+            canvasHighlights.delete(nodeId);
+        }
+        scheduleCanvasDraw();
         g.selectAll('.node-rect').each(function(d) {
             if (d.data.id === nodeId) {
                 d3.select(this).classed('search-highlight', highlight);
@@ -1042,6 +1468,8 @@ function highlightNode(nodeId, highlight = true) {
 
 function clearHighlights() {
     g.selectAll('.node-rect').classed('search-highlight', false);
+    canvasHighlights.clear();
+    scheduleCanvasDraw();
 }
 
 let searchTimeout;
@@ -1079,6 +1507,11 @@ document.addEventListener('click', function(e) {
 async function performSearch(query) {
     try {
         const response = await fetch(`${API_BASE_URL}/api/search?q=${encodeURIComponent(query)}`);
+        if (response.status === 503) {
+            searchResults.innerHTML = '<div class="search-result-item">Employee data is still loading, try again shortly</div>';
+            searchResults.classList.add('active');
+            return;
+        }
         const results = await response.json();
         
         if (results.length > 0) {
@@ -1102,8 +1535,12 @@ function displaySearchResults(results) {
     searchResults.classList.add('active');
 }
 
-function selectSearchResult(employeeId) {
-    const employee = allEmployees.find(emp => emp.id === employeeId);
+async function selectSearchResult(employeeId) {
+    let employee = allEmployees.find(emp => emp.id === employeeId);
+    if (!employee && treeIsPartial) {
+        await ensureFullTree();
+        employee = allEmployees.find(emp => emp.id === employeeId);
+    }
     if (employee) {
         showEmployeeDetail(employee);
         searchResults.classList.remove('active');
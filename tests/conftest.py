@@ -0,0 +1,37 @@
+"""
+Shared fixtures. The app reads its files relative to the working directory, so it is
+imported from a scratch directory, and each test starts from an empty one.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    previous = os.getcwd()
+    os.chdir(workdir)
+    os.environ.update(OFFLINE_MODE='true', AZURE_TENANT_ID='tenant', AZURE_CLIENT_ID='client',
+                      AZURE_CLIENT_SECRET='secret')
+    import app
+    yield app
+    os.chdir(previous)
+
+
+@pytest.fixture
+def app(app_module):
+    """The app module with no snapshot, change feed, history or jobs"""
+    for name in os.listdir('.'):
+        if name != 'static':
+            path = os.path.abspath(name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    for chart in app_module.chart_registry:
+        chart.evict()
+    return app_module
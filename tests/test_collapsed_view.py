@@ -0,0 +1,57 @@
+import pytest
+
+from org_diff import iter_hierarchy
+from snapshot_io import count_descendants, truncate_tree
+
+
+def person(emp_id, *children):
+    return {'id': emp_id, 'name': f'Person {emp_id}', 'children': list(children)}
+
+
+def org():
+    return person('1', person('2', person('3', person('5')), person('4')), person('6'))
+
+
+def shape(node):
+    """(id, childCount, descendantCount, children) of a view, without the other fields"""
+    return (node['id'], node.get('childCount'), node.get('descendantCount'), [shape(child) for child in node['children']])
+
+
+def test_truncate_tree_keeps_counts_past_the_cut():
+    root = org()
+    descendants = count_descendants([node for node, _, _ in iter_hierarchy(root)])
+    assert shape(truncate_tree(root, 1, descendants)) == ('1', 2, 5, [])
+    assert shape(truncate_tree(root, 2, descendants)) == ('1', 2, 5, [('2', 2, 3, []), ('6', 0, 0, [])])
+    assert shape(truncate_tree(root, 3, descendants)) == \
+        ('1', 2, 5, [('2', 2, 3, [('3', 1, 1, []), ('4', 0, 0, [])]), ('6', 0, 0, [])])
+    # The snapshot itself is left whole
+    assert root == org()
+
+
+@pytest.fixture
+def client(app):
+    app.save_snapshot(org())
+    return app.app.test_client()
+
+
+def test_collapse_level_limits_the_levels_sent(client):
+    assert shape(client.get('/api/employees?collapseLevel=2').get_json()) == \
+        ('1', 2, 5, [('2', 2, 3, []), ('6', 0, 0, [])])
+    assert shape(client.get('/api/employees?collapseLevel=2&root=3').get_json()) == ('3', 1, 1, [('5', 0, 0, [])])
+    # Without a level the whole tree is sent, with no counts
+    assert shape(client.get('/api/employees?collapseLevel=all').get_json()) == \
+        ('1', None, None, [('2', None, None, [('3', None, None, [('5', None, None, [])]), ('4', None, None, [])]),
+                           ('6', None, None, [])])
+
+
+def test_collapse_level_is_validated(client):
+    for value in ('0', '-1', 'two'):
+        assert client.get(f'/api/employees?collapseLevel={value}').status_code == 400
+    assert client.get('/api/employees?collapseLevel=2&root=missing').status_code == 404
+
+
+def test_cached_view_is_replaced_with_the_snapshot(app, client):
+    assert shape(client.get('/api/employees?collapseLevel=1').get_json()) == ('1', 2, 5, [])
+    assert shape(client.get('/api/employees?collapseLevel=1').get_json()) == ('1', 2, 5, [])
+    app.save_snapshot(person('1', person('2')))
+    assert shape(client.get('/api/employees?collapseLevel=1').get_json()) == ('1', 1, 1, [])
@@ -0,0 +1,80 @@
+import io
+import os
+import threading
+import time
+
+from single_flight import ProcessLock
+
+CSV = b'id,name,managerId\n1,Boss,\n2,Report,1\n'
+
+
+def test_process_lock_excludes_other_holders(tmp_path):
+    path = str(tmp_path / 'work.lock')
+    first, second = ProcessLock(path), ProcessLock(path)
+    assert first.acquire()
+    # Each instance opens the file separately, as another process would, so the flock refuses it
+    assert not second.acquire()
+    assert not first.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_upload_is_refused_while_another_worker_imports(app, monkeypatch):
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 'admin')
+    client = app.app.test_client()
+    other_worker = ProcessLock(app.IMPORT_LOCK_FILE)
+    assert other_worker.acquire()
+    try:
+        response = client.post('/api/import-csv', headers={'Authorization': 'Bearer admin'},
+                               data={'file': (io.BytesIO(CSV), 'employees.csv')})
+        assert response.status_code == 409
+    finally:
+        other_worker.release()
+
+    response = client.post('/api/import-csv', headers={'Authorization': 'Bearer admin'},
+                           data={'file': (io.BytesIO(CSV), 'employees.csv')})
+    assert response.status_code == 202
+    import_id = response.get_json()['importId']
+    for _ in range(100):
+        if app.jobs.get(import_id)['state'] not in ('queued', 'running'):
+            break
+        time.sleep(0.05)
+    assert app.jobs.get(import_id)['state'] == 'succeeded'
+    assert app.get_current_snapshot().count == 2
+
+
+def test_upload_is_refused_for_synced_charts_and_during_syncs(app, monkeypatch):
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 'admin')
+    client = app.app.test_client()
+    chart = app.chart_registry.default
+
+    monkeypatch.setattr(chart, 'source', 'graph')
+    response = client.post('/api/import-csv', headers={'Authorization': 'Bearer admin'},
+                           data={'file': (io.BytesIO(CSV), 'employees.csv')})
+    assert response.status_code == 409
+
+    monkeypatch.setattr(chart, 'source', 'csv')
+    monkeypatch.setattr(chart.sync, 'running', lambda: True)
+    response = client.post('/api/import-csv', headers={'Authorization': 'Bearer admin'},
+                           data={'file': (io.BytesIO(CSV), 'employees.csv')})
+    assert response.status_code == 409
+    assert app.import_lock.acquire()
+    app.import_lock.release()
+
+
+def test_publishing_waits_for_another_process_publishing_the_chart(app):
+    hierarchy = {'id': '1', 'name': 'Boss', 'children': [{'id': '2', 'name': 'Report', 'children': []}]}
+    other_process = ProcessLock(app.chart_registry.default.publish_lock.path)
+    assert other_process.acquire()
+    publisher = threading.Thread(target=app.save_snapshot, args=(hierarchy,))
+    try:
+        publisher.start()
+        publisher.join(0.2)
+        assert publisher.is_alive()
+        assert not os.path.exists(app.DATA_FILE)
+    finally:
+        other_process.release()
+    publisher.join(5)
+    assert app.load_change_feed()['generation'] == 1
+    assert app.get_current_snapshot().count == 2
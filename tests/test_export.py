@@ -0,0 +1,81 @@
+import csv
+import gzip
+import io
+import json
+
+from import_csv_to_json import import_csv
+from org_diff import iter_hierarchy
+from org_export import gzip_chunks, iter_csv, iter_jsonl, iter_records
+from snapshot_io import count_descendants
+
+
+def person(emp_id, name, *children, **fields):
+    defaults = {'title': 'Engineer', 'department': 'R&D', 'email': f'{emp_id}@example.com'}
+    return dict(defaults, id=emp_id, name=name, children=list(children), **fields)
+
+
+ORG = person('1', 'Ana',
+             person('2', 'Bob, Jr.', person('4', 'Dave "D"')),
+             person('3', 'Carol', employeeHireDate='2024-01-15', title='Manager'),
+             title='CEO')
+
+
+def records(root=ORG, chain=()):
+    return iter_records(root, count_descendants([node for node, _, _ in iter_hierarchy(root)]), chain)
+
+
+def csv_fields(node):
+    """A hierarchy with only the fields a CSV export carries over to an import"""
+    fields = {key: value for key, value in node.items()
+              if key in ('id', 'name', 'title', 'department', 'email', 'employeeHireDate')}
+    return dict(fields, children=[csv_fields(child) for child in node['children']])
+
+
+def test_csv_export_imports_back_to_the_same_org(tmp_path):
+    export = tmp_path / 'export.csv'
+    # A small chunk size, so rows are split across chunks
+    with open(export, 'w', newline='') as f:
+        f.writelines(iter_csv(records(), chunk_size=64))
+    output = tmp_path / 'employee_data.json'
+    import_csv(str(export), str(output))
+    assert csv_fields(json.loads(output.read_text())) == csv_fields(ORG)
+
+
+def test_csv_export_columns():
+    rows = list(csv.DictReader(io.StringIO(''.join(iter_csv(records())))))
+    assert [row['id'] for row in rows] == ['1', '2', '4', '3']
+    dave = rows[2]
+    assert (dave['name'], dave['managerId'], dave['managerName']) == ('Dave "D"', '2', 'Bob, Jr.')
+    assert (dave['depth'], dave['managementChain']) == ('2', '1/2')
+    assert (rows[0]['directReports'], rows[0]['totalReports'], rows[0]['managerId']) == ('2', '3', '')
+
+
+def test_jsonl_export_round_trips_each_record():
+    expected = list(records())
+    lines = ''.join(iter_jsonl(records(), chunk_size=64)).splitlines()
+    assert [json.loads(line) for line in lines] == expected
+    assert expected[2]['managementChain'] == ['1', '2']
+
+
+def test_gzip_chunks_decompress_to_the_plain_export():
+    chunks = list(iter_jsonl(records(), chunk_size=64))
+    assert gzip.decompress(b''.join(gzip_chunks(chunks))).decode('utf-8') == ''.join(chunks)
+
+
+def test_export_endpoint_streams_subtrees_with_org_wide_depths(app):
+    app.save_snapshot(ORG)
+    client = app.app.test_client()
+
+    response = client.get('/api/export?format=jsonl&root=2', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Disposition'].endswith('-2.jsonl"')
+    exported = [json.loads(line) for line in gzip.decompress(response.get_data()).decode('utf-8').splitlines()]
+    assert [(record['id'], record['depth'], record['managementChain']) for record in exported] == \
+        [('2', 1, ['1']), ('4', 2, ['1', '2'])]
+
+    response = client.get('/api/export?format=csv')
+    assert 'Content-Encoding' not in response.headers
+    assert [row['id'] for row in csv.DictReader(io.StringIO(response.get_data(as_text=True)))] == ['1', '2', '4', '3']
+    assert client.get('/api/export?format=xml').status_code == 400
+    assert client.get('/api/export?root=missing').status_code == 404
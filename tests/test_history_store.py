@@ -0,0 +1,61 @@
+import os
+from datetime import date, timedelta
+
+from history_store import HistoryStore
+
+
+def org(day):
+    """A small org that changes every day: someone joins, and the title of the top changes"""
+    reports = [{'id': str(i), 'name': f'Person {i}', 'children': []} for i in range(2, day + 3)]
+    return {'id': '1', 'name': 'Ana', 'title': f'CEO since day {day}', 'children': reports}
+
+
+def days_ago(days):
+    return date.today() - timedelta(days=days)
+
+
+def record_days(store, count):
+    """Record count consecutive days ending today; day n (0 first) holds org(n)"""
+    for n in range(count):
+        store.record(org(n), day=days_ago(count - 1 - n))
+
+
+def test_deltas_between_checkpoints_reconstruct_every_day(tmp_path):
+    store = HistoryStore(str(tmp_path), checkpoint_interval=3, retention_days=0)
+    record_days(store, 7)
+
+    entries = store._load_index()['entries']
+    assert [entry['kind'] for entry in entries] == ['full', 'delta', 'delta', 'full', 'delta', 'delta', 'full']
+    for n in range(7):
+        store.clear_cache()
+        assert store.snapshot_at(days_ago(6 - n)) == org(n)
+    assert store.snapshot_at(days_ago(7)) is None
+
+
+def test_recording_a_day_again_replaces_it(tmp_path):
+    store = HistoryStore(str(tmp_path), checkpoint_interval=3, retention_days=0)
+    record_days(store, 2)
+    store.record(org(5))
+
+    assert store.dates() == [days_ago(1).isoformat(), date.today().isoformat()]
+    store.clear_cache()
+    assert store.snapshot_at(date.today()) == org(5)
+    assert sorted(os.listdir(tmp_path)) == sorted(entry['file'] for entry in store._load_index()['entries']) + ['index.json']
+
+
+def test_pruning_turns_the_oldest_kept_day_into_a_checkpoint(tmp_path):
+    store = HistoryStore(str(tmp_path), checkpoint_interval=5, retention_days=0)
+    record_days(store, 4)
+
+    store.retention_days = 2
+    open(tmp_path / 'stray.full.json.gz', 'w').close()
+    assert store.compact() == 1
+
+    entries = store._load_index()['entries']
+    assert [entry['date'] for entry in entries] == [days_ago(n).isoformat() for n in (2, 1, 0)]
+    assert [entry['kind'] for entry in entries] == ['full', 'delta', 'delta']
+    assert sorted(os.listdir(tmp_path)) == sorted([entry['file'] for entry in entries] + ['index.json'])
+    store.clear_cache()
+    assert store.snapshot_at(days_ago(2)) == org(1)
+    assert store.snapshot_at(date.today()) == org(3)
+    assert store.snapshot_at(days_ago(3)) is None
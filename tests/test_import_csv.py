@@ -0,0 +1,60 @@
+import gzip
+import json
+
+import pytest
+
+from import_csv_to_json import ImportValidationError, import_csv
+
+HEADER = 'id,name,title,managerId\n'
+
+
+def write_csv(tmp_path, body, name='employees.csv'):
+    path = tmp_path / name
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(path, 'wt', newline='') as f:
+        f.write(HEADER + body)
+    return str(path)
+
+
+def rejected(tmp_path, body, **kwargs):
+    """The errors an import of body fails with, after checking the output was left alone"""
+    output = tmp_path / 'employee_data.json'
+    output.write_text('{"id":"old"}')
+    with pytest.raises(ImportValidationError) as raised:
+        import_csv(write_csv(tmp_path, body), str(output), **kwargs)
+    assert output.read_text() == '{"id":"old"}'
+    return raised.value.report.errors
+
+
+def test_import_builds_the_hierarchy_in_csv_order(tmp_path):
+    output = tmp_path / 'employee_data.json'
+    report = import_csv(write_csv(tmp_path, '1,Ana,CEO,\n2,Bob,,1\n3,Carol,,1\n4,Dave,,2\n', 'org.csv.gz'),
+                        str(output))
+    root = json.loads(output.read_text())
+    assert (root['name'], root['title']) == ('Ana', 'CEO')
+    assert [child['id'] for child in root['children']] == ['2', '3']
+    assert root['children'][0]['children'][0]['name'] == 'Dave'
+    assert root['children'][1]['title'] == 'Employee'
+    assert (report.employees, report.rows_read, report.root) == (4, 4, {'id': '1', 'row': 2})
+
+
+def test_duplicate_ids_are_rejected_with_both_rows(tmp_path):
+    errors = rejected(tmp_path, '1,Ana,,\n2,Bob,,1\n2,Bobby,,1\n')
+    assert errors == ['Duplicate ID 2 on row 4 (first seen on row 3)']
+
+
+def test_manager_cycles_are_rejected(tmp_path):
+    errors = rejected(tmp_path, '1,Ana,,\n2,Bob,,4\n3,Carol,,2\n4,Dave,,3\n5,Erin,,4\n')
+    assert errors == ['Manager cycle: 2 (row 3), 4 (row 5), 3 (row 4)']
+
+
+def test_multiple_roots_are_rejected_unless_one_is_chosen(tmp_path):
+    body = '1,Ana,,\n2,Bob,,1\n3,Carol,,\n'
+    errors = rejected(tmp_path, body)
+    assert errors == ['Multiple roots found: 1 (row 2), 3 (row 4). Choose one with --root.']
+
+    output = tmp_path / 'chosen.json'
+    report = import_csv(write_csv(tmp_path, body), str(output), root_id='1')
+    assert report.employees == 2
+    assert report.warnings == ['Row 4: 3 is not under root 1, excluded']
+    assert rejected(tmp_path, body, root_id='9') == ['Configured root 9 is not in the CSV']
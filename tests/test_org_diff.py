@@ -0,0 +1,50 @@
+from org_diff import change_types, diff_snapshots
+
+
+def person(emp_id, name, *children, **fields):
+    return dict(fields, id=emp_id, name=name, children=list(children))
+
+
+def org(*reports_of_bob, **reports_of_ana):
+    """Ana at the top with Bob under her; Bob's reports and Ana's other reports are given"""
+    return person('1', 'Ana', person('2', 'Bob', *reports_of_bob), *reports_of_ana.values(), title='CEO')
+
+
+CAROL = person('3', 'Carol', title='Engineer')
+DAVE = person('4', 'Dave')
+ERIN = person('5', 'Erin')
+
+
+def before():
+    return org(CAROL, DAVE)
+
+
+def test_unchanged_org_has_no_changes():
+    assert diff_snapshots(before(), before()) == {'joiners': [], 'leavers': [], 'moves': [], 'changes': []}
+
+
+def test_joiners_and_leavers():
+    diff = diff_snapshots(before(), org(CAROL, erin=ERIN))
+    assert diff['joiners'] == [{'id': '5', 'name': 'Erin', 'title': None, 'department': None, 'managerId': '1'}]
+    assert [leaver['id'] for leaver in diff['leavers']] == ['4']
+    assert diff['leavers'][0]['managerId'] == '2'
+    assert diff['moves'] == [] and diff['changes'] == []
+
+
+def test_move_names_both_managers():
+    diff = diff_snapshots(before(), org(DAVE, carol=CAROL))
+    assert diff['moves'] == [{'id': '3', 'name': 'Carol', 'fromManagerId': '2', 'fromManagerName': 'Bob',
+                              'toManagerId': '1', 'toManagerName': 'Ana'}]
+    # Moving alone is not a change to the person's details
+    assert diff['changes'] == [] and diff['joiners'] == [] and diff['leavers'] == []
+
+
+def test_rename_is_a_change_with_old_and_new_values():
+    diff = diff_snapshots(before(), org(dict(CAROL, name='Caroline'), DAVE))
+    assert diff['changes'] == [{'id': '3', 'name': 'Caroline', 'fields': {'name': {'old': 'Carol', 'new': 'Caroline'}}}]
+    assert diff['moves'] == []
+
+
+def test_change_types_prefer_join_over_move_over_update():
+    entry = diff_snapshots(before(), org(DAVE, carol=dict(CAROL, name='Caroline'), erin=ERIN))
+    assert change_types(entry) == {'3': 'moved', '5': 'joined'}
@@ -0,0 +1,20 @@
+import profiling
+from profiling import Profiler
+
+
+def test_request_tickets_are_kept_when_profiling_cannot_start(tmp_path, monkeypatch):
+    profiler = Profiler(str(tmp_path))
+    profiler.configure(next_requests=2)
+    start_cprofile = profiling.start_cprofile
+
+    # Another profiler is running, so this request can't be profiled
+    monkeypatch.setattr(profiling, 'start_cprofile', lambda: None)
+    assert profiler.begin_request('/api/employees') is None
+
+    monkeypatch.setattr(profiling, 'start_cprofile', start_cprofile)
+    for _ in range(2):
+        handle = profiler.begin_request('/api/employees')
+        assert handle is not None and handle.profile is not None
+        profiler.end_request(handle, 'GET', '/api/employees', 200)
+    assert profiler.begin_request('/api/employees') is None
+    assert len(profiler.list_profiles()) == 2
@@ -0,0 +1,37 @@
+import time
+
+
+def histogram(metric, route):
+    """(sum, count) observed for route"""
+    for labels, (_, total, count) in metric.values():
+        if labels[0] == route:
+            return total, count
+    return 0.0, 0
+
+
+def test_streamed_responses_are_timed_and_sized_when_sent(app, monkeypatch):
+    app.save_snapshot({'id': 'ceo', 'name': 'CEO', 'children': [
+        {'id': f'e{i}', 'name': f'Employee {i}', 'managerId': 'ceo', 'children': []} for i in range(50)
+    ]})
+    iter_json = app.iter_json
+    def slow_iter_json(tree):
+        for chunk in iter_json(tree):
+            time.sleep(0.2)
+            yield chunk
+    monkeypatch.setattr(app, 'iter_json', slow_iter_json)
+    client = app.app.test_client()
+
+    for route, path in (('/api/employees', '/api/employees'), ('/api/export', '/api/export?format=jsonl')):
+        latency_before = histogram(app.HTTP_LATENCY, route)
+        size_before = histogram(app.HTTP_RESPONSE_SIZE, route)
+        response = client.get(path)
+        body = response.get_data()
+        response.close()
+
+        latency = histogram(app.HTTP_LATENCY, route)
+        size = histogram(app.HTTP_RESPONSE_SIZE, route)
+        assert latency[1] == latency_before[1] + 1
+        assert size[1] == size_before[1] + 1
+        assert size[0] - size_before[0] == len(body)
+        if route == '/api/employees':
+            assert latency[0] - latency_before[0] >= 0.2
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import Daily, Every, ScheduledJob, Weekly
+
+# A Wednesday
+NOW = datetime(2024, 5, 15, 12, 30, 45, 500)
+
+
+def test_every_counts_from_the_given_moment():
+    assert Every(900).next_after(NOW) == NOW + timedelta(minutes=15)
+    assert Every(900).describe() == 'every 15 minutes'
+    assert Every(90).describe() == 'every 90 seconds'
+    with pytest.raises(ValueError):
+        Every(0)
+
+
+def test_daily_runs_later_today_or_tomorrow():
+    assert Daily('20:00').next_after(NOW) == datetime(2024, 5, 15, 20, 0)
+    assert Daily('08:15').next_after(NOW) == datetime(2024, 5, 16, 8, 15)
+    # A run that is due right now has already happened
+    assert Daily('12:30').next_after(datetime(2024, 5, 15, 12, 30)) == datetime(2024, 5, 16, 12, 30)
+    for invalid in ('24:00', '7', '12:60', 'noon'):
+        with pytest.raises(ValueError):
+            Daily(invalid)
+
+
+def test_weekly_runs_on_the_next_matching_day():
+    assert Weekly('Sunday', '03:00').next_after(NOW) == datetime(2024, 5, 19, 3, 0)
+    assert Weekly('wednesday', '18:00').next_after(NOW) == datetime(2024, 5, 15, 18, 0)
+    assert Weekly('wednesday', '03:00').next_after(NOW) == datetime(2024, 5, 22, 3, 0)
+    assert Weekly('monday', '09:00').next_after(NOW) == datetime(2024, 5, 20, 9, 0)
+    with pytest.raises(ValueError):
+        Weekly('someday', '03:00')
+
+
+def test_jitter_only_ever_delays_and_by_at_most_its_bound():
+    job = ScheduledJob('refresh', Every(600), lambda: None, jitter=60)
+    due = NOW + timedelta(minutes=10)
+    delays = set()
+    for _ in range(200):
+        job.plan(NOW)
+        delay = (job.next_run - due).total_seconds()
+        assert 0 <= delay <= 60
+        delays.add(round(delay))
+    assert len(delays) > 10
+
+    job = ScheduledJob('full-rebuild', Daily('20:00'), lambda: None)
+    job.plan(NOW)
+    assert job.next_run == datetime(2024, 5, 15, 20, 0)
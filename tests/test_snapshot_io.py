@@ -0,0 +1,26 @@
+import os
+import stat
+
+import pytest
+
+import snapshot_io
+from snapshot_io import atomic_write
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='POSIX permissions')
+def test_atomic_write_keeps_permissions(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_io, '_UMASK', 0o027)
+    path = str(tmp_path / 'employee_data.json')
+    with atomic_write(path) as f:
+        f.write('{}')
+    # A new file gets what open() would have given it
+    assert mode(path) == 0o640
+
+    os.chmod(path, 0o644)
+    with atomic_write(path) as f:
+        f.write('{"id":"1"}')
+    assert mode(path) == 0o644
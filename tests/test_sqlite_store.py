@@ -0,0 +1,97 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlite_store import SqliteStore
+
+TITLES = ['Engineer', 'Senior Engineer', 'Engineering Lead', 'Analyst', 'Sales Lead']
+DEPARTMENTS = ['Engineering', 'Sales', 'Finance', 'Öffentlichkeit']
+
+
+def org(size=300, span=4):
+    """A hierarchy of size people, span reports per manager, with a mix of titles and hire dates"""
+    recent = (datetime.now() - timedelta(days=10)).isoformat()
+    nodes = [{
+        'id': f'e{i}',
+        'name': f'Person {i}' if i % 7 else f'Zoë Ábel {i}',
+        'title': TITLES[i % len(TITLES)],
+        'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+        'managerId': f'e{(i - 1) // span}' if i else None,
+        'employeeHireDate': recent[:10] if i % 11 == 0 else '2015-06-01',
+        'hireDate': recent if i % 11 == 0 else '2015-06-01T00:00:00',
+        'children': []
+    } for i in range(size)]
+    for node in nodes[1:]:
+        nodes[int(node['managerId'][1:])]['children'].append(node)
+    return nodes[0]
+
+
+@pytest.fixture
+def backends(app, monkeypatch, tmp_path):
+    """use(storage) switches the default chart between its JSON snapshot and a SQLite store holding the same org"""
+    chart = app.chart_registry.default
+    snapshots = chart.snapshots
+    store = SqliteStore(str(tmp_path / 'employees.db'))
+    hierarchy = org()
+    app.save_snapshot(hierarchy)
+    monkeypatch.setattr(chart, 'snapshots', None)
+    monkeypatch.setattr(chart, 'store', store)
+    app.save_snapshot(hierarchy)
+
+    def use(storage):
+        chart.snapshots, chart.store = (snapshots, None) if storage == 'json' else (None, store)
+    return use
+
+
+PATHS = [
+    '/api/employees',
+    '/api/employees?collapseLevel=2',
+    '/api/employees?collapseLevel=9',
+    '/api/employees?root=e2&collapseLevel=1',
+    '/api/employees?root=e2&collapseLevel=3',
+    '/api/employees?root=e2',
+    '/api/employees?root=nobody',
+    '/api/employee/e5',
+    '/api/employee/e299',
+    '/api/employee/nobody',
+    '/api/search?q=eng',
+    '/api/search?q=Lead',
+    '/api/search?q=zoë',
+    '/api/search?q=öf',
+    '/api/search?q=20',
+    '/api/search?q=nothing here',
+    '/api/export?format=csv',
+    '/api/export?format=jsonl&root=e3',
+]
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_sqlite_matches_json(app, backends, path):
+    client = app.app.test_client()
+    responses = {}
+    for storage in ('json', 'sqlite'):
+        backends(storage)
+        response = client.get(path)
+        responses[storage] = (response.status_code, response.get_data(as_text=True))
+        response.close()
+    (json_status, json_body), (sqlite_status, sqlite_body) = responses['json'], responses['sqlite']
+    assert json_status == sqlite_status
+    if 'format=' in path:
+        assert json_body == sqlite_body
+    else:
+        assert json.loads(json_body) == json.loads(sqlite_body)
+
+
+def test_readers_keep_their_version_during_a_write(tmp_path):
+    store = SqliteStore(str(tmp_path / 'employees.db'))
+    store.write(org(10))
+    rows = store.rows()
+    next(rows)
+    # Syncs write from their own thread, and so through their own connection
+    writer = threading.Thread(target=store.write, args=(org(20),))
+    writer.start()
+    writer.join()
+    assert 1 + sum(1 for _ in rows) == 10
+    assert store.count() == 20
@@ -0,0 +1,114 @@
+import json
+import time
+
+import pytest
+import requests
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.status_code = 200
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def graph_users(count, page_size=100, fail_page=None):
+    """A fake graph_get serving count users a page at a time, with a connection reset on fail_page"""
+    users = [{
+        'id': f'u{i}',
+        'displayName': f'User {i}',
+        'manager': {'id': f'u{(i - 1) // 5}'} if i else None
+    } for i in range(count)]
+
+    def graph_get(url, headers):
+        page = int(url.rpartition('page=')[2]) if 'page=' in url else 0
+        if page == fail_page:
+            raise requests.exceptions.ConnectionError('Connection reset by peer')
+        payload = {'value': users[page * page_size:(page + 1) * page_size]}
+        if (page + 1) * page_size < count:
+            payload['@odata.nextLink'] = f'https://graph.test/users?page={page + 1}'
+        return FakeResponse(payload)
+    return graph_get
+
+
+@pytest.fixture
+def graph(app, monkeypatch):
+    monkeypatch.setattr(app, 'get_access_token', lambda: 'token')
+    def serve(*args, **kwargs):
+        monkeypatch.setattr(app, 'graph_get', graph_users(*args, **kwargs))
+    return serve
+
+
+def test_full_sync_publishes_every_page(app, graph):
+    graph(2000)
+    assert app.update_employee_data('full') == 'success'
+    assert app.get_current_snapshot().count == 2000
+
+
+def test_page_failure_fails_the_sync_and_keeps_the_snapshot(app, graph):
+    graph(2000)
+    assert app.update_employee_data('full') == 'success'
+    feed = app.load_change_feed()
+    with open(app.FINGERPRINTS_FILE) as f:
+        fingerprints = json.load(f)
+
+    graph(1500, fail_page=3)
+    assert app.update_employee_data('full') == 'error'
+
+    job = app.jobs.list('sync', limit=1)[0]
+    assert job['state'] == 'failed'
+    assert 'Connection reset' in job['error']
+    assert app.get_current_snapshot().count == 2000
+    assert app.load_change_feed() == feed
+    with open(app.FINGERPRINTS_FILE) as f:
+        assert json.load(f) == fingerprints
+    assert [entry['count'] for entry in app.chart_registry.default.history._load_index()['entries']] == [2000]
+
+
+def test_started_sync_reports_its_job_even_once_it_has_finished(app, graph, monkeypatch):
+    graph(10)
+    # As if the sync had finished before its job could be looked up
+    monkeypatch.setattr(app.jobs, 'active', lambda *args, **kwargs: None)
+    with app.app.test_request_context():
+        body = app.start_sync_job()
+    assert body['jobId']
+    assert body['statusUrl'] == f"/api/jobs/{body['jobId']}"
+    for _ in range(100):
+        if app.jobs.get(body['jobId'])['state'] not in ('queued', 'running'):
+            break
+        time.sleep(0.05)
+    assert app.jobs.get(body['jobId'])['state'] == 'succeeded'
+
+
+def test_empty_snapshot_starts_a_background_sync_instead_of_fetching(app, monkeypatch):
+    chart = app.chart_registry.default
+    monkeypatch.setattr(chart, 'source', 'graph')
+    monkeypatch.setattr(app, 'fetch_all_employees', lambda job=None: pytest.fail('fetched in the request'))
+    started = []
+    monkeypatch.setattr(chart.sync, 'start', lambda *args, **kwargs: started.append(kwargs) or (None, True))
+    with open(app.DATA_FILE, 'w') as f:
+        f.write('null')
+
+    response = app.app.test_client().get('/api/employees')
+    assert response.status_code == 503
+    assert response.get_json()['warmingUp']
+    assert started == [{'cooldown': app.WARMING_UP_SYNC_COOLDOWN}]
+
+
+def test_warming_up_reports_syncs_run_by_other_processes(app, monkeypatch):
+    chart = app.chart_registry.default
+    monkeypatch.setattr(chart, 'source', 'graph')
+    monkeypatch.setattr(chart.sync, 'start', lambda *args, **kwargs: (None, False))
+    client = app.app.test_client()
+    # A sync run by the gunicorn master is only known to workers through its job file
+    job = app.jobs.create('sync', chart='default', mode='full')
+    job.start('fetch')
+    assert 'first time' in client.get('/api/employees').get_json()['error']
+
+    job.finish('failed', error='Unauthorized')
+    assert 'could not be loaded' in client.get('/api/employees').get_json()['error']